@@ -15,9 +15,16 @@ And the NmPackage.save module to save a 'VsProject' to disk thus modifying
 """
 from pathlib import PurePath
 from NmPackage.debug import DebugLog
+from NmPackage.lock import FileLock
+from NmPackage.store import ContentStore
+from NmPackage.trace import Trace
+from NmPackage.transport import GitTransport, ArchiveTransport
 from pathlib import Path
 import os
+import re
 import shutil
+import time
+import weakref
 
 import subprocess
 
@@ -57,11 +64,33 @@ class VsProject:
 class NmPackageId(object):
     """
     A Nikon Metrology Package Identifier (NmPackage for short) is identified by <packageId> and a <versionId>
+
+    NmPackageIds are immutable, hashable and ordered by their `qualifiedId`.
+    Use `intern` to share one object between all equal ids, e.g. when parsing thousands of props files.
     """
 
+    __slots__ = ("_packageId", "_versionId", "_qualifiedId", "_hash", "__weakref__")
+
+    # the interned ids {(packageId, versionId): NmPackageId}, see `intern`
+    _interned = weakref.WeakValueDictionary()
+
     def __init__(self, packageId: str, versionId: str):
-        self._packageId = packageId
-        self._versionId = versionId
+        qualifiedId = packageId + "/" + versionId
+        object.__setattr__(self, "_packageId", packageId)
+        object.__setattr__(self, "_versionId", versionId)
+        object.__setattr__(self, "_qualifiedId", qualifiedId)
+        object.__setattr__(self, "_hash", hash(qualifiedId))
+
+    @classmethod
+    def intern(cls, packageId: str, versionId: str):
+        """
+        return the NmPackageId(packageId, versionId) shared by all callers as long as it is referenced
+        """
+        key = (packageId, versionId)
+        nm_package_id = cls._interned.get(key)
+        if nm_package_id is None:
+            nm_package_id = cls._interned.setdefault(key, cls(packageId, versionId))
+        return nm_package_id
 
     @staticmethod
     def from_qualifiedId(qualifiedId: str):
@@ -69,7 +98,7 @@ class NmPackageId(object):
         if len(parts) != 2:
             raise Exception("Invalid qualified package id: " + qualifiedId)
 
-        return NmPackageId(parts[0], parts[1])
+        return NmPackageId.intern(parts[0], parts[1])
 
     @property
     def packageId(self) -> str:
@@ -81,17 +110,105 @@ class NmPackageId(object):
 
     @property
     def qualifiedId(self) -> str:
-        return self.packageId + "/" + self.versionId
+        return self._qualifiedId
+
+    def __setattr__(self, name, value):
+        raise AttributeError("NmPackageId is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("NmPackageId is immutable")
+
+    def __reduce__(self):
+        # the slots are read-only, hence unpickle through the constructor
+        return NmPackageId.intern, (self._packageId, self._versionId)
 
     def __repr__(self) -> str:
         return 'NmPackageId("{}", "{}")'.format(self.packageId, self.versionId)
 
     def __eq__(self, other) -> bool:
-        return self.packageId == other.packageId and \
-            self.versionId == other.versionId
+        if self is other:
+            return True
+        if not isinstance(other, NmPackageId):
+            return NotImplemented
+        return self._hash == other._hash and self._qualifiedId == other._qualifiedId
+
+    def __ne__(self, other) -> bool:
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    # ordered alphabetically by qualified id, the order of the NmPackageDeps.props files
+    def __lt__(self, other) -> bool:
+        if not isinstance(other, NmPackageId):
+            return NotImplemented
+        return self._qualifiedId < other._qualifiedId
+
+    def __le__(self, other) -> bool:
+        if not isinstance(other, NmPackageId):
+            return NotImplemented
+        return self._qualifiedId <= other._qualifiedId
+
+    def __gt__(self, other) -> bool:
+        if not isinstance(other, NmPackageId):
+            return NotImplemented
+        return self._qualifiedId > other._qualifiedId
+
+    def __ge__(self, other) -> bool:
+        if not isinstance(other, NmPackageId):
+            return NotImplemented
+        return self._qualifiedId >= other._qualifiedId
 
     def __hash__(self):
-        return hash(self.qualifiedId)
+        return self._hash
+
+
+class InstallResult(object):
+    """
+    The outcome of installing a single `NmPackageId`, see `NmPackageManager.install_all`
+    """
+
+    def __init__(self, nm_package_id: NmPackageId, action: str, duration: float, error: Exception = None,
+                 bytes_received: int = None):
+        self._nm_package_id = nm_package_id
+        self._action = action
+        self._duration = duration
+        self._error = error
+        self._bytes_received = bytes_received
+
+    @property
+    def nm_package_id(self) -> NmPackageId:
+        return self._nm_package_id
+
+    @property
+    def action(self) -> str:
+        """the performed action: "install", "upgrade", "up-to-date" or None if the install failed"""
+        return self._action
+
+    @property
+    def duration(self) -> float:
+        """wall-clock duration in seconds"""
+        return self._duration
+
+    @property
+    def error(self) -> Exception:
+        """the exception that caused the install to fail or None"""
+        return self._error
+
+    @property
+    def bytes_received(self) -> int:
+        """the number of bytes of git objects received or None if unknown"""
+        return self._bytes_received
+
+    @property
+    def succeeded(self) -> bool:
+        return self._error is None
+
+    def __str__(self) -> str:
+        if self.succeeded:
+            if self.bytes_received is None:
+                return "{}: {} ({:.1f}s)".format(self.nm_package_id.qualifiedId, self.action, self.duration)
+            return "{}: {} ({:.1f}s, {} received)".format(
+                self.nm_package_id.qualifiedId, self.action, self.duration, format_size(self.bytes_received))
+        return "{}: FAILED ({:.1f}s): {}".format(self.nm_package_id.qualifiedId, self.duration, self.error)
 
 
 class NmPackageManager(object):
@@ -100,20 +217,228 @@ class NmPackageManager(object):
 
     This class will perform disk IO to check files on disk and Network IO to fetch files from a server.
     """
+    # the values derived from package ids {NmPackageId: value}, dropped together with the id, see `_derived`
+    _package_dirs = weakref.WeakKeyDictionary()
+    _git_project_slugs = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def _derived(cache: weakref.WeakKeyDictionary, nm_package_id: NmPackageId, compute):
+        """the value of `nm_package_id` in `cache`, computed by `compute(nm_package_id)` the first time"""
+        value = cache.get(nm_package_id)
+        if value is None:
+            value = cache.setdefault(nm_package_id, compute(nm_package_id))
+        return value
+
     @staticmethod
     def get_package_dir(nm_package_id: NmPackageId) -> Path:
         """
         return the path of the package in the system-wide package cache
         """
-        return Path(nm_package_id.packageId) / Path(nm_package_id.versionId)
+        return NmPackageManager._derived(NmPackageManager._package_dirs, nm_package_id,
+                                         lambda p: Path(p.packageId) / Path(p.versionId))
+
+    # the supported ways to clone the git repository of a package
+    #  * full: the complete history
+    #  * shallow: only the latest commit of the master branch
+    #  * blobless: the complete history but only the file contents of the checked out commit
+    CLONE_STRATEGIES = ("full", "shallow", "blobless")
+
+    # directory in the package cache root for NmPkg's own administration.
+    # Names starting with a '.' are reserved, they are never considered to be a package.
+    ADMIN_DIR = ".NmPkg"
 
     @property
     def package_cache_dir(self) -> Path:
         """absolute `Path` to the system-wide package cache root directory"""
         return self._package_cache_dir
 
-    def __init__(self, package_cache_dir: Path):
+    @property
+    def admin_dir(self) -> Path:
+        """absolute `Path` to NmPkg's administration directory inside the package cache"""
+        return self._package_cache_dir / NmPackageManager.ADMIN_DIR
+
+    def get_scan_index_file(self, tree: Path) -> Path:
+        """
+        return the `ScanIndex` file of a source `tree`, kept in the administration dir keyed by the absolute tree path
+        """
+        import hashlib
+        key = os.path.normcase(str(Path(tree).resolve()))
+        return self.admin_dir / "scan-index" / (hashlib.sha256(key.encode()).hexdigest()[:16] + ".json")
+
+    @property
+    def clone_strategy(self) -> str:
+        """the default clone strategy for new installs, one of `CLONE_STRATEGIES`"""
+        return self._clone_strategy
+
+    @clone_strategy.setter
+    def clone_strategy(self, clone_strategy: str):
+        NmPackageManager._check_clone_strategy(clone_strategy)
+        self._clone_strategy = clone_strategy
+
+    @property
+    def clone_strategy_overrides(self) -> dict:
+        """
+        per package overrides of `clone_strategy`
+
+        Maps a packageId (all versions) or a qualifiedId (a single version) to one of `CLONE_STRATEGIES`.
+        """
+        return self._clone_strategy_overrides
+
+    @property
+    def share_objects(self) -> bool:
+        """
+        share git objects between the versions of a package through a per packageId mirror, see `get_mirror_dir`
+        """
+        return self._share_objects
+
+    @share_objects.setter
+    def share_objects(self, share_objects: bool):
+        self._share_objects = share_objects
+
+    @property
+    def content_addressed(self) -> bool:
+        """
+        store the files of installed packages only once per unique content, see `content_store`
+
+        The files in the working tree of a package are replaced by hard links to the content store.
+        """
+        return self._content_addressed
+
+    @content_addressed.setter
+    def content_addressed(self, content_addressed: bool):
+        self._content_addressed = content_addressed
+
+    @property
+    def cache_budget(self) -> int:
+        """
+        the maximum size in bytes of all installed packages, None for unlimited
+
+        Installing packages evicts the least recently used packages that exceed the budget, see `evict`.
+        """
+        return self._cache_budget
+
+    @cache_budget.setter
+    def cache_budget(self, cache_budget: int):
+        self._cache_budget = cache_budget
+
+    # the supported ways to fetch a package, see `NmPackage.transport`
+    TRANSPORTS = ("git", "archive")
+
+    @property
+    def transport(self) -> str:
+        """the default transport, one of `TRANSPORTS`"""
+        return self._transport
+
+    @transport.setter
+    def transport(self, transport: str):
+        NmPackageManager._check_transport(transport)
+        self._transport = transport
+
+    @property
+    def transport_overrides(self) -> dict:
+        """
+        per package overrides of `transport`
+
+        Maps a packageId (all versions) or a qualifiedId (a single version) to one of `TRANSPORTS`.
+        """
+        return self._transport_overrides
+
+    @property
+    def archive_mirror_url(self) -> str:
+        """the base url of the artifact mirror used by the archive transport, see `ArchiveTransport`"""
+        return self._archive_mirror_url
+
+    @archive_mirror_url.setter
+    def archive_mirror_url(self, archive_mirror_url: str):
+        self._archive_mirror_url = archive_mirror_url
+
+    # the default `git_url_template`: the package server
+    DEFAULT_GIT_URL_TEMPLATE = "git@PC-CI-2.mtrs.intl:nmpackages/{slug}.git"
+
+    @property
+    def git_url_template(self) -> str:
+        """
+        the url of the git repository of a package, see `get_git_repo_url`
+
+        The placeholders {slug}, {packageId} and {versionId} are replaced by those of the package.
+        e.g. "file:///srv/nmpackages/{slug}.git" serves packages from local bare repositories.
+        """
+        return self._git_url_template
+
+    @git_url_template.setter
+    def git_url_template(self, git_url_template: str):
+        try:
+            git_url_template.format(slug="", packageId="", versionId="")
+        except (KeyError, IndexError, ValueError) as e:
+            raise Exception("invalid git url template: {}: {}".format(git_url_template, e))
+        self._git_url_template = git_url_template
+
+    @property
+    def content_store(self) -> ContentStore:
+        """the content store shared by all packages in the package cache, see `content_addressed`"""
+        return ContentStore(self.admin_dir / "store")
+
+    # the default maximum age in seconds of a cached remote head, see `get_remote_head`
+    DEFAULT_REMOTE_HEAD_MAX_AGE = 600
+
+    def __init__(self, package_cache_dir: Path, clone_strategy: str = "full", share_objects: bool = False,
+                 remote_head_max_age: float = DEFAULT_REMOTE_HEAD_MAX_AGE, content_addressed: bool = False,
+                 transport: str = "git", archive_mirror_url: str = None, cache_budget: int = None,
+                 git_url_template: str = None):
         self._package_cache_dir = package_cache_dir
+        self.clone_strategy = clone_strategy
+        self._clone_strategy_overrides = {}
+        self.transport = transport
+        self._transport_overrides = {}
+        self._transports = {t.name: t for t in (GitTransport(self), ArchiveTransport(self))}
+        self._archive_mirror_url = archive_mirror_url
+        self.git_url_template = git_url_template or NmPackageManager.DEFAULT_GIT_URL_TEMPLATE
+        self._cache_budget = cache_budget
+        self._share_objects = share_objects
+        self._content_addressed = content_addressed
+        self.remote_head_max_age = remote_head_max_age
+        self._manifest_cache = None
+
+
+    @staticmethod
+    def _check_clone_strategy(clone_strategy: str):
+        if clone_strategy not in NmPackageManager.CLONE_STRATEGIES:
+            raise Exception("unknown clone strategy: " + str(clone_strategy))
+
+    @staticmethod
+    def _check_transport(transport: str):
+        if transport not in NmPackageManager.TRANSPORTS:
+            raise Exception("unknown transport: " + str(transport))
+
+    def get_transport(self, nm_package_id: NmPackageId):
+        """the transport to fetch a package with, taking `transport_overrides` into account"""
+        for key in (nm_package_id.qualifiedId, nm_package_id.packageId):
+            if key in self.transport_overrides:
+                transport = self.transport_overrides[key]
+                NmPackageManager._check_transport(transport)
+                return self._transports[transport]
+
+        return self._transports[self.transport]
+
+    def _get_installed_transport(self, nm_package_id: NmPackageId):
+        """the transport an installed package was fetched with"""
+        absolute_path = self.package_cache_dir / self.get_package_dir(nm_package_id)
+        # packages installed by older NmPkg versions are git repositories
+        return self._transports[NmPackageManager._read_installed_marker(absolute_path).get("transport", "git")]
+
+    def _shares_objects(self, nm_package_id: NmPackageId) -> bool:
+        """whether a package borrows objects from its mirror, see `share_objects`"""
+        return self.share_objects and self.get_transport(nm_package_id).name == "git"
+
+    def get_clone_strategy(self, nm_package_id: NmPackageId) -> str:
+        """the clone strategy for a package, taking `clone_strategy_overrides` into account"""
+        for key in (nm_package_id.qualifiedId, nm_package_id.packageId):
+            if key in self.clone_strategy_overrides:
+                clone_strategy = self.clone_strategy_overrides[key]
+                NmPackageManager._check_clone_strategy(clone_strategy)
+                return clone_strategy
+
+        return self.clone_strategy
 
     @staticmethod
     def get_system_manager():
@@ -126,7 +451,17 @@ class NmPackageManager(object):
             raise Exception(
                 "The system-wide package cache dir does not exists.")
 
-        return NmPackageManager(system_wide_package_cache)
+        cache_budget = os.environ.get('NmPackageCacheBudget')
+        return NmPackageManager(system_wide_package_cache,
+                                archive_mirror_url=os.environ.get('NmPackageArchiveMirror'),
+                                cache_budget=parse_size(cache_budget) if cache_budget else None,
+                                git_url_template=os.environ.get('NmPackageGitUrlTemplate'))
+
+    # the sanitizations of `get_git_project_slug`
+    _SLUG_ILLEGAL_CHARS = re.compile(r'[^a-zA-Z0-9_\-.]')
+    _SLUG_ILLEGAL_START = re.compile(r'^-')
+    _SLUG_GIT_ENDING = re.compile(r'\.git$')
+    _SLUG_ATOM_ENDING = re.compile(r'\.atom$')
 
     @staticmethod
     def get_git_project_slug(nm_package_id: NmPackageId) -> str:
@@ -137,33 +472,56 @@ class NmPackageManager(object):
          * Path can contain only letters, digits, '_', '-' and '.'.
          * Cannot start with '-'
          * cannot end in '.git' or '.atom'
+
+        The slug is computed once per `NmPackageId`.
         """
+        return NmPackageManager._derived(NmPackageManager._git_project_slugs, nm_package_id,
+                                         NmPackageManager._make_git_project_slug)
+
+    @staticmethod
+    def _make_git_project_slug(nm_package_id: NmPackageId) -> str:
+        """the uncached `get_git_project_slug`"""
         git_slug = nm_package_id.qualifiedId
 
         # sanitize illegal chars
-        import re
-        git_slug = re.sub(r'[^a-zA-Z0-9_\-.]', '_', git_slug)
+        git_slug = NmPackageManager._SLUG_ILLEGAL_CHARS.sub('_', git_slug)
 
         # sanitize illegal start char
-        git_slug = re.sub(r'^-', "_", git_slug)
+        git_slug = NmPackageManager._SLUG_ILLEGAL_START.sub("_", git_slug)
 
         # sanitize illegal ending
-        git_slug = re.sub(r'\.git$', "_git", git_slug)
-        git_slug = re.sub(r'\.atom$', "_atom", git_slug)
+        git_slug = NmPackageManager._SLUG_GIT_ENDING.sub("_git", git_slug)
+        git_slug = NmPackageManager._SLUG_ATOM_ENDING.sub("_atom", git_slug)
 
         return git_slug
 
-    @staticmethod
-    def get_git_repo_url(nm_package_id: NmPackageId) -> str:
-        """url to the git repo of a package."""
-        slug = NmPackageManager.get_git_project_slug(nm_package_id)
-        return "git@PC-CI-2.mtrs.intl:nmpackages/{}.git".format(slug)
+    def get_git_repo_url(self, nm_package_id: NmPackageId) -> str:
+        """url to the git repo of a package, see `git_url_template`"""
+        return self.git_url_template.format(slug=NmPackageManager.get_git_project_slug(nm_package_id),
+                                            packageId=nm_package_id.packageId,
+                                            versionId=nm_package_id.versionId)
 
     def is_installed(self, nm_package_id: NmPackageId) -> bool:
         """
         check if a package is locally installed on the system.
 
         note that an installed package may be outdated!
+
+        The package manifest is consulted if the package cache has one, see `get_manifest`.
+        Otherwise the package directory is looked up on disk, see `_is_installed_on_disk`.
+        """
+        manifest = self.get_manifest()
+        if manifest is not None:
+            return nm_package_id.qualifiedId in manifest
+
+        return self._is_installed_on_disk(nm_package_id)
+
+    def _is_installed_on_disk(self, nm_package_id: NmPackageId) -> bool:
+        """
+        check if the directory of a package exists in the package cache, regardless of the manifest
+
+        Packages are moved into place atomically once completely installed, see `_install_package`.
+        Package directories of older NmPkg versions lack the `INSTALLED_MARKER` but are still considered installed.
         """
         return (self.package_cache_dir / NmPackageManager.get_package_dir(nm_package_id)).is_dir()
 
@@ -172,79 +530,529 @@ class NmPackageManager(object):
         check if a locally installed package is outdated.
         i.e. an outdated package will incurr network IO when being installed because.
 
+        A package is outdated if its local HEAD differs from the head of the master branch of its remote,
+        see `get_remote_head` for the caching of the latter.
+
         Note: non-installed packages are always considered outdated
         """
-        pass
+        if not self._is_installed_on_disk(nm_package_id):
+            return True
+
+        if self._get_installed_transport(nm_package_id) is not self.get_transport(nm_package_id):
+            # the package has to be fetched again with an other transport
+            return True
+
+        return self.get_local_head(nm_package_id) != self.get_remote_head(nm_package_id)
+
+    def get_local_head(self, nm_package_id: NmPackageId) -> str:
+        """
+        the head of an installed package, i.e. the commit SHA of HEAD or the sha256 of its archive
 
-    def install(self, nm_package_id: NmPackageId):
+        None if unknown, e.g. a package installed by hand.
+        """
+        absolute_path = self.package_cache_dir / self.get_package_dir(nm_package_id)
+        return self._get_installed_transport(nm_package_id).get_local_head(absolute_path)
+
+    def get_remote_head(self, nm_package_id: NmPackageId) -> str:
+        """
+        the head of a package on its remote, i.e. the commit SHA of its master branch or the sha256 of its archive
+
+        The remote is only queried if the cached head is older than `remote_head_max_age` seconds.
+        The cache is shared by all NmPkg processes through a file in the administration dir.
+        """
+        transport = self.get_transport(nm_package_id)
+        url = transport.get_url(nm_package_id)
+
+        cached = self._read_remote_heads().get(url)
+        if cached is not None and time.time() - cached[1] <= self.remote_head_max_age:
+            return cached[0]
+
+        head = transport.get_remote_head(nm_package_id)
+        self._cache_remote_head(url, head)
+        return head
+
+    @property
+    def remote_heads_file(self) -> Path:
+        """the file that caches the remote heads, see `get_remote_head`"""
+        return self.admin_dir / "remote-heads.json"
+
+    def _read_remote_heads(self) -> dict:
+        """read the remote head cache {url: [sha, timestamp]}, a missing or corrupt cache is empty"""
+        import json
+        try:
+            with self.remote_heads_file.open("tr") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _cache_remote_head(self, url: str, head: str):
+        with FileLock(self.admin_dir / "locks" / ".remote-heads.lock"):
+            # merge with the entries written by other processes
+            remote_heads = self._read_remote_heads()
+            remote_heads[url] = [head, time.time()]
+            write_json_atomically(self.remote_heads_file, remote_heads)
+
+    def install(self, nm_package_id: NmPackageId) -> InstallResult:
         """
         install/update a package to the system wide package cache.
 
         Installing may incur network and disk IO.
 
+        Installs are safe against concurrent installs and uninstalls by other threads and processes:
+        a package is installed at most once at a time and it is never seen half-installed, see `_install_package`.
+
+        Returns an `InstallResult` describing the performed action:
+        "install", "upgrade" or "up-to-date" (an installed package that is not outdated is left alone)
+
+        The package is recorded as used and, if a `cache_budget` is set, other packages may be evicted, see `evict`.
+
         Throws in case of failure: e.g network disconnections, disk is full, etc
         """
-        if self.is_installed(nm_package_id):
-            self._upgrade_package(nm_package_id)
-        else:
-            self._install_package(nm_package_id)
+        result = self._install(nm_package_id)
+        self._account_usage([result], [nm_package_id])
+        return result
+
+    def _install(self, nm_package_id: NmPackageId) -> InstallResult:
+        """install a package without usage accounting, see `install`"""
+        start = time.perf_counter()
+
+        # concurrent installers of the same package wait for each other, i.e. only one of them fetches
+        with Trace.span("install", package=nm_package_id.qualifiedId) as span, self._version_lock(nm_package_id):
+            if self._is_installed_on_disk(nm_package_id):
+                if self.is_outdated(nm_package_id):
+                    action = "upgrade"
+                    bytes_received = self._upgrade_package(nm_package_id)
+                    self._update_manifest(nm_package_id, self._create_manifest_entry(nm_package_id, time.time()))
+                else:
+                    action = "up-to-date"
+                    bytes_received = 0
+            else:
+                action = "install"
+                bytes_received = self._install_package(nm_package_id)
+                self._update_manifest(nm_package_id, self._create_manifest_entry(nm_package_id, time.time()))
+
+            if action != "up-to-date":
+                # a freshly fetched package is at the remote head
+                self._cache_remote_head(self.get_transport(nm_package_id).get_url(nm_package_id),
+                                        self.get_local_head(nm_package_id))
+            span.args["action"] = action
+
+        return InstallResult(nm_package_id, action, time.perf_counter() - start, bytes_received=bytes_received)
+
+    def install_all(self, nm_package_ids, jobs: int = 1, on_result=None) -> list:
+        """
+        install/update many packages at once using a pool of at most `jobs` concurrent installs.
+
+        A failing install does not abort the others. Instead every package yields an `InstallResult`
+        which is passed to the optional `on_result` callback as soon as it is available.
+        The callback is always invoked from the calling thread.
+
+        Usage accounting and eviction happen once all packages are installed, see `install`.
 
-    def _install_package(self, nm_package_id: NmPackageId):
+        Returns the list of `InstallResult`s in order of completion.
         """
-        install a package, i.e. perform git clone
+        if jobs < 1:
+            raise Exception("the number of jobs must be at least 1: " + str(jobs))
+        nm_package_ids = list(nm_package_ids)
+
+        def install_one(nm_package_id: NmPackageId) -> InstallResult:
+            start = time.perf_counter()
+            try:
+                return self._install(nm_package_id)
+            except Exception as e:
+                return InstallResult(nm_package_id, None, time.perf_counter() - start, e)
+
+        results = []
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(install_one, p) for p in nm_package_ids]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+
+        self._account_usage(results, nm_package_ids)
+        return results
+
+    def _account_usage(self, results: list, protected: list):
         """
+        record the usage of the up-to-date packages in `results` (fresh installs are recorded by `_install`)
+        and evict the packages that exceed the `cache_budget`, except the `protected` ones
+        """
+        up_to_date = [r.nm_package_id for r in results if r.action == "up-to-date"]
+        if up_to_date:
+            self.touch_packages(up_to_date)
+
+        if self.cache_budget is not None:
+            self.evict(protected=protected)
+
+    # file written in the root of a package as last step of its installation
+    INSTALLED_MARKER = ".NmPkg-installed"
+
+    def _version_lock(self, nm_package_id: NmPackageId) -> FileLock:
+        """the lock that serializes the (un)installation of a single package version"""
+        return FileLock(self.admin_dir / "locks" / nm_package_id.packageId / (nm_package_id.versionId + ".lock"))
 
+    def _package_lock(self, nm_package_id: NmPackageId) -> FileLock:
+        """
+        the lock that guards the directory and mirror shared by all versions of a package
+
+        Always acquire the version lock before the package lock.
+        """
+        return FileLock(self.admin_dir / "locks" / nm_package_id.packageId / ".package.lock")
+
+    def _install_package(self, nm_package_id: NmPackageId, replace: bool = False) -> int:
+        """
+        install a package, i.e. fetch it with its transport, see `get_transport`
+
+        The package is fetched into a staging directory inside the package cache,
+        completed with the `INSTALLED_MARKER` and then atomically renamed into place.
+        If `replace` then the installed package is swapped with the new one, otherwise it may not be installed yet.
+
+        The caller must hold the version lock.
+
+        Returns the number of bytes received
+        """
         absolute_path = self.package_cache_dir / self.get_package_dir(nm_package_id)
-        assert not absolute_path.exists()
+        assert replace == absolute_path.exists()
+
+        transport = self.get_transport(nm_package_id)
+        shares_objects = self._shares_objects(nm_package_id)
+        content_store = self.content_store if self.content_addressed else None
+
+        import contextlib
+        with contextlib.ExitStack() as stack:
+            if shares_objects:
+                # the mirror may not be removed (i.e. the last version uninstalled) while it is being borrowed from
+                stack.enter_context(self._package_lock(nm_package_id))
+
+            staging_path = self._create_staging_dir(nm_package_id)
+            replaced_path = Path(str(staging_path) + ".replaced")
+            try:
+                bytes_received, head = transport.fetch(nm_package_id, staging_path)
+
+                if self.content_addressed:
+                    self._add_to_content_store(staging_path)
+
+                self._write_installed_marker(staging_path, nm_package_id, transport.name, head)
+
+                # the package directory can only be created while no other version is uninstalled
+                with contextlib.ExitStack() as package_lock:
+                    if not shares_objects:
+                        package_lock.enter_context(self._package_lock(nm_package_id))
+                    absolute_path.parent.mkdir(parents=True, exist_ok=True)
+                    if replace:
+                        os.rename(str(absolute_path), str(replaced_path))
+                    try:
+                        os.rename(str(staging_path), str(absolute_path))
+                    except BaseException:
+                        if replace:
+                            os.rename(str(replaced_path), str(absolute_path))
+                        raise
+            except BaseException:
+                delete_tree(staging_path, content_store)
+                raise
+
+            if replace:
+                delete_tree(replaced_path, self.content_store if self.content_store.path.is_dir() else None)
+
+            if shares_objects and self.get_clone_strategy(nm_package_id) != "blobless":
+                self._update_mirror(nm_package_id)
+
+        return bytes_received
+
+    def _create_staging_dir(self, nm_package_id: NmPackageId) -> Path:
+        """create a new empty directory to install a package in before moving it into place"""
+        import tempfile
+        staging_root = self.admin_dir / "staging"
+        staging_root.mkdir(parents=True, exist_ok=True)
+        return Path(tempfile.mkdtemp(dir=str(staging_root), prefix=self.get_git_project_slug(nm_package_id) + "."))
+
+    def seed_package(self, nm_package_id: NmPackageId, files: dict, head: str):
+        """
+        install a package from its `files` {relative posix path: content} without fetching it,
+        e.g. to seed a package cache for load tests and benchmarks
 
-        # create the package directory
-        absolute_path.mkdir(parents=True)
+        The package looks as if it was installed from an archive with checksum `head`, see `ArchiveTransport`.
+        The manifest is not updated, `reindex` once all packages are seeded.
+        """
+        path = self.package_cache_dir / self.get_package_dir(nm_package_id)
+        path.mkdir(parents=True, exist_ok=True)
+        for name, content in files.items():
+            (path / name).parent.mkdir(parents=True, exist_ok=True)
+            (path / name).write_bytes(content)
+        self._write_installed_marker(path, nm_package_id, ArchiveTransport.name, head)
+
+    def _write_installed_marker(self, path: Path, nm_package_id: NmPackageId, transport: str, head: str):
+        """
+        mark a package directory as completely installed
 
-        # TODO add verbose logging
-        original_cwd = Path.cwd()
-        try:
-            os.chdir(absolute_path)
-            subprocess.check_call(["git", "clone", self.get_git_repo_url(nm_package_id), "."])
-        finally:
-            os.chdir(original_cwd)
+        The marker records what was installed, how and when. It is excluded from `git status` of the package.
+        The installed head is recorded as "commit", see `get_local_head`.
+        """
+        import json
+        marker = {"qualifiedId": nm_package_id.qualifiedId, "installed": time.time(),
+                  "transport": transport, "commit": head}
+        if (path / ".git").is_dir():
+            with (path / ".git" / "info" / "exclude").open("ta") as f:
+                f.write("\n/" + NmPackageManager.INSTALLED_MARKER + "\n")
+
+        with (path / NmPackageManager.INSTALLED_MARKER).open("tw") as f:
+            f.write(json.dumps(marker))
 
-    def _upgrade_package(self, nm_package_id: NmPackageId):
+    @staticmethod
+    def _read_installed_marker(path: Path) -> dict:
+        """the `INSTALLED_MARKER` of a package directory, empty if it has none (e.g. installed by older NmPkg)"""
+        import json
+        try:
+            with (path / NmPackageManager.INSTALLED_MARKER).open("tr") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _add_to_content_store(self, path: Path):
+        """replace the files in the working tree of a package by hard links to the content store"""
+        saved = self.content_store.add_tree(path)
+        DebugLog.print("content store saved {}: {}".format(format_size(saved), path))
+
+        if (path / ".git").is_dir():
+            # the links changed the stat info of the files, refresh the git index
+            # such that `git status` does not have to hash every file again
+            subprocess.call(["git", "update-index", "-q", "--refresh"], cwd=str(path), stdout=subprocess.DEVNULL)
+
+    def _upgrade_package(self, nm_package_id: NmPackageId) -> int:
         """
-        upgrade an existing package, i.e. perform git pull
+        upgrade an installed package in place if its transport supports it, otherwise install it again
+
+        The caller must hold the version lock.
+
+        Returns the number of bytes received
         """
-        # TODO what is repo is not clean?
         absolute_path = self.package_cache_dir / self.get_package_dir(nm_package_id)
         assert absolute_path.is_dir()
 
+        transport = self.get_transport(nm_package_id)
+        bytes_received = None
+        if self._get_installed_transport(nm_package_id) is transport:
+            bytes_received = transport.upgrade(nm_package_id, absolute_path)
 
-        # TODO add verbose logging
-        original_cwd = Path.cwd()
-        try:
-            os.chdir(absolute_path)
-            subprocess.check_call(["git", "pull", "origin", "master"])
-        finally:
-            os.chdir(original_cwd)
+        if bytes_received is None:
+            return self._install_package(nm_package_id, replace=True)
+
+        if self.content_addressed:
+            # the checkout replaced the changed files by unlinked copies
+            self._add_to_content_store(absolute_path)
+
+        return bytes_received
+
+    def get_mirror_dir(self, nm_package_id: NmPackageId) -> Path:
+        """
+        return the absolute path of the bare git repository that collects the objects of all versions of a package
+
+        New versions are cloned with the mirror as reference. Hence objects that are already in the mirror are
+        borrowed from it instead of being fetched and stored again, i.e. only the new objects go over the network.
+        The network savings require that the repositories of the versions share history,
+        the disk savings apply to all identical objects.
+        """
+        return self.admin_dir / "mirrors" / (nm_package_id.packageId + ".git")
+
+    def _create_mirror(self, nm_package_id: NmPackageId) -> Path:
+        """
+        create the mirror of a package if it does not exist yet and return its path
+
+        The caller must hold the package lock.
+        """
+        mirror = self.get_mirror_dir(nm_package_id)
+        if not mirror.is_dir():
+            subprocess.check_call(["git", "init", "-q", "--bare", str(mirror)])
+            # package versions borrow objects from the mirror, they may never be pruned
+            subprocess.check_call(["git", "config", "gc.auto", "0"], cwd=str(mirror))
+            subprocess.check_call(["git", "config", "gc.pruneExpire", "never"], cwd=str(mirror))
+        return mirror
+
+    @staticmethod
+    def _get_mirror_ref(nm_package_id: NmPackageId) -> str:
+        """the ref in the mirror that keeps the objects of a package version reachable"""
+        # the versionId is hex encoded since it may contain characters that are illegal in a ref name
+        return "refs/nmpkg/" + nm_package_id.versionId.encode().hex()
+
+    @staticmethod
+    def _is_partial_clone(absolute_path: Path) -> bool:
+        result = subprocess.run(["git", "config", "remote.origin.partialclonefilter"],
+                                cwd=str(absolute_path), stdout=subprocess.PIPE)
+        return result.returncode == 0
+
+    def _update_mirror(self, nm_package_id: NmPackageId):
+        """
+        move the objects of an installed package version into the mirror of its package
+
+        Partial clones lack the objects to do so, they only borrow from the mirror.
+
+        The caller must hold the package lock.
+        """
+        absolute_path = self.package_cache_dir / self.get_package_dir(nm_package_id)
+        mirror = self.get_mirror_dir(nm_package_id)
+
+        # keep the objects of this version reachable in the mirror
+        subprocess.check_call(["git", "fetch", "-q", str(absolute_path),
+                               "+HEAD:" + self._get_mirror_ref(nm_package_id)], cwd=str(mirror))
+
+        # drop the local copies of the objects that are now in the mirror
+        subprocess.check_call(["git", "repack", "-a", "-d", "-l", "-q"], cwd=str(absolute_path))
 
     def uninstall(self, nm_package_id: NmPackageId):
         """
         Delete a package from the system wide package cache.
 
-        Uninstall will perform Disk IO to remove the files from disk.
+        The package is atomically moved to the trash, hence uninstall returns at once.
+        The files are removed from disk later on by `reclaim_trash`.
+        """
+        with Trace.span("uninstall", package=nm_package_id.qualifiedId), \
+                self._version_lock(nm_package_id), self._package_lock(nm_package_id):
+            if not self._is_installed_on_disk(nm_package_id):
+                # Nothing to do: the package is not installed
+                # but it may still be in an outdated manifest
+                if self.is_installed(nm_package_id):
+                    self._update_manifest(nm_package_id, None)
+                return
+            absolute_package_path = self.package_cache_dir / self.get_package_dir(nm_package_id)  
+            self._move_to_trash(absolute_package_path)
+            self._update_manifest(nm_package_id, None)
+
+            if 0 == len(list(absolute_package_path.parent.iterdir())):
+                # the last version of the package is removed, 
+                # remove the package folder as well
+                absolute_package_path.parent.rmdir()
+
+            mirror = self.get_mirror_dir(nm_package_id)
+            if mirror.is_dir():
+                if not absolute_package_path.parent.exists():
+                    # no version borrows from the mirror anymore
+                    self._move_to_trash(mirror)
+                else:
+                    # other versions may still borrow objects reachable from this ref
+                    # but they are also reachable from their own refs and the mirror is never pruned
+                    subprocess.check_call(["git", "update-ref", "-d", self._get_mirror_ref(nm_package_id)],
+                                          cwd=str(mirror))
+
+    def uninstall_all(self, nm_package_ids, jobs: int = 1):
+        """
+        uninstall many packages at once using a pool of at most `jobs` concurrent uninstalls, see `uninstall`
+
+        Throws the first failure after all uninstalls finished.
         """
-        if not self.is_installed(nm_package_id):
-            # Nothing to do: the package is not installed
-            return
-        absolute_package_path = self.package_cache_dir / self.get_package_dir(nm_package_id)  
-        delete_tree(absolute_package_path)
+        if jobs < 1:
+            raise Exception("the number of jobs must be at least 1: " + str(jobs))
 
-        if 0 == len(list(absolute_package_path.parent.iterdir())):
-            # the last version of the package is removed, 
-            # remove the package folder as well
-            absolute_package_path.parent.rmdir()
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(self.uninstall, p) for p in nm_package_ids]
+        for future in futures:
+            future.result()
+
+    def get_package_size(self, nm_package_id: NmPackageId) -> int:
+        """
+        the disk usage in bytes of an installed package
+
+        The size recorded in the manifest is used if possible, see `get_manifest`.
+        """
+        manifest = self.get_manifest()
+        if manifest is not None and nm_package_id.qualifiedId in manifest:
+            return manifest[nm_package_id.qualifiedId]["size"]
+
+        return tree_size(self.package_cache_dir / self.get_package_dir(nm_package_id))
+
+    @property
+    def trash_dir(self) -> Path:
+        """the directory with the uninstalled packages that still have to be deleted from disk, see `reclaim_trash`"""
+        return self.admin_dir / "trash"
+
+    def _move_to_trash(self, path: Path):
+        """atomically move a directory of the package cache out of the way"""
+        import uuid
+        self.trash_dir.mkdir(parents=True, exist_ok=True)
+        # the name is unique, hence the rename never races with a concurrent `reclaim_trash`
+        os.rename(str(path), str(self.trash_dir / (path.name + "." + uuid.uuid4().hex)))
+
+    def has_trash(self) -> bool:
+        """check if there is anything to reclaim in the trash"""
+        try:
+            with os.scandir(str(self.trash_dir)) as entries:
+                return any(True for _ in entries)
+        except FileNotFoundError:
+            return False
+
+    def reclaim_trash(self, jobs: int = None, blocking: bool = True) -> bool:
+        """
+        delete everything in the trash from disk, using a pool of `jobs` threads, see `delete_tree_parallel`
+
+        The content store is garbage collected afterwards since the trash may hold the last links to its files.
+
+        Only one process reclaims the trash at a time, others wait for it unless not `blocking`.
+        Returns False if the trash was not reclaimed because an other process is already doing so.
+        """
+        lock = FileLock(self.admin_dir / "locks" / ".trash.lock")
+        if not lock.acquire(blocking):
+            return False
+
+        try:
+            reclaimed = False
+            while True:
+                # uninstalls may continue to fill the trash while reclaiming
+                try:
+                    trash = list(os.scandir(str(self.trash_dir)))
+                except FileNotFoundError:
+                    trash = []
+                if not trash:
+                    break
+
+                for entry in trash:
+                    DebugLog.print("reclaiming: " + entry.path)
+                    delete_tree_parallel(Path(entry.path), jobs)
+                reclaimed = True
+
+            if reclaimed and self.content_store.path.is_dir():
+                # collected even if `content_addressed` was turned off in the mean time
+                self.content_store.gc()
+        finally:
+            lock.release()
+        return True
+
+    def spawn_trash_reclaimer(self):
+        """
+        reclaim the trash in a detached background process, see `reclaim_trash`
+
+        The background process outlives the current one, i.e. the caller does not wait for the files to be deleted.
+        """
+        import sys
+        if os.name == "nt":
+            # note: subprocess.DETACHED_PROCESS requires python 3.7
+            DETACHED_PROCESS = 0x00000008
+            flags = {"creationflags": DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            flags = {"start_new_session": True}
+
+        DebugLog.print("spawning trash reclaimer")
+        subprocess.Popen([sys.executable, "-m", "NmPackage.cli.reclaim", str(self.package_cache_dir)],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         close_fds=True, **flags)
 
     def get_installed_packages(self) -> set:
         """
         Return a set of NmPackageId's that are installed in the system-wide package cache
+
+        The package manifest is used if the package cache has one, see `get_manifest`.
+        """
+        manifest = self.get_manifest()
+        if manifest is not None:
+            return set(NmPackageId.intern(entry["packageId"], entry["versionId"]) for entry in manifest.values())
+
+        return self._find_installed_packages()
+
+    def _find_installed_packages(self) -> set:
+        """
+        Return a set of NmPackageId's of all package directories in the system-wide package cache
         """
         # the packege cache has fixes structure
         #    <packageId>/<versionId>
@@ -262,17 +1070,329 @@ class NmPackageManager(object):
             path_parts = rel_path.parts
             assert 2 == len(path_parts)
 
+            if path_parts[0].startswith(".") or path_parts[1].startswith("."):
+                # skip reserved names, e.g. the administration dir `ADMIN_DIR`
+                continue
+
             # aggregate
-            packages.add(NmPackageId(path_parts[0], path_parts[1]))
+            packages.add(NmPackageId.intern(path_parts[0], path_parts[1]))
+
+        return packages
+
+    # bump when the manifest format changes, older manifests are rebuilt from disk
+    MANIFEST_VERSION = 1
+
+    @property
+    def manifest_file(self) -> Path:
+        """the index of all installed packages, see `get_manifest`"""
+        return self.admin_dir / "manifest.json"
+
+    def get_manifest(self) -> dict:
+        """
+        Return the package manifest {qualifiedId: entry} or None if the package cache has no (valid) manifest.
+
+        The manifest indexes the installed packages such that listing them or checking whether a package is
+        installed does not have to scan the package cache. An entry is a dict with keys
+          * packageId, versionId
+          * installed: timestamp of the installation
+          * commit: the installed commit SHA (None if the package is not a git repository)
+          * size: disk usage of the package in bytes
+          * last_used: timestamp of the last install, verification or reference, see `touch_packages`
+
+        The manifest is updated by `install` and `uninstall` and can be rebuilt from disk by `reindex`.
+        It is only read again once the manifest file was replaced, i.e. a query costs a single open & stat.
+        Do not modify the returned dict.
+        """
+        try:
+            f = self.manifest_file.open("tr")
+        except OSError:
+            return None
+
+        with f:
+            st = os.fstat(f.fileno())
+            key = (st.st_ino, st.st_mtime_ns, st.st_size)
+            cached = self._manifest_cache
+            if cached is not None and cached[0] == key:
+                return cached[1]
+
+            manifest = NmPackageManager._parse_manifest(f.read())
+
+        self._manifest_cache = (key, manifest)
+        return manifest
+
+    @staticmethod
+    def _parse_manifest(text: str) -> dict:
+        """the packages in a manifest file, None if it is corrupt or of an other format version"""
+        import json
+        try:
+            manifest = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(manifest, dict) or manifest.get("version") != NmPackageManager.MANIFEST_VERSION:
+            return None
+        return manifest["packages"]
+
+    def _read_manifest(self) -> dict:
+        """read the manifest file, bypassing the cache of `get_manifest`"""
+        try:
+            with self.manifest_file.open("tr") as f:
+                return NmPackageManager._parse_manifest(f.read())
+        except OSError:
+            return None
+
+    def _write_manifest(self, packages: dict):
+        write_json_atomically(self.manifest_file, {"version": NmPackageManager.MANIFEST_VERSION,
+                                                   "packages": packages})
 
+    def _manifest_lock(self) -> FileLock:
+        """the lock that serializes the updates of the manifest"""
+        return FileLock(self.admin_dir / "locks" / ".manifest.lock")
+
+    def _update_manifest(self, nm_package_id: NmPackageId, entry: dict):
+        """
+        add/replace (`entry`) or remove (`entry` is None) a single package of the manifest
+
+        A package cache without (valid) manifest, e.g. one of an older NmPkg version, is indexed first.
+        """
+        def update(packages: dict):
+            if entry is None:
+                packages.pop(nm_package_id.qualifiedId, None)
+            else:
+                packages[nm_package_id.qualifiedId] = entry
+
+        self._modify_manifest(update)
+
+    def _modify_manifest(self, modify):
+        """
+        read, `modify(packages)` in place and write the manifest while holding the manifest lock
+
+        A package cache without (valid) manifest, e.g. one of an older NmPkg version, is indexed first.
+        """
+        with self._manifest_lock():
+            # merge with the updates of other processes
+            packages = self._read_manifest()
+            if packages is None:
+                packages = self.build_manifest()
+
+            modify(packages)
+            self._write_manifest(packages)
+
+    def _create_manifest_entry(self, nm_package_id: NmPackageId, last_used: float = None) -> dict:
+        """
+        create the manifest entry of an installed package from the package directory
+
+        Unless given the package is considered last used when it was installed.
+        """
+        absolute_path = self.package_cache_dir / self.get_package_dir(nm_package_id)
+
+        installed = NmPackageManager._read_installed_marker(absolute_path).get("installed")
+        if installed is None:
+            # installed by an older NmPkg version
+            installed = absolute_path.stat().st_mtime
+
+        return {"packageId": nm_package_id.packageId,
+                "versionId": nm_package_id.versionId,
+                "installed": installed,
+                # note: the commit in the `INSTALLED_MARKER` is outdated after a git upgrade
+                "commit": self.get_local_head(nm_package_id),
+                "size": tree_size(absolute_path),
+                "last_used": installed if last_used is None else last_used}
+
+    def build_manifest(self, jobs: int = None) -> dict:
+        """
+        Create the package manifest {qualifiedId: entry} by scanning the package cache, see `get_manifest`
+
+        The package directories are inspected by a pool of `jobs` threads.
+        """
+        def create_entry(nm_package_id: NmPackageId) -> dict:
+            try:
+                return self._create_manifest_entry(nm_package_id)
+            except Exception:
+                if self._is_installed_on_disk(nm_package_id):
+                    raise
+                # uninstalled in the mean time
+                return None
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            packages = self._find_installed_packages()
+            entries = executor.map(create_entry, packages)
+            return {p.qualifiedId: entry for p, entry in zip(packages, entries) if entry is not None}
+
+    def reindex(self, jobs: int = None) -> dict:
+        """
+        Rebuild the package manifest from disk and return it, see `build_manifest`
+
+        e.g. after packages were added or removed by hand.
+        """
+        with self._manifest_lock():
+            packages = self.build_manifest(jobs)
+
+            # the usage of packages can't be derived from disk, keep it
+            previous = self._read_manifest() or {}
+            for qualifiedId, entry in packages.items():
+                if "last_used" in previous.get(qualifiedId, {}):
+                    entry["last_used"] = previous[qualifiedId]["last_used"]
+
+            self._write_manifest(packages)
         return packages
 
+    def touch_packages(self, nm_package_ids):
+        """
+        record that packages are used now, e.g. installed, verified to be up-to-date or referenced by a project
+
+        Packages that are not installed are ignored.
+        The least recently used packages are evicted first, see `evict`.
+        """
+        now = time.time()
 
-def delete_tree(path: Path):
+        def touch(packages: dict):
+            for p in nm_package_ids:
+                entry = packages.get(p.qualifiedId)
+                if entry is not None:
+                    entry["last_used"] = now
+
+        self._modify_manifest(touch)
+
+    def evict(self, budget: int = None, protected=()) -> list:
+        """
+        uninstall the least recently used packages until the installed packages fit in `budget` bytes
+
+        `budget` defaults to `cache_budget`, nothing is evicted if neither is set.
+        `protected` packages are never evicted, e.g. the packages needed by the current operation.
+        Hence the budget may still be exceeded afterwards.
+
+        Note that the budget applies to the sizes in the manifest, i.e. it excludes the administration dir
+        (mirrors, content store, trash) and counts files shared through the content store for every package.
+
+        Returns the list of evicted packages, least recently used first
+        """
+        if budget is None:
+            budget = self.cache_budget
+        if budget is None:
+            return []
+
+        manifest = self.get_manifest()
+        if manifest is None:
+            manifest = self.reindex()
+
+        size = sum(entry["size"] for entry in manifest.values())
+        protected = set(p.qualifiedId for p in protected)
+        candidates = sorted((entry for qualifiedId, entry in manifest.items() if qualifiedId not in protected),
+                            key=lambda entry: entry.get("last_used", entry["installed"]))
+
+        evicted = []
+        for entry in candidates:
+            if size <= budget:
+                break
+            p = NmPackageId.intern(entry["packageId"], entry["versionId"])
+            DebugLog.print("evicting: {} ({})".format(p.qualifiedId, format_size(entry["size"])))
+            self.uninstall(p)
+            size -= entry["size"]
+            evicted.append(p)
+
+        return evicted
+
+
+def write_json_atomically(path: Path, obj):
+    """
+    serialize `obj` as json to `path` such that readers either see the old or the new file, never a partial one
+    """
+    import json
+    # note: json.dumps uses the C encoder, json.dump does not
+    write_atomically(path, json.dumps(obj).encode())
+
+
+def write_atomically(path: Path, content: bytes):
+    """
+    write `content` to `path` such that readers either see the old or the new file, never a partial one
+
+    The content is written to a temporary file next to `path` which then replaces `path`.
+    The permissions of an existing file are preserved.
+    """
+    import tempfile
+    path = Path(path)
+    with Trace.span("write", path=path, size=len(content)):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            if path.exists():
+                shutil.copymode(str(path), tmp_file)
+            os.replace(tmp_file, str(path))
+        except BaseException:
+            os.unlink(tmp_file)
+            raise
+
+
+def tree_size(path: Path) -> int:
+    """
+    Return the total size in bytes of all files in a directory tree, 0 if it does not exist.
+
+    Symbolic links are not followed.
+    """
+    size = 0
+    stack = [str(path)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    size += entry.stat(follow_symlinks=False).st_size
+    return size
+
+
+def raise_failures(failures: list, total: int, action: str, items: str):
+    """
+    raise a single exception summarizing the `failures` [(item, error)] of an `action` on `total` `items` (if any)
+
+        failed to integrate 2 of 10 projects:
+          * a.vcxproj: ...
+          * b.vcxproj: ...
+    """
+    if failures:
+        msg = "failed to {} {} of {} {}:".format(action, len(failures), total, items)
+        for item, e in failures:
+            msg += "\n  * {}: {}".format(item, e)
+        raise Exception(msg)
+
+
+def format_size(size: int) -> str:
+    """human readable size, e.g. "1.5 MiB" """
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            break
+        size /= 1024
+    if unit == "B":
+        return "{} B".format(size)
+    return "{:.1f} {}".format(size, unit)
+
+
+def parse_size(text: str) -> int:
+    """parse a human readable size in bytes, e.g. "1.5 GiB", "500M" or "1024" (units are powers of 1024)"""
+    import re
+    match = re.fullmatch(r"\s*([0-9]+(?:\.[0-9]*)?)\s*(?:([KMGT])i?)?B?\s*", text, re.IGNORECASE)
+    if match is None:
+        raise Exception("invalid size: " + text)
+    exponent = " KMGT".index((match.group(2) or " ").upper())
+    return int(float(match.group(1)) * 1024 ** exponent)
+
+
+def delete_tree(path: Path, content_store: ContentStore = None):
     """
     Recursively delete a whole directory tree.
 
     Note that this method will even delete read-only files provided that the user has the rights.
+
+    If a `content_store` is given then its files that are no longer referenced are deleted as well,
+    e.g. because `path` held their last links.
     """
     if not path.exists():
         return
@@ -302,3 +1422,76 @@ def delete_tree(path: Path):
     import shutil
     shutil.rmtree(path, onerror=onerror)
 
+    if content_store is not None:
+        content_store.gc()
+
+
+def delete_tree_parallel(path: Path, jobs: int = None):
+    """
+    Recursively delete a whole directory tree using a pool of `jobs` threads.
+
+    Every directory is listed and emptied of its files by a worker,
+    the directories themselves are removed bottom-up once all files are gone.
+
+    Like `delete_tree` this will even delete read-only files and directories.
+    Their permissions are fixed up front, based on the directory listing, instead of retrying failed removals.
+    Entries that disappear concurrently are ignored.
+    """
+    import stat
+    path = Path(path)
+    if not path.exists():
+        return
+
+    if not path.is_dir() or path.is_symlink():
+        raise Exception("input `path` must be a directory.")
+
+    def is_read_only(entry) -> bool:
+        # on Windows read-only files can't be removed, `scandir` reports their attributes without extra IO
+        return os.name == "nt" and bool(entry.stat(follow_symlinks=False).st_file_attributes &
+                                        stat.FILE_ATTRIBUTE_READONLY)
+
+    def remove(func, path: str):
+        try:
+            func(path)
+        except FileNotFoundError:
+            pass
+        except PermissionError:
+            os.chmod(path, stat.S_IRWXU)
+            func(path)
+
+    def empty_dir(dir: str) -> list:
+        """unlink all non-directories in `dir` and return its sub directories"""
+        try:
+            if not os.access(dir, os.R_OK | os.W_OK | os.X_OK):
+                # the entries of the directory can't be listed or removed
+                os.chmod(dir, stat.S_IRWXU)
+            with os.scandir(dir) as it:
+                entries = list(it)
+        except FileNotFoundError:
+            # removed by a concurrent reclaimer
+            return []
+
+        sub_dirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                sub_dirs.append(entry.path)
+            else:
+                if is_read_only(entry):
+                    os.chmod(entry.path, stat.S_IWRITE)
+                remove(os.unlink, entry.path)
+        return sub_dirs
+
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    dirs = [str(path)]
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = {executor.submit(empty_dir, dirs[0])}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for sub_dir in future.result():
+                    dirs.append(sub_dir)
+                    pending.add(executor.submit(empty_dir, sub_dir))
+
+    # sub directories are always listed after their parent
+    for dir in reversed(dirs):
+        remove(os.rmdir, dir)
@@ -0,0 +1,42 @@
+"""
+Benchmarks of the NmPkg tool
+
+Every benchmark module can be run on its own, e.g.
+
+    python -m NmPackage.benchmark.bench_scan --help
+
+The benchmark suite runs them all with workloads of a given size and guards against regressions, see `suite`:
+
+    python -m NmPackage.benchmark --help
+
+The benchmarks build synthetic workloads in a temporary directory. They never touch the system-wide package cache.
+"""
+import time
+
+
+def best_of(fn, repeat: int = 3, setup=None) -> float:
+    """
+    run `fn` `repeat` times and return the best wall-clock time in seconds
+
+    `setup` (if given) is called before every run and is not timed, e.g. to recreate what `fn` consumes.
+    """
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def print_timings(title: str, timings: list):
+    """
+    print a table of (name, seconds) `timings` and their speedup relative to the first entry
+    """
+    print(title)
+    reference = timings[0][1]
+    for name, seconds in timings:
+        print("  {:<32} {:>12.3f}ms  {:>6.2f}x".format(name, seconds * 1000, reference / seconds))
@@ -0,0 +1,3 @@
+from NmPackage.benchmark.suite import main
+
+main()
@@ -0,0 +1,63 @@
+"""
+Benchmark the deletion of installed packages: `delete_tree` against `delete_tree_parallel`
+and the time an uninstall blocks now that it moves the package to the trash.
+
+    python -m NmPackage.benchmark.bench_delete --dirs 256 --files 100
+"""
+from NmPackage import NmPackageManager, NmPackageId, delete_tree, delete_tree_parallel
+from NmPackage.benchmark import best_of, print_timings
+from NmPackage.debug import DebugLog
+from pathlib import Path
+import argparse
+import os
+
+
+def make_package(root: Path, dirs: int, files: int):
+    """
+    create a synthetic package in `root` that resembles a git repository with loose objects:
+    `dirs` fan-out directories with `files` small read-only files each
+    """
+    for i in range(dirs):
+        d = root / ".git" / "objects" / "{:02x}".format(i)
+        d.mkdir(parents=True)
+        for j in range(files):
+            f = d / "{:038x}".format(j)
+            f.write_bytes(os.urandom(64))
+            f.chmod(0o444)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the deletion of installed packages")
+    parser.add_argument("--dirs", type=int, default=256, help="number of directories in the package")
+    parser.add_argument("--files", type=int, default=100, help="number of files per directory")
+    parser.add_argument("--jobs", type=int, default=None, help="number of deleter threads")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    DebugLog.enabled = False
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        mgr = NmPackageManager(Path(tmp))
+        p = NmPackageId("package", "1.0.0")
+        package_dir = mgr.package_cache_dir / mgr.get_package_dir(p)
+
+        # every run deletes a fresh copy of the package, keep the best time
+        def best_delete(delete) -> float:
+            def run():
+                delete(package_dir)
+                assert not package_dir.exists()
+            return best_of(run, args.repeat, setup=lambda: make_package(package_dir, args.dirs, args.files))
+
+        timings = [
+            ("delete_tree (rmtree)", best_delete(delete_tree)),
+            ("delete_tree_parallel", best_delete(lambda path: delete_tree_parallel(path, args.jobs))),
+            ("uninstall (move to trash)", best_delete(lambda path: mgr.uninstall(p))),
+            # a single run reclaims the packages trashed by all uninstalls
+            ("reclaim_trash", best_of(lambda: mgr.reclaim_trash(args.jobs), 1) / args.repeat),
+        ]
+        print_timings("delete a package of {} dirs with {} files each:".format(args.dirs, args.files), timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Micro benchmark of the `NmPackageDepsFileFormat.deserialize` parser backends.
+
+    python -m NmPackage.benchmark.bench_deps_parse --imports 1 10 500
+"""
+from NmPackage import NmPackageId
+from NmPackage.benchmark import best_of, print_timings
+from NmPackage.save import NmPackageDepsFileFormat
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the NmPackageDeps.props parser backends")
+    parser.add_argument("--imports", type=int, nargs="+", default=[1, 10, 500],
+                        help="number of imports per props file")
+    parser.add_argument("--number", type=int, default=200, help="number of parses per timing")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # the reference parser comes first
+    parsers = ("minidom", "iterparse", "canonical")
+    assert set(parsers) == set(NmPackageDepsFileFormat.PARSERS)
+
+    for imports in args.imports:
+        packages = [NmPackageId("package{}".format(i), "1.0.{}".format(i)) for i in range(imports)]
+        xml = NmPackageDepsFileFormat.serialize(packages)
+        for p in parsers:
+            assert set(packages) == NmPackageDepsFileFormat.deserialize(xml, p)
+
+        def parse_n(p):
+            for _ in range(args.number):
+                NmPackageDepsFileFormat.deserialize(xml, p)
+
+        timings = [(p, best_of(lambda: parse_n(p), args.repeat) / args.number) for p in parsers]
+        print_timings("deserialize a props file with {} imports:".format(imports), timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Micro benchmark of the import path codec of `NmPackageDepsFileFormat`: the single pass `_package_to_path`
+and `_path_to_package` against their pathlib reference implementations.
+
+    python -m NmPackage.benchmark.bench_import_path --paths 1000000
+"""
+from NmPackage import NmPackageId
+from NmPackage.benchmark import best_of, print_timings
+from NmPackage.save import NmPackageDepsFileFormat
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the NmPackageDeps.props import path codec")
+    parser.add_argument("--paths", type=int, default=1000000, help="number of paths to encode and decode")
+    parser.add_argument("--packages", type=int, default=10000,
+                        help="number of distinct package ids among the paths, as in a monorepo")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    catalog = [NmPackageId("package{}".format(i // 4), "1.{}.0".format(i % 4)) for i in range(args.packages)]
+    packages = [catalog[i % args.packages] for i in range(args.paths)]
+    paths = [NmPackageDepsFileFormat._package_to_path(p) for p in packages]
+    # the reference comes first
+    codecs = (("pathlib", NmPackageDepsFileFormat._package_to_path_pathlib,
+               NmPackageDepsFileFormat._path_to_package_pathlib),
+              ("single pass", NmPackageDepsFileFormat._package_to_path,
+               NmPackageDepsFileFormat._path_to_package))
+    for name, encode, decode in codecs:
+        assert paths[:1000] == [encode(p) for p in packages[:1000]]
+        assert packages[:1000] == [decode(p) for p in paths[:1000]]
+
+    print_timings("encode {} paths of {} packages:".format(args.paths, args.packages),
+                  [(name, best_of(lambda: [encode(p) for p in packages], args.repeat))
+                   for name, encode, decode in codecs])
+    print_timings("decode {} paths of {} packages:".format(args.paths, args.packages),
+                  [(name, best_of(lambda: [decode(p) for p in paths], args.repeat))
+                   for name, encode, decode in codecs])
+
+
+if __name__ == "__main__":
+    main()
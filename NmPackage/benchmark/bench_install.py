@@ -0,0 +1,70 @@
+"""
+Benchmark the end-to-end install and upgrade throughput of `NmPackageManager.install_all`,
+sequentially and concurrently, with packages served from local bare repositories, see `NmPackage.localremote`.
+
+    python -m NmPackage.benchmark.bench_install --packages 32 --latency 0.05 --jobs 8
+"""
+from NmPackage import NmPackageManager, delete_tree
+from NmPackage.benchmark import best_of, print_timings
+from NmPackage.debug import DebugLog
+from NmPackage.generate import make_packages
+from NmPackage.localremote import LocalRemotes
+from pathlib import Path
+import argparse
+
+
+def install_all(mgr: NmPackageManager, catalog: list, jobs: int, expected_action: str):
+    results = mgr.install_all(catalog, jobs=jobs)
+    failed = [str(r) for r in results if not r.succeeded or r.action != expected_action]
+    if failed:
+        raise Exception("unexpected install results:\n" + "\n".join(failed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the install and upgrade throughput")
+    parser.add_argument("--packages", type=int, default=32, help="number of packages to install")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="simulated round trip time in seconds of every git command talking to a remote")
+    parser.add_argument("--jobs", type=int, default=8, help="number of concurrent installs")
+    parser.add_argument("--clone-strategy", choices=NmPackageManager.CLONE_STRATEGIES, default="full")
+    args = parser.parse_args()
+
+    DebugLog.enabled = False
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = make_packages(args.packages, 1)
+        remotes = LocalRemotes(Path(tmp) / "remotes", args.latency)
+        remotes.create(catalog)
+
+        with remotes:
+            cache_dir = Path(tmp) / "cache"
+
+            def fresh_manager() -> NmPackageManager:
+                if cache_dir.exists():
+                    delete_tree(cache_dir)
+                cache_dir.mkdir()
+                # every install queries the remote head, as if the cached heads expired
+                return NmPackageManager(cache_dir, clone_strategy=args.clone_strategy, remote_head_max_age=0,
+                                        git_url_template=remotes.url_template)
+
+            timings = []
+            for jobs in (1, args.jobs):
+                mode = "sequential" if jobs == 1 else "{} jobs".format(jobs)
+                mgr = fresh_manager()
+                timings.append(("install ({})".format(mode),
+                                best_of(lambda: install_all(mgr, catalog, jobs, "install"), 1)))
+                timings.append(("up-to-date ({})".format(mode),
+                                best_of(lambda: install_all(mgr, catalog, jobs, "up-to-date"), 1)))
+                for p in catalog:
+                    remotes.update(p, {"NmPackage.props": "<Project>{}</Project>\r\n".format(mode).encode()})
+                timings.append(("upgrade ({})".format(mode),
+                                best_of(lambda: install_all(mgr, catalog, jobs, "upgrade"), 1)))
+
+        print_timings("install {} packages, {}s latency:".format(args.packages, args.latency), timings)
+        for name, seconds in timings:
+            print("  {:<32} {:>10.1f} packages/s".format(name, args.packages / seconds))
+
+
+if __name__ == "__main__":
+    main()
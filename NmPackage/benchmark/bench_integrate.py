@@ -0,0 +1,89 @@
+"""
+Benchmark the integration of a large *.vcxproj file: the "dom" engine against the "stream" engine
+of `VcxProjectFile.integrate_nmpkg`, in wall-clock time and peak (python) memory.
+
+    python -m NmPackage.benchmark.bench_integrate --files 50000
+"""
+from NmPackage.benchmark import print_timings
+from NmPackage.debug import DebugLog
+from NmPackage.save import VcxProjectFile
+from pathlib import Path
+import argparse
+import time
+import tracemalloc
+
+
+def make_vcxproj(path: Path, files: int):
+    """
+    write a synthetic *.vcxproj file listing `files` source files with per-configuration settings,
+    i.e. about 400 bytes per file
+    """
+    with path.open("wb") as f:
+        f.write(b'<?xml version="1.0" encoding="utf-8"?>\r\n'
+                b'<Project DefaultTargets="Build" ToolsVersion="15.0" '
+                b'xmlns="http://schemas.microsoft.com/developer/msbuild/2003">\r\n'
+                b'  <ItemGroup>\r\n')
+        for i in range(files):
+            f.write('    <ClCompile Include="src\\module{0}\\file{1}.cpp">\r\n'
+                    '      <ExcludedFromBuild Condition="\'$(Configuration)|$(Platform)\'==\'Debug|x64\'">'
+                    'false</ExcludedFromBuild>\r\n'
+                    '      <!-- generated <ClCompile> entry -->\r\n'
+                    '      <PreprocessorDefinitions>MODULE={0};FILE={1};%(PreprocessorDefinitions)'
+                    '</PreprocessorDefinitions>\r\n'
+                    '    </ClCompile>\r\n'.format(i // 100, i).encode())
+        f.write(b'  </ItemGroup>\r\n'
+                b'</Project>\r\n')
+
+
+def measure(path: Path, engine: str, trace: bool) -> tuple:
+    """
+    integrate the project, return a tuple (seconds, peak bytes allocated)
+
+    Tracing allocations slows python down considerably, hence the time is only meaningful if `trace` is False
+    and the peak only if `trace` is True.
+    """
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    VcxProjectFile(path).integrate_nmpkg(engine)
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the integration of a large *.vcxproj file")
+    parser.add_argument("--files", type=int, default=50000, help="number of source files in the project")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    DebugLog.enabled = False
+
+    import tempfile
+    import shutil
+    with tempfile.TemporaryDirectory() as tmp:
+        template = Path(tmp) / "template.vcxproj"
+        make_vcxproj(template, args.files)
+        path = Path(tmp) / "Project.vcxproj"
+
+        timings = []
+        for engine in VcxProjectFile.ENGINES:
+            # every run integrates a fresh copy of the project, keep the best time
+            best = None
+            for _ in range(args.repeat):
+                shutil.copy(str(template), str(path))
+                elapsed = measure(path, engine, trace=False)[0]
+                best = elapsed if best is None else min(best, elapsed)
+            shutil.copy(str(template), str(path))
+            peak = measure(path, engine, trace=True)[1]
+            timings.append(("{} (peak {:.1f}MB)".format(engine, peak / 2 ** 20), best))
+
+        size = template.stat().st_size
+        print_timings("integrate a project of {:.1f}MB:".format(size / 2 ** 20), timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark the *.NmPackageDeps.props dirtree scanner `NmPackage.scan` against the original `os.walk` based walker.
+
+    python -m NmPackage.benchmark.bench_scan --dirs 40000 --projects 2000
+"""
+from NmPackage import NmPackageId
+from NmPackage.benchmark import best_of, print_timings
+from NmPackage.debug import DebugLog
+from NmPackage.save import NmPackageDepsFileFormat
+from NmPackage.scan import collect_all_packages, ScanIndex
+from pathlib import Path
+import argparse
+import os
+import random
+
+
+def legacy_collect_all_packages(tree: Path) -> set:
+    """
+    the original `os.walk` based implementation of `collect_all_packages` as reference
+    """
+    packages = set()
+
+    ignoreFolders = ['.svn', '.git']
+    for root, dirs, files in os.walk(tree):
+        for f in ignoreFolders:
+            if (f in dirs):
+                dirs.remove(f)
+
+        nm_package_deps_files = [Path(root) / Path(f) for f in files if f.endswith(".NmPackageDeps.props")]
+
+        for file in nm_package_deps_files:
+            with file.open("tr") as f:
+                packages.update(NmPackageDepsFileFormat.deserialize(f.read()))
+
+    return packages
+
+
+def make_dirtree(root: Path, dirs: int, projects: int, imports: int, packages: int = 200, seed: int = 0):
+    """
+    create a synthetic source tree in `root` with `dirs` directories
+    of which `projects` contain a *.NmPackageDeps.props file with `imports` package dependencies
+    """
+    rnd = random.Random(seed)
+    available = [NmPackageId("package{}".format(i), "1.0.{}".format(i % 7)) for i in range(packages)]
+
+    # grow the tree by attaching every new directory to a random existing one
+    all_dirs = [Path(root)]
+    for i in range(dirs):
+        d = rnd.choice(all_dirs) / "dir{}".format(i)
+        d.mkdir()
+        all_dirs.append(d)
+
+        # sprinkle some unrelated files
+        (d / "source{}.cpp".format(i)).touch()
+
+    for i, d in enumerate(rnd.sample(all_dirs[1:], min(projects, dirs))):
+        deps = rnd.sample(available, min(imports, packages))
+        (d / "project{}.NmPackageDeps.props".format(i)).write_text(NmPackageDepsFileFormat.serialize(deps))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the *.NmPackageDeps.props dirtree scanner")
+    parser.add_argument("--dirs", type=int, default=4000, help="number of directories in the tree")
+    parser.add_argument("--projects", type=int, default=200, help="number of *.NmPackageDeps.props files")
+    parser.add_argument("--imports", type=int, default=10, help="number of imports per props file")
+    parser.add_argument("--jobs", type=int, default=None, help="number of scanner workers")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    DebugLog.enabled = False
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = Path(tmp) / "tree"
+        tree.mkdir()
+        make_dirtree(tree, args.dirs, args.projects, args.imports)
+
+        expected = legacy_collect_all_packages(tree)
+        assert expected == collect_all_packages(tree, args.jobs)
+        assert expected == collect_all_packages(tree, args.jobs, processes=True)
+
+        # the synthetic tree is not modified while benchmarking, so just created entries can be trusted
+        ScanIndex.RACY_WINDOW_NS = 0
+        index_file = Path(tmp) / "scan-index.json"
+        assert expected == collect_all_packages(tree, index_file=index_file)
+
+        timings = [
+            ("os.walk (legacy)", best_of(lambda: legacy_collect_all_packages(tree), args.repeat)),
+            ("scandir + threads", best_of(lambda: collect_all_packages(tree, args.jobs), args.repeat)),
+            ("scandir + processes",
+             best_of(lambda: collect_all_packages(tree, args.jobs, processes=True), args.repeat)),
+            ("scan index (warm)",
+             best_of(lambda: collect_all_packages(tree, args.jobs, index_file=index_file), args.repeat)),
+        ]
+        print_timings("scan {} dirs, {} projects, {} imports each:".format(args.dirs, args.projects, args.imports),
+                      timings)
+
+
+if __name__ == "__main__":
+    main()
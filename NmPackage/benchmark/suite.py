@@ -0,0 +1,353 @@
+"""
+The benchmark suite: synthetic workloads for the file formats, the dirtree scanner and the package cache manager.
+
+    python -m NmPackage.benchmark --size medium --output results.json
+    python -m NmPackage.benchmark --size medium --baseline results.json
+
+Results are saved as json, see `run_suite`. A run compared with a baseline recorded with the same parameters
+on the same machine reports every case that got slower than the `--tolerance` allows and fails in that case.
+Timings of different machines are not comparable, hence no baseline is shipped: record one from the
+last release before changing the code under test.
+"""
+from NmPackage import NmPackageId, NmPackageManager, delete_tree, delete_tree_parallel
+from NmPackage.benchmark.bench_delete import make_package
+from NmPackage.benchmark.bench_integrate import make_vcxproj
+from NmPackage.benchmark.bench_scan import make_dirtree
+from NmPackage.debug import DebugLog
+from NmPackage.generate import make_packages
+from NmPackage.localremote import LocalRemotes
+from NmPackage.save import NmPackageDepsFileFormat, VcxProjectFile
+from NmPackage.scan import collect_all_packages, ScanIndex
+from pathlib import Path
+import fnmatch
+import json
+import shutil
+import statistics
+import time
+
+# bump when the results file format changes
+RESULTS_VERSION = 1
+
+# the workload parameters per suite size
+SIZES = {
+    "small": {
+        "packages": 10,  # package dependencies per project
+        "vcxproj_files": 1000,  # source files listed in a *.vcxproj file
+        "tree_dirs": 500,  # directories in a source tree
+        "tree_projects": 50,  # *.NmPackageDeps.props files in a source tree
+        "cache_packages": 50,  # packages in the package cache
+        "package_dirs": 16,  # directories per installed package
+        "package_files": 32,  # files per directory of an installed package
+        "install_packages": 8,  # packages installed from local remotes
+    },
+    "medium": {
+        "packages": 50,
+        "vcxproj_files": 10000,
+        "tree_dirs": 5000,
+        "tree_projects": 300,
+        "cache_packages": 500,
+        "package_dirs": 64,
+        "package_files": 64,
+        "install_packages": 32,
+    },
+    "large": {
+        "packages": 200,
+        "vcxproj_files": 50000,
+        "tree_dirs": 40000,
+        "tree_projects": 2000,
+        "cache_packages": 2000,
+        "package_dirs": 256,
+        "package_files": 100,
+        "install_packages": 128,
+    },
+}
+
+# a timing is repeated until it takes at least this long, such that fast cases are not dominated by timer noise
+MIN_TIME = 0.05
+
+# the registered cases: [(name, setup)], see `case`
+CASES = []
+
+
+def case(name: str):
+    """
+    register a benchmark case
+
+    The decorated function `setup(tmp: Path, params: dict)` builds the workload in the empty directory `tmp`
+    and returns a tuple (run, reset): `run` is timed, `reset` (if not None) restores the workload before every run.
+    """
+    def register(setup):
+        CASES.append((name, setup))
+        return setup
+    return register
+
+
+def _packages(count: int) -> list:
+    return [NmPackageId("package{}".format(i), "1.0.{}".format(i)) for i in range(count)]
+
+
+@case("deps.serialize")
+def _deps_serialize(tmp: Path, params: dict) -> tuple:
+    packages = _packages(params["packages"])
+    return (lambda: NmPackageDepsFileFormat.serialize(packages)), None
+
+
+def _deps_deserialize(parser: str):
+    def setup(tmp: Path, params: dict) -> tuple:
+        xml = NmPackageDepsFileFormat.serialize(_packages(params["packages"]))
+        return (lambda: NmPackageDepsFileFormat.deserialize(xml, parser)), None
+    return setup
+
+
+for _parser in NmPackageDepsFileFormat.PARSERS:
+    case("deps.deserialize." + _parser)(_deps_deserialize(_parser))
+
+
+def _integrate(engine: str):
+    def setup(tmp: Path, params: dict) -> tuple:
+        template = tmp / "template.vcxproj"
+        make_vcxproj(template, params["vcxproj_files"])
+        path = tmp / "Project.vcxproj"
+        return (lambda: VcxProjectFile(path).integrate_nmpkg(engine)), \
+            (lambda: shutil.copy(str(template), str(path)))
+    return setup
+
+
+for _engine in VcxProjectFile.ENGINES:
+    case("integrate." + _engine)(_integrate(_engine))
+
+
+@case("scan.collect_all_packages")
+def _scan(tmp: Path, params: dict) -> tuple:
+    make_dirtree(tmp, params["tree_dirs"], params["tree_projects"], params["packages"])
+    return (lambda: collect_all_packages(tmp)), None
+
+
+@case("scan.collect_all_packages.index")
+def _scan_index(tmp: Path, params: dict) -> tuple:
+    tree = tmp / "tree"
+    tree.mkdir()
+    make_dirtree(tree, params["tree_dirs"], params["tree_projects"], params["packages"])
+    index_file = tmp / "scan-index.json"
+
+    # the synthetic tree is not modified while benchmarking, so just created entries can be trusted
+    racy_window = ScanIndex.RACY_WINDOW_NS
+    ScanIndex.RACY_WINDOW_NS = 0
+    try:
+        collect_all_packages(tree, index_file=index_file)
+    finally:
+        ScanIndex.RACY_WINDOW_NS = racy_window
+    return (lambda: collect_all_packages(tree, index_file=index_file)), None
+
+
+def _make_cache(tmp: Path, params: dict) -> NmPackageManager:
+    """a package cache with `cache_packages` installed (empty) packages"""
+    mgr = NmPackageManager(tmp)
+    for p in _packages(params["cache_packages"]):
+        mgr.seed_package(p, {}, "0" * 64)
+    return mgr
+
+
+@case("cache.get_installed_packages.manifest")
+def _installed_manifest(tmp: Path, params: dict) -> tuple:
+    mgr = _make_cache(tmp, params)
+    mgr.reindex()
+
+    def run():
+        # measure reading the manifest, not the cache of the parsed manifest
+        mgr._manifest_cache = None
+        return mgr.get_installed_packages()
+    return run, None
+
+
+@case("cache.get_installed_packages.disk")
+def _installed_disk(tmp: Path, params: dict) -> tuple:
+    mgr = _make_cache(tmp, params)
+    return mgr.get_installed_packages, None
+
+
+def _delete(delete):
+    def setup(tmp: Path, params: dict) -> tuple:
+        path = tmp / "package"
+        return (lambda: delete(path)), (lambda: make_package(path, params["package_dirs"], params["package_files"]))
+    return setup
+
+
+case("cache.delete_tree")(_delete(delete_tree))
+case("cache.delete_tree_parallel")(_delete(delete_tree_parallel))
+
+
+def _install(jobs: int):
+    def setup(tmp: Path, params: dict) -> tuple:
+        catalog = make_packages(params["install_packages"], 1)
+        remotes = LocalRemotes(tmp / "remotes")
+        remotes.create(catalog)
+        cache_dir = tmp / "cache"
+
+        def run():
+            mgr = NmPackageManager(cache_dir, git_url_template=remotes.url_template)
+            if not all(r.succeeded for r in mgr.install_all(catalog, jobs=jobs)):
+                raise Exception("install failed")
+
+        def reset():
+            if cache_dir.exists():
+                delete_tree(cache_dir)
+            cache_dir.mkdir()
+        return run, reset
+    return setup
+
+
+case("install.sequential")(_install(1))
+case("install.concurrent")(_install(8))
+
+
+def time_case(run, reset, repeat: int) -> dict:
+    """
+    time `run` `repeat` times and return {"best": seconds, "median": seconds, "number": calls per timing}
+
+    Without `reset` a timing calls `run` as often as needed to take `MIN_TIME`,
+    with `reset` every timing is a single call since the workload must be restored in between.
+    """
+    number = 1
+    if reset is None:
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            if time.perf_counter() - start >= MIN_TIME or number >= 1 << 20:
+                break
+            number *= 2
+
+    timings = []
+    for _ in range(repeat):
+        if reset is not None:
+            reset()
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        timings.append((time.perf_counter() - start) / number)
+
+    return {"best": min(timings), "median": statistics.median(timings), "number": number}
+
+
+def run_suite(params: dict, patterns: list = None, repeat: int = 5, progress=None) -> dict:
+    """
+    run all cases whose name matches one of the fnmatch `patterns` (all by default) and return the results
+
+        {"version": RESULTS_VERSION, "params": params, "python": ..., "platform": ...,
+         "cases": {name: {"best": seconds, "median": seconds, "number": calls per timing}}}
+
+    `progress(name, result)` is called after every case.
+    """
+    import platform
+    import tempfile
+    results = {"version": RESULTS_VERSION, "params": params,
+               "python": platform.python_version(), "platform": platform.platform(), "cases": {}}
+
+    for name, setup in CASES:
+        if patterns and not any(fnmatch.fnmatchcase(name, p) for p in patterns):
+            continue
+
+        with tempfile.TemporaryDirectory() as tmp:
+            run, reset = setup(Path(tmp), params)
+            result = time_case(run, reset, repeat)
+
+        results["cases"][name] = result
+        if progress is not None:
+            progress(name, result)
+
+    return results
+
+
+def compare_results(results: dict, baseline: dict) -> list:
+    """
+    compare the best timings of two `run_suite` results
+
+    Returns a list of tuples (case name, baseline seconds, seconds, ratio) for the cases that both ran,
+    a ratio above 1 means slower than the baseline.
+    Results recorded with different workload parameters can't be compared and raise.
+    """
+    if baseline.get("version") != RESULTS_VERSION:
+        raise Exception("unsupported baseline version: " + str(baseline.get("version")))
+    if baseline["params"] != results["params"]:
+        raise Exception("the baseline was recorded with different parameters: " + json.dumps(baseline["params"]))
+
+    comparison = []
+    for name, result in results["cases"].items():
+        if name in baseline["cases"]:
+            before = baseline["cases"][name]["best"]
+            comparison.append((name, before, result["best"], result["best"] / before))
+    return comparison
+
+
+def parse_params(size: str, overrides: list) -> dict:
+    """the workload parameters of a suite `size`, with a list of "name=value" `overrides`"""
+    params = dict(SIZES[size])
+    for override in overrides:
+        name, sep, value = override.partition("=")
+        if not sep or name not in params:
+            raise Exception("invalid parameter: {}, expected one of {}".format(override, ", ".join(sorted(params))))
+        params[name] = int(value)
+    return params
+
+
+def main():
+    import argparse
+    import sys
+    from NmPackage.debug import exception_handler
+    sys.excepthook = exception_handler
+
+    parser = argparse.ArgumentParser(description="run the NmPkg benchmark suite")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small", help="workload size (default: %(default)s)")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a workload parameter of the suite size")
+    parser.add_argument("-k", "--cases", nargs="+", metavar="PATTERN",
+                        help="only run the cases matching these fnmatch patterns")
+    parser.add_argument("--list", action="store_true", help="list the cases and the workload parameters")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="save the results as json to this file")
+    parser.add_argument("--baseline", help="compare with the results saved in this file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative slowdown compared to the baseline that is not a regression "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+
+    DebugLog.enabled = False
+    params = parse_params(args.size, args.param)
+
+    if args.list:
+        for name, setup in CASES:
+            print(name)
+        print(json.dumps(params, indent=2))
+        return
+
+    # load the baseline first, a missing one should not waste a run
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "tr") as f:
+            baseline = json.load(f)
+
+    def progress(name, result):
+        print("  {:<40} {:>12.3f}ms  (x{})".format(name, result["best"] * 1000, result["number"]))
+
+    print("benchmark suite ({}): {}".format(args.size, json.dumps(params)))
+    results = run_suite(params, args.cases, args.repeat, progress)
+
+    if args.output:
+        from NmPackage import write_json_atomically
+        write_json_atomically(Path(args.output), results)
+
+    if baseline is None:
+        return
+
+    regressions = 0
+    print("compared with {}:".format(args.baseline))
+    for name, before, after, ratio in compare_results(results, baseline):
+        regression = ratio > 1 + args.tolerance
+        regressions += regression
+        print("  {:<40} {:>12.3f}ms -> {:>10.3f}ms  {:>6.2f}x{}".format(
+            name, before * 1000, after * 1000, ratio, "  REGRESSION" if regression else ""))
+
+    if regressions:
+        print("{} regressions".format(regressions))
+        sys.exit(1)
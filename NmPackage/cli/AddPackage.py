@@ -1,15 +1,17 @@
 from NmPackage import *
 import argparse
 from NmPackage.debug import *
+from NmPackage.trace import Trace, add_trace_arguments, start_tracing
 from NmPackage.save import *
 from NmPackage import *
 from pathlib import Path
+import os
 
 
 def parse_cli_args():
     """parse the script input arguments"""
     parser = argparse.ArgumentParser(
-        description="add a new NmPackage dependency to a project")
+        description="add NmPackage dependencies to one or more projects")
 
     parser.add_argument("-v", "--verbose",
                         help="increase output verbosity",
@@ -19,20 +21,41 @@ def parse_cli_args():
                         help="enable debug output",
                         action="store_true")
 
-    parser.add_argument("qualifiedPackageId",
-                        help="qualifiedId of the package to be added",
-                        nargs=1)
+    parser.add_argument("qualifiedPackageIds",
+                        help="qualifiedIds of the packages to be added. "
+                             "For backwards compatibility an existing path as last argument is taken as --project",
+                        nargs="+")
 
-    parser.add_argument("path",
-                        help="path to the folder containing a single *.vcxproj file or a specific *.vcxproj file",
-                        nargs='?',
-                        default="./")
+    parser.add_argument("-p", "--project",
+                        help="path to a *.vcxproj file, a folder containing a single *.vcxproj file "
+                             "or a glob pattern of those, e.g. 'src/**/*.vcxproj'. "
+                             "Can be given multiple times (default: ./)",
+                        action="append",
+                        dest="projects")
+
+    parser.add_argument("-j", "--jobs",
+                        help="number of projects to update concurrently",
+                        type=int)
 
     parser.add_argument("-N", "--dry-run",
                         help="Do not perform any actions, only simulate them.",
                         action="store_true")
 
+    add_trace_arguments(parser)
+
     args = parser.parse_args()
+    start_tracing(args)
+
+    # the legacy signature: NmPkg-add <qualifiedPackageId> [path]
+    if args.projects is None:
+        args.projects = ["./"]
+        if len(args.qualifiedPackageIds) > 1:
+            last = args.qualifiedPackageIds[-1]
+            if Path(last).exists() or not is_qualified_id(last):
+                # a mistyped path must not be added as a package to the project in the working directory
+                if not Path(last).exists():
+                    raise Exception("project path does not exist: " + last)
+                args.projects = [args.qualifiedPackageIds.pop()]
 
     with DebugLogScopedPush("cli arguments:"):
         DebugLog.print(str(args))
@@ -40,28 +63,115 @@ def parse_cli_args():
     return args
 
 
+def is_qualified_id(arg: str) -> bool:
+    """
+    whether a cli argument is a qualified package id <packageId>/<versionId> rather than a path
+    """
+    parts = arg.split("/")
+    return len(parts) == 2 and "\\" not in arg and all(part not in ("", ".", "..") for part in parts)
+
+
 def main():
     # register custom exception handler
     sys.excepthook = exception_handler
 
     # parse cli input
-    args = parse_cli_args()
+    with Trace.span("parse arguments"):
+        args = parse_cli_args()
 
     # set debug log state
     DebugLog.enabled = args.debug
 
+    nmPackageIds = [NmPackageId.from_qualifiedId(id) for id in args.qualifiedPackageIds]
+    vcxproj_filepaths = find_projects(args.projects)
+
+    if args.verbose or args.dry_run:
+        for vcxproj_filepath in vcxproj_filepaths:
+            print(str(vcxproj_filepath))
+
+    if args.dry_run:
+        return
+
     # call
-    add_package(Path(args.path), NmPackageId.from_qualifiedId(args.qualifiedPackageId[0]))
+    changes = add_packages(vcxproj_filepaths, nmPackageIds, args.jobs)
+
+    if args.verbose:
+        import NmPackage.cli.integrate
+        NmPackage.cli.integrate.print_summary(changes)
 
 
 def add_package(path: Path, nmPackageId: NmPackageId):
     """
     Add a `NmPackageId` dependency to a project
     """
-    vcxproj_filepath = find_vcxproj(Path(path))
+    add_packages_to_project(find_vcxproj(Path(path)), [nmPackageId])
+
 
+def add_packages_to_project(vcxproj_filepath: Path, nmPackageIds: list) -> list:
+    """
+    Add many `NmPackageId` dependencies to a single *.vcxproj file, reading and writing the project only once
+
+    Returns the list of files that changed on disk
+    """
     vsProject = VsProjectFiler().deserialize(vcxproj_filepath)
 
-    vsProject.dependencies.add(nmPackageId)
+    vsProject.dependencies.update(nmPackageIds)
+
+    return VsProjectFiler().serialize(vsProject)
+
 
-    VsProjectFiler().serialize(vsProject)
+def find_projects(patterns: list) -> list:
+    """
+    resolve a list of project paths and glob patterns into a list of unique *.vcxproj files, see `find_vcxproj`
+    """
+    import glob
+    vcxproj_filepaths = []
+    seen = set()
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            paths = [Path(p) for p in sorted(glob.glob(pattern, recursive=True))]
+            if not paths:
+                raise Exception("no projects match: " + pattern)
+        else:
+            paths = [Path(pattern)]
+
+        for path in paths:
+            vcxproj_filepath = find_vcxproj(path)
+            key = os.path.normcase(str(vcxproj_filepath.resolve()))
+            if key not in seen:
+                seen.add(key)
+                vcxproj_filepaths.append(vcxproj_filepath)
+
+    return vcxproj_filepaths
+
+
+def add_packages(vcxproj_filepaths: list, nmPackageIds: list, jobs: int = None) -> dict:
+    """
+    Add many `NmPackageId` dependencies to many *.vcxproj files and return a dict {vcxproj file: changed files}
+
+    Every project is read and written once. Projects are updated concurrently by a pool of `jobs` processes,
+    since parsing and writing the project xml is cpu bound.
+    A failing project does not abort the others, instead a single exception summarizes all failures.
+    """
+    nmPackageIds = list(nmPackageIds)
+    changes = {}
+    failures = []
+
+    if jobs == 1 or len(vcxproj_filepaths) <= 1:
+        for vcxproj_filepath in vcxproj_filepaths:
+            try:
+                changes[vcxproj_filepath] = add_packages_to_project(vcxproj_filepath, nmPackageIds)
+            except Exception as e:
+                failures.append((vcxproj_filepath, e))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [(p, executor.submit(add_packages_to_project, p, nmPackageIds)) for p in vcxproj_filepaths]
+            for vcxproj_filepath, future in futures:
+                try:
+                    changes[vcxproj_filepath] = future.result()
+                except Exception as e:
+                    failures.append((vcxproj_filepath, e))
+
+    raise_failures(failures, len(vcxproj_filepaths), "add packages to", "projects")
+    return changes
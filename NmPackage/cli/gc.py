@@ -0,0 +1,112 @@
+from NmPackage import *
+import argparse
+from NmPackage.debug import *
+from NmPackage.trace import Trace, add_trace_arguments, start_tracing
+from NmPackage.scan import collect_all_packages
+from pathlib import Path
+import os
+
+
+def parse_cli_args():
+    """parse the script input arguments"""
+    parser = argparse.ArgumentParser(
+        description="uninstall all packages that are not referenced by any *.NmPackageDeps.props in the given dirtrees")
+
+    parser.add_argument("-v", "--verbose",
+                        help="increase output verbosity",
+                        action="store_true")
+
+    parser.add_argument("-d", "--debug",
+                        help="enable debug output",
+                        action="store_true")
+
+    parser.add_argument("dirtrees",
+                        help="the directory trees with all the *.NmPackageDeps.props that are still in use",
+                        nargs="+")
+
+    parser.add_argument("-j", "--jobs",
+                        help="number of concurrent workers for scanning and removal",
+                        type=int,
+                        default=4)
+
+    parser.add_argument("-w", "--wait",
+                        help="wait until the packages are deleted from disk instead of deleting them in the background",
+                        action="store_true")
+
+    parser.add_argument("-N", "--dry-run",
+                        help="Do not perform any actions, only report the reclaimable disk space.",
+                        action="store_true")
+
+    add_trace_arguments(parser)
+
+    args = parser.parse_args()
+    start_tracing(args)
+
+    # set debug log state
+    DebugLog.enabled = args.debug
+
+    with DebugLogScopedPush("cli arguments:"):
+        DebugLog.print(str(args))
+
+    return args
+
+
+def main():
+    # register custom exception handler
+    sys.excepthook = exception_handler
+
+    # parse cli input
+    with Trace.span("parse arguments"):
+        args = parse_cli_args()
+
+    # get system-wide package manager
+    mgr = NmPackageManager.get_system_manager()
+
+    collect_garbage(mgr, [Path(t) for t in args.dirtrees], args.jobs, args.dry_run)
+
+    if args.dry_run:
+        return
+
+    # the uninstalled packages are in the trash, delete them from disk
+    if args.wait:
+        mgr.reclaim_trash(args.jobs)
+    elif mgr.has_trash():
+        mgr.spawn_trash_reclaimer()
+
+
+def collect_garbage(mgr: NmPackageManager, dirtrees: list, jobs: int = 4, dry_run: bool = False) -> set:
+    """
+    uninstall all installed packages that are not referenced by the *.NmPackageDeps.props in any of `dirtrees`
+
+    Returns the set of unreferenced packages, they are only reported if `dry_run`.
+    """
+    # a mistyped dirtree would make every package unreferenced
+    for tree in dirtrees:
+        if not tree.is_dir():
+            raise Exception("dirtree does not exist: " + str(tree))
+
+    referenced = set()
+    for tree in dirtrees:
+        referenced.update(collect_all_packages(tree, jobs))
+
+    with DebugLogScopedPush("referenced packages:"):
+        for p in sorted(referenced):
+            DebugLog.print(p.qualifiedId)
+
+    unreferenced = mgr.get_installed_packages() - referenced
+    sorted_unreferenced = sorted(unreferenced)
+
+    reclaimable = 0
+    for p in sorted_unreferenced:
+        size = mgr.get_package_size(p)
+        reclaimable += size
+        print("{} {}".format(p.qualifiedId, format_size(size)))
+
+    print("{} unreferenced packages, {} {}".format(
+        len(unreferenced), format_size(reclaimable), "reclaimable" if dry_run else "reclaimed"))
+
+    if not dry_run:
+        mgr.touch_packages(referenced)
+        mgr.uninstall_all(sorted_unreferenced, jobs)
+
+    return unreferenced
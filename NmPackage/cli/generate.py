@@ -0,0 +1,109 @@
+from NmPackage import *
+import argparse
+from NmPackage.debug import *
+from NmPackage.trace import Trace, add_trace_arguments, start_tracing
+from NmPackage.generate import *
+from NmPackage.localremote import LocalRemotes
+from pathlib import Path
+import sys
+
+"""generate a synthetic monorepo, package remotes and package cache of a given size for load testing
+"""
+
+
+def parse_cli_args():
+    """parse the script input arguments"""
+    parser = argparse.ArgumentParser(
+        description="generate a synthetic monorepo, package remotes and package cache for load testing")
+
+    parser.add_argument("-v", "--verbose",
+                        help="increase output verbosity",
+                        action="store_true")
+
+    parser.add_argument("-d", "--debug",
+                        help="enable debug output",
+                        action="store_true")
+
+    parser.add_argument("output",
+                        help="an empty or non-existing directory to generate the fixtures in: "
+                             "<output>/src, <output>/remotes and <output>/cache")
+
+    parser.add_argument("--projects",
+                        help="number of *.vcxproj projects in the monorepo (default: %(default)s)",
+                        type=int, default=1000)
+
+    parser.add_argument("--breadth",
+                        help="number of sub directories per directory of the monorepo (default: %(default)s)",
+                        type=int, default=10)
+
+    parser.add_argument("--depth",
+                        help="number of directory levels above the projects (default: %(default)s)",
+                        type=int, default=2)
+
+    parser.add_argument("--source-files",
+                        help="number of source files listed per project (default: %(default)s)",
+                        type=int, default=100)
+
+    parser.add_argument("--imports",
+                        help="number of package dependencies per project (default: %(default)s)",
+                        type=int, default=30)
+
+    parser.add_argument("--packages",
+                        help="number of packages (default: %(default)s)",
+                        type=int, default=200)
+
+    parser.add_argument("--versions",
+                        help="number of versions per package (default: %(default)s)",
+                        type=int, default=5)
+
+    parser.add_argument("--no-remotes",
+                        help="do not generate the bare git repositories of the packages",
+                        action="store_true")
+
+    parser.add_argument("--no-cache",
+                        help="do not generate the package cache",
+                        action="store_true")
+
+    parser.add_argument("--seed",
+                        help="seed of the random dependencies (default: %(default)s)",
+                        type=int, default=0)
+
+    add_trace_arguments(parser)
+
+    args = parser.parse_args()
+    start_tracing(args)
+
+    # set debug log state
+    DebugLog.enabled = args.debug
+
+    with DebugLogScopedPush("cli arguments:"):
+        DebugLog.print(str(args))
+
+    return args
+
+
+def main():
+    # register custom exception handler
+    sys.excepthook = exception_handler
+
+    # parse cli input
+    with Trace.span("parse arguments"):
+        args = parse_cli_args()
+
+    output = Path(args.output)
+    if output.exists() and (not output.is_dir() or any(output.iterdir())):
+        raise Exception("output is not an empty directory: " + str(output))
+
+    catalog = make_packages(args.packages, args.versions)
+
+    projects = generate_monorepo(output / "src", args.projects, catalog, args.imports,
+                                 args.breadth, args.depth, args.source_files, args.seed)
+    print("{} projects generated: {}".format(len(projects), output / "src"))
+
+    if not args.no_remotes:
+        remotes = LocalRemotes(output / "remotes").create(catalog)
+        print("{} package remotes generated: {}".format(len(remotes), output / "remotes"))
+
+    if not args.no_cache:
+        mgr = generate_package_cache(output / "cache", catalog)
+        print("{} packages installed: {}".format(len(mgr.get_installed_packages()), mgr.package_cache_dir))
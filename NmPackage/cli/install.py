@@ -1,7 +1,9 @@
 from NmPackage import *
 import argparse
 from NmPackage.debug import *
+from NmPackage.trace import Trace, add_trace_arguments, start_tracing
 from NmPackage.save import *
+from NmPackage.scan import collect_all_packages
 from NmPackage import *
 from pathlib import Path
 import os
@@ -30,11 +32,67 @@ def parse_cli_args():
     parser.add_argument("--dirtree",
                         help="path to directory tree for installation of all *.NmPackageDeps.props")
 
+    parser.add_argument("--scan-index",
+                        help="rescan the --dirtree incrementally using a persistent scan index file "
+                             "(default: a file per dirtree in the package cache)",
+                        nargs="?",
+                        const="")
+
+    parser.add_argument("-j", "--jobs",
+                        help="number of packages to install concurrently (default: 1)",
+                        type=int,
+                        default=1)
+
+    parser.add_argument("--transport",
+                        help="how to fetch packages (default: git)",
+                        choices=NmPackageManager.TRANSPORTS,
+                        default="git")
+
+    parser.add_argument("--archive-mirror",
+                        help="base url (file:// or http://) of the artifact mirror for the archive transport "
+                             "(default: %%NmPackageArchiveMirror%%)")
+
+    parser.add_argument("--git-url-template",
+                        help="url of the git repository of a package with the placeholders {slug}, {packageId} "
+                             "and {versionId}, e.g. file:///srv/nmpackages/{slug}.git "
+                             "(default: %%NmPackageGitUrlTemplate%% or the package server)")
+
+    parser.add_argument("--clone-strategy",
+                        help="how to clone new packages (default: full)",
+                        choices=NmPackageManager.CLONE_STRATEGIES,
+                        default="full")
+
+    parser.add_argument("--share-objects",
+                        help="share the git objects of all versions of a package through a mirror in the package cache",
+                        action="store_true")
+
+    parser.add_argument("--content-addressed",
+                        help="store identical files of all packages only once, hard linked from a content store",
+                        action="store_true")
+
+    parser.add_argument("--cache-budget",
+                        help="evict the least recently used packages once all installed packages exceed this size, "
+                             "e.g. 50GiB (default: %%NmPackageCacheBudget%%)",
+                        type=parse_size)
+
+    parser.add_argument("--max-age",
+                        help="maximum age in seconds of a cached remote head before the remote is queried again "
+                             "(default: {})".format(NmPackageManager.DEFAULT_REMOTE_HEAD_MAX_AGE),
+                        type=float,
+                        default=NmPackageManager.DEFAULT_REMOTE_HEAD_MAX_AGE)
+
+    parser.add_argument("--refresh",
+                        help="ignore the cached remote heads, i.e. query the remote of every installed package",
+                        action="store_true")
+
     parser.add_argument("-N", "--dry-run",
                         help="Do not perform any actions, only simulate them.",
                         action="store_true")
 
+    add_trace_arguments(parser)
+
     args = parser.parse_args()
+    start_tracing(args)
 
     # set debug log state
     DebugLog.enabled = args.debug
@@ -50,7 +108,8 @@ def main():
     sys.excepthook = exception_handler
 
     # parse cli input
-    args = parse_cli_args()
+    with Trace.span("parse arguments"):
+        args = parse_cli_args()
 
     # collect all packages to be installed
     packages = set()
@@ -73,7 +132,12 @@ def main():
         if not dirtree.is_dir():
             raise Exception("unknown directory tree: " + args.dirtree)
 
-        packages.update(collect_all_packages(dirtree))
+        index_file = None
+        if args.scan_index is not None:
+            index_file = Path(args.scan_index) if args.scan_index else \
+                NmPackageManager.get_system_manager().get_scan_index_file(dirtree)
+
+        packages.update(collect_all_packages(dirtree, index_file=index_file))
 
     with DebugLogScopedPush("found packages:"):
         for p in packages:
@@ -85,41 +149,45 @@ def main():
 
     # install all of the packages
     mgr = NmPackageManager.get_system_manager()
-    for p in packages:
-        DebugLog.print("installing NmPackage: " + p.qualifiedId)
-        mgr.install(p)
-
-
-
-   
-
-def collect_all_packages(tree: Path) -> set:
-    """ 
-    recursively find all *.NmPackageDeps.props and collect all packages
+    mgr.clone_strategy = args.clone_strategy
+    mgr.share_objects = args.share_objects
+    mgr.content_addressed = args.content_addressed
+    mgr.transport = args.transport
+    if args.archive_mirror:
+        mgr.archive_mirror_url = args.archive_mirror
+    if args.git_url_template:
+        mgr.git_url_template = args.git_url_template
+    mgr.remote_head_max_age = 0 if args.refresh else args.max_age
+    if args.cache_budget is not None:
+        mgr.cache_budget = args.cache_budget
+
+    # delete the packages left in the trash by earlier uninstalls in the background
+    if mgr.has_trash():
+        mgr.spawn_trash_reclaimer()
+
+    install_packages(mgr, packages, args.jobs)
+
+    # delete the packages evicted to fit the cache budget in the background
+    if mgr.has_trash():
+        mgr.spawn_trash_reclaimer()
+
+
+def install_packages(mgr: NmPackageManager, packages: set, jobs: int = 1):
     """
-    packages = set()
+    install all `packages` using at most `jobs` concurrent installs
 
-    assert Path(tree).is_dir()
-
-    # traverse the tree ignoring vcs folders
-    ignoreFolders = ['.svn', '.git']
-    for root, dirs, files in os.walk(tree):
-        for f in ignoreFolders:
-            if (f in dirs):
-                dirs.remove(f) 
-
-        # get list of all NmPackage listengs in 'root'
-        nm_package_deps_files = [Path(root)/Path(f) for f in files if f.endswith(".NmPackageDeps.props")]
-
-        # collect all the NmPackageId's
-        for file in nm_package_deps_files:
-            DebugLog.print("found: " + str(file))
-            with file.open("tr") as f:
-                packages.update(NmPackageDepsFileFormat.deserialize(f.read()))\
-    
-    return packages
-        
+    Every package is reported as soon as its install finishes.
+    Raises a single exception summarizing all failed installs (if any).
+    """
+    sorted_packages = sorted(packages)
+    for p in sorted_packages:
+        DebugLog.print("installing NmPackage: " + p.qualifiedId)
 
+    results = mgr.install_all(sorted_packages, jobs, on_result=lambda r: print(str(r), flush=True))
 
-   
+    bytes_received = sum(r.bytes_received or 0 for r in results)
+    print("{} packages processed, {} received".format(len(results), format_size(bytes_received)))
 
+    failures = [(r.nm_package_id.qualifiedId, r.error) for r in sorted(results, key=lambda r: r.nm_package_id)
+                if not r.succeeded]
+    raise_failures(failures, len(results), "install", "packages")
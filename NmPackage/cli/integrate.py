@@ -1,10 +1,11 @@
 from NmPackage import *
 import argparse
 from NmPackage.debug import *
+from NmPackage.trace import Trace, add_trace_arguments, start_tracing
 from NmPackage.save import *
 import sys
 
-"""integrate NmPakakges into MSBuild for a given project
+"""integrate NmPakakges into MSBuild for a given project, all projects of a solution or all projects in a dirtree
 """
 
 
@@ -21,15 +22,32 @@ def parse_cli_args():
                         action="store_true")
 
     parser.add_argument("path",
-                        help="path to the folder containing a single *.vcxproj file or a specific *.vcxproj file",
+                        help="path to the folder containing a single *.vcxproj file, a specific *.vcxproj file "
+                             "or a *.sln file to integrate all of its projects",
                         nargs='?',
                         default="./")
 
+    parser.add_argument("--dirtree",
+                        help="path to a directory tree to integrate all of its *.vcxproj files")
+
+    parser.add_argument("-j", "--jobs",
+                        help="number of projects to integrate concurrently",
+                        type=int)
+
+    parser.add_argument("--engine",
+                        help="how *.vcxproj files are patched: 'dom' reformats the whole file, "
+                             "'stream' only inserts the missing elements (default: %(default)s)",
+                        choices=VcxProjectFile.ENGINES,
+                        default=VcxProjectFile.default_engine)
+
     parser.add_argument("-N", "--dry-run",
                         help="Do not perform any actions, only simulate them.",
                         action="store_true")
 
+    add_trace_arguments(parser)
+
     args = parser.parse_args()
+    start_tracing(args)
 
     with DebugLogScopedPush("cli arguments:"):
         DebugLog.print(str(args))
@@ -42,10 +60,46 @@ def main():
     sys.excepthook = exception_handler
 
     # parse cli input
-    args = parse_cli_args()
+    with Trace.span("parse arguments"):
+        args = parse_cli_args()
 
     # set debug log state
     DebugLog.enabled = args.debug
 
+    # collect the projects to integrate
+    if args.dirtree:
+        vcxproj_filepaths = find_vcxproj_files(Path(args.dirtree))
+    elif Path(args.path).match("*.sln"):
+        vcxproj_filepaths = find_sln_projects(Path(args.path))
+    else:
+        vcxproj_filepaths = [find_vcxproj(Path(args.path))]
+
+    with DebugLogScopedPush("projects:"):
+        for p in vcxproj_filepaths:
+            DebugLog.print(str(p))
+
+    if args.dry_run:
+        for p in vcxproj_filepaths:
+            print(str(p))
+        return
+
     # call
-    Integrate(Path(args.path))
+    if len(vcxproj_filepaths) == 1:
+        # no need for a process pool
+        changes = {vcxproj_filepaths[0]: integrate_project(vcxproj_filepaths[0], args.engine)}
+    else:
+        changes = integrate_all(vcxproj_filepaths, args.jobs, args.engine)
+
+    print_summary(changes)
+
+
+def print_summary(changes: dict):
+    """print the files that changed, per project"""
+    for vcxproj_filepath, changed_files in changes.items():
+        for f in changed_files:
+            print("changed: " + str(f))
+
+    # every project consists of its *.vcxproj file and its *.NmPackageDeps.props file
+    changed = sum(len(changed_files) for changed_files in changes.values())
+    print("{} projects integrated, {} files changed, {} files unchanged".format(
+        len(changes), changed, 2 * len(changes) - changed))
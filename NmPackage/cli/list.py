@@ -1,6 +1,7 @@
 from NmPackage import *
 import argparse
 from NmPackage.debug import *
+from NmPackage.trace import Trace, add_trace_arguments, start_tracing
 from NmPackage.save import *
 from NmPackage import *
 from pathlib import Path
@@ -24,7 +25,10 @@ def parse_cli_args():
                         help="Do not perform any actions, only simulate them.",
                         action="store_true")
 
+    add_trace_arguments(parser)
+
     args = parser.parse_args()
+    start_tracing(args)
 
     # set debug log state
     DebugLog.enabled = args.debug
@@ -40,14 +44,15 @@ def main():
     sys.excepthook = exception_handler
 
     # parse cli input
-    args = parse_cli_args()
+    with Trace.span("parse arguments"):
+        args = parse_cli_args()
 
     list_installed_packages()
 
 def list_installed_packages():
     mgr = NmPackageManager.get_system_manager()
     
-    for p in sorted(mgr.get_installed_packages(), key=lambda nmPackageId: nmPackageId.qualifiedId ):
+    for p in sorted(mgr.get_installed_packages()):
         print(p.qualifiedId)
 
    
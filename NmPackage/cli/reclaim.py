@@ -0,0 +1,63 @@
+from NmPackage import *
+import argparse
+from NmPackage.debug import *
+from NmPackage.trace import Trace, add_trace_arguments, start_tracing
+from pathlib import Path
+import os
+
+
+def parse_cli_args():
+    """parse the script input arguments"""
+    parser = argparse.ArgumentParser(
+        description="delete the uninstalled packages in the trash of the package cache from disk")
+
+    parser.add_argument("-v", "--verbose",
+                        help="increase output verbosity",
+                        action="store_true")
+
+    parser.add_argument("-d", "--debug",
+                        help="enable debug output",
+                        action="store_true")
+
+    parser.add_argument("package_cache_dir",
+                        help="the package cache (default: %%NmPackageDir%%)",
+                        nargs="?")
+
+    parser.add_argument("-j", "--jobs",
+                        help="the number of concurrent deletions",
+                        type=int)
+
+    add_trace_arguments(parser)
+
+    args = parser.parse_args()
+    start_tracing(args)
+
+    # set debug log state
+    DebugLog.enabled = args.debug
+
+    with DebugLogScopedPush("cli arguments:"):
+        DebugLog.print(str(args))
+
+    return args
+
+
+def main():
+    # register custom exception handler
+    sys.excepthook = exception_handler
+
+    # parse cli input
+    with Trace.span("parse arguments"):
+        args = parse_cli_args()
+
+    if args.package_cache_dir:
+        mgr = NmPackageManager(Path(args.package_cache_dir).absolute())
+    else:
+        mgr = NmPackageManager.get_system_manager()
+
+    # an other reclaimer is already at it, e.g. spawned by an earlier uninstall
+    if not mgr.reclaim_trash(args.jobs, blocking=False):
+        DebugLog.print("the trash is already being reclaimed")
+
+
+if __name__ == "__main__":
+    main()
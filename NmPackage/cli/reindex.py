@@ -0,0 +1,67 @@
+from NmPackage import *
+import argparse
+from NmPackage.debug import *
+from NmPackage.trace import Trace, add_trace_arguments, start_tracing
+from pathlib import Path
+import os
+
+
+def parse_cli_args():
+    """parse the script input arguments"""
+    parser = argparse.ArgumentParser(
+        description="rebuild the manifest of installed packages from the package cache on disk")
+
+    parser.add_argument("-v", "--verbose",
+                        help="increase output verbosity",
+                        action="store_true")
+
+    parser.add_argument("-d", "--debug",
+                        help="enable debug output",
+                        action="store_true")
+
+    parser.add_argument("-j", "--jobs",
+                        help="the number of packages to inspect concurrently",
+                        type=int)
+
+    parser.add_argument("-N", "--dry-run",
+                        help="Do not perform any actions, only simulate them.",
+                        action="store_true")
+
+    add_trace_arguments(parser)
+
+    args = parser.parse_args()
+    start_tracing(args)
+
+    # set debug log state
+    DebugLog.enabled = args.debug
+
+    with DebugLogScopedPush("cli arguments:"):
+        DebugLog.print(str(args))
+
+    return args
+
+
+def main():
+    # register custom exception handler
+    sys.excepthook = exception_handler
+
+    # parse cli input
+    with Trace.span("parse arguments"):
+        args = parse_cli_args()
+
+    # get system-wide package manager
+    mgr = NmPackageManager.get_system_manager()
+
+    # if dry-run then only show what would be indexed
+    if args.dry_run:
+        manifest = mgr.build_manifest(args.jobs)
+    else:
+        manifest = mgr.reindex(args.jobs)
+
+    if args.verbose:
+        for qualifiedId in sorted(manifest):
+            entry = manifest[qualifiedId]
+            print("{} {} {}".format(qualifiedId, entry["commit"], format_size(entry["size"])))
+
+    print("{} packages indexed, {} in total".format(
+        len(manifest), format_size(sum(entry["size"] for entry in manifest.values()))))
@@ -1,6 +1,7 @@
 from NmPackage import *
 import argparse
 from NmPackage.debug import *
+from NmPackage.trace import Trace, add_trace_arguments, start_tracing
 from NmPackage.save import *
 from NmPackage import *
 from pathlib import Path
@@ -24,11 +25,18 @@ def parse_cli_args():
                         help="qualifiedId of the package to be added",
                         nargs="*")
 
+    parser.add_argument("-w", "--wait",
+                        help="wait until the packages are deleted from disk instead of deleting them in the background",
+                        action="store_true")
+
     parser.add_argument("-N", "--dry-run",
                         help="Do not perform any actions, only simulate them.",
                         action="store_true")
 
+    add_trace_arguments(parser)
+
     args = parser.parse_args()
+    start_tracing(args)
 
     # set debug log state
     DebugLog.enabled = args.debug
@@ -44,7 +52,8 @@ def main():
     sys.excepthook = exception_handler
 
     # parse cli input
-    args = parse_cli_args()
+    with Trace.span("parse arguments"):
+        args = parse_cli_args()
 
     # collect all packages to be installed
 
@@ -64,37 +73,8 @@ def main():
         DebugLog.print("uninstalling NmPackage: " + p.qualifiedId)
         mgr.uninstall(p)
 
-
-
-   
-
-def collect_all_packages(tree: Path) -> set:
-    """ 
-    recursively find all *.NmPackageDeps.props and collect all packages
-    """
-    packages = set()
-
-    assert Path(tree).is_dir()
-
-    # traverse the tree ignoring vcs folders
-    ignoreFolders = ['.svn', '.git']
-    for root, dirs, files in os.walk(tree):
-        for f in ignoreFolders:
-            if (f in dirs):
-                dirs.remove(f) 
-
-        # get list of all NmPackage listengs in 'root'
-        nm_package_deps_files = [Path(root)/Path(f) for f in files if f.endswith(".NmPackageDeps.props")]
-
-        # collect all the NmPackageId's
-        for file in nm_package_deps_files:
-            DebugLog.print("found: " + str(file))
-            with file.open("tr") as f:
-                packages.update(NmPackageDepsFileFormat.deserialize(f.read()))\
-    
-    return packages
-        
-
-
-   
-
+    # the uninstalled packages are in the trash, delete them from disk
+    if args.wait:
+        mgr.reclaim_trash()
+    elif mgr.has_trash():
+        mgr.spawn_trash_reclaimer()
@@ -0,0 +1,137 @@
+"""
+Generate synthetic fixtures of production scale for load testing, see `NmPkg-generate`
+
+ * `generate_monorepo`: a source tree of *.vcxproj projects with *.NmPackageDeps.props files and a solution
+ * `package_files`: the files of a package, e.g. served by `NmPackage.localremote.LocalRemotes`
+ * `generate_package_cache`: a package cache populated with installed packages
+
+The projects are generated from the `Vs2017Project` template in NmPackage/templates.
+All generators are deterministic for a given `seed`.
+"""
+from NmPackage import NmPackageId, NmPackageManager
+from NmPackage.debug import DebugLog
+from NmPackage.save import NmPackageDepsFileFormat, text_file_bytes
+from pathlib import Path, PureWindowsPath
+import hashlib
+import random
+import uuid
+
+# the project that all generated projects are copied from
+TEMPLATE_DIR = Path(__file__).parent / "templates" / "Vs2017Project"
+
+TEMPLATE_NAME = "Vs2017Project"
+
+# the solution entry of a C++ project
+_VCXPROJ_TYPE_GUID = "{8BC9CEB8-8B4A-11D0-8D11-00A0C91BC942}"
+
+
+def make_packages(packages: int, versions: int) -> list:
+    """a catalog of `packages` packages with `versions` versions each"""
+    return [NmPackageId("Package{:04d}".format(i), "v1.{}.0".format(v))
+            for i in range(packages) for v in range(versions)]
+
+
+def generate_monorepo(root: Path, projects: int, catalog: list, imports: int,
+                      breadth: int = 10, depth: int = 2, source_files: int = 0, seed: int = 0) -> list:
+    """
+    Generate a source tree of `projects` projects in `root` and return the list of their *.vcxproj files
+
+    The projects are spread over a directory tree of `depth` levels of `breadth` sub directories each.
+    Every project lists `source_files` additional source files and depends on `imports` random packages
+    of the `catalog`, at most one version per package. A solution `root`/all.sln lists all projects.
+    """
+    rnd = random.Random(seed)
+    root = Path(root)
+
+    template = {}
+    for suffix in (".vcxproj", ".vcxproj.filters"):
+        template[suffix] = (TEMPLATE_DIR / (TEMPLATE_NAME + suffix)).read_bytes()
+
+    # the versions per package, such that a project never depends on two versions of the same package
+    versions = {}
+    for p in catalog:
+        versions.setdefault(p.packageId, []).append(p)
+    package_ids = sorted(versions)
+
+    vcxproj_filepaths = []
+    sln_projects = []
+    for i in range(projects):
+        name = "Project{:05d}".format(i)
+
+        # the leaf directory of the project, i written in base `breadth`
+        parts = []
+        leaf = i
+        for _ in range(depth):
+            parts.append("group{}".format(leaf % breadth))
+            leaf //= breadth
+        project_dir = root.joinpath(*parts, name)
+        project_dir.mkdir(parents=True)
+
+        guid = "{" + str(uuid.UUID(int=rnd.getrandbits(128))).upper() + "}"
+        vcxproj = template[".vcxproj"].replace(TEMPLATE_NAME.encode(), name.encode())
+        vcxproj = vcxproj.replace(b"{3AA38744-B828-4308-A3FE-61DE30000CDC}", guid.encode())
+        if source_files:
+            items = "".join('    <ClCompile Include="src\\{}_{}.cpp" />\r\n'.format(name, f)
+                            for f in range(source_files))
+            vcxproj = vcxproj.replace(b"  <ItemGroup>\r\n  </ItemGroup>\r\n",
+                                      b"  <ItemGroup>\r\n" + items.encode() + b"  </ItemGroup>\r\n", 1)
+
+        vcxproj_filepath = project_dir / (name + ".vcxproj")
+        vcxproj_filepath.write_bytes(vcxproj)
+        (project_dir / (name + ".vcxproj.filters")).write_bytes(template[".vcxproj.filters"])
+
+        deps = [rnd.choice(versions[p]) for p in rnd.sample(package_ids, min(imports, len(package_ids)))]
+        (project_dir / (name + ".NmPackageDeps.props")).write_bytes(
+            text_file_bytes(NmPackageDepsFileFormat.serialize(deps)))
+
+        vcxproj_filepaths.append(vcxproj_filepath)
+        sln_projects.append((name, str(PureWindowsPath(*vcxproj_filepath.relative_to(root).parts)), guid))
+
+    # a solution with all projects, see `find_sln_projects`
+    sln = "\r\nMicrosoft Visual Studio Solution File, Format Version 12.00\r\n"
+    for name, path, guid in sln_projects:
+        sln += 'Project("{}") = "{}", "{}", "{}"\r\nEndProject\r\n'.format(_VCXPROJ_TYPE_GUID, name, path, guid)
+    (root / "all.sln").write_bytes(b"\xef\xbb\xbf" + sln.encode("utf-8"))
+
+    return vcxproj_filepaths
+
+
+def package_files(nm_package_id: NmPackageId) -> dict:
+    """the files of a generated package {relative posix path: content}"""
+    name = nm_package_id.packageId
+    props = ('<?xml version="1.0" encoding="utf-8"?>\r\n'
+             '<Project ToolsVersion="4.0" xmlns="http://schemas.microsoft.com/developer/msbuild/2003">\r\n'
+             '  <ItemDefinitionGroup>\r\n'
+             '    <ClCompile>\r\n'
+             '      <AdditionalIncludeDirectories>$(MSBuildThisFileDirectory)include;'
+             '%(AdditionalIncludeDirectories)</AdditionalIncludeDirectories>\r\n'
+             '    </ClCompile>\r\n'
+             '  </ItemDefinitionGroup>\r\n'
+             '</Project>\r\n')
+    header = "#pragma once\r\n// {}\r\n#define {}_VERSION \"{}\"\r\n".format(
+        nm_package_id.qualifiedId, name.upper(), nm_package_id.versionId)
+    return {
+        "NmPackage.props": props.encode(),
+        "include/{}.h".format(name): header.encode(),
+    }
+
+
+def generate_package_cache(cache_dir: Path, catalog: list) -> NmPackageManager:
+    """
+    Populate a package cache with all packages of the `catalog` and return its package manager
+
+    The packages are seeded as if they were installed from archives, see `NmPackageManager.seed_package`,
+    i.e. they have the `package_files` of their package and an installed marker but no git repository.
+    The manifest is rebuilt afterwards, see `NmPackageManager.reindex`.
+    """
+    mgr = NmPackageManager(Path(cache_dir))
+    for p in catalog:
+        DebugLog.print("creating package: " + str(mgr.package_cache_dir / mgr.get_package_dir(p)))
+        files = package_files(p)
+        digest = hashlib.sha256()
+        for name in sorted(files):
+            digest.update(files[name])
+        mgr.seed_package(p, files, digest.hexdigest())
+
+    mgr.reindex()
+    return mgr
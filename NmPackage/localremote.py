@@ -0,0 +1,166 @@
+"""
+Serve packages from local bare git repositories instead of the package server, e.g. for tests and benchmarks.
+
+`create_package_remote` and `update_package_remote` create and commit to a single repository,
+`LocalRemotes` manages a directory of them:
+
+    remotes = LocalRemotes(Path("remotes"), latency=0.05)
+    remotes.create(catalog)
+    with remotes:
+        mgr = NmPackageManager(cache_dir, git_url_template=remotes.url_template)
+        mgr.install_all(catalog)
+
+Without latency the repositories are served through file:// urls.
+With latency they are served through ssh:// urls and `GIT_SSH_COMMAND` is pointed to this module,
+which acts as ssh: it sleeps for the latency of a round trip and then runs the git command locally.
+Every git command that talks to the remote (ls-remote, clone, fetch) pays that latency once.
+
+This module is also the ssh stand-in itself, hence it only imports the standard library at module level.
+"""
+from pathlib import Path
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+# the host name of the ssh:// urls served with latency
+LATENCY_HOST = "nmpkg-latency"
+
+
+def create_package_remote(remotes_dir: Path, slug: str, files: dict = None, fork_of: str = None) -> Path:
+    """
+    create a local bare git repository `remotes_dir`/<slug>.git that serves as the remote of a package
+
+    `files` maps relative posix file names to their content (text or bytes) and is committed on the master branch.
+    If `fork_of` is the slug of another remote then the new remote continues its history.
+    Returns the path of the bare repository.
+    """
+    if files is None:
+        files = {"NmPackage.props": "<Project />\n"}
+
+    bare_repo = Path(remotes_dir) / (slug + ".git")
+    subprocess.check_call(["git", "init", "-q", "--bare", str(bare_repo)])
+    subprocess.check_call(["git", "symbolic-ref", "HEAD", "refs/heads/master"], cwd=str(bare_repo))
+    # allow partial clones, see `NmPackageManager.CLONE_STRATEGIES`
+    subprocess.check_call(["git", "config", "uploadpack.allowFilter", "true"], cwd=str(bare_repo))
+    if fork_of is not None:
+        fork_of_repo = Path(remotes_dir) / (fork_of + ".git")
+        subprocess.check_call(["git", "fetch", "-q", str(fork_of_repo), "master:master"], cwd=str(bare_repo))
+    update_package_remote(remotes_dir, slug, files)
+
+    return bare_repo
+
+
+def update_package_remote(remotes_dir: Path, slug: str, files: dict):
+    """
+    commit `files` {relative posix path: text or bytes} on top of the master branch of a package remote,
+    see `create_package_remote`
+
+    The commit is written by `git fast-import`, i.e. without a work tree.
+    """
+    bare_repo = Path(remotes_dir) / (slug + ".git")
+    has_master = 0 == subprocess.call(["git", "rev-parse", "-q", "--verify", "refs/heads/master"],
+                                      cwd=str(bare_repo), stdout=subprocess.DEVNULL)
+
+    names = sorted(files)
+    stream = b""
+    for mark, name in enumerate(names, 1):
+        content = files[name]
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        stream += b"blob\nmark :%d\ndata %d\n%s\n" % (mark, len(content), content)
+    message = b"update\n"
+    stream += b"commit refs/heads/master\ncommitter NmPkg <nmpkg@localhost> %d +0000\n" % int(time.time())
+    stream += b"data %d\n%s" % (len(message), message)
+    if has_master:
+        stream += b"from refs/heads/master^0\n"
+    for mark, name in enumerate(names, 1):
+        quoted = name.replace("\\", "\\\\").replace('"', '\\"')
+        stream += b'M 100644 :%d "%s"\n' % (mark, quoted.encode("utf-8"))
+    stream += b"\n"
+    subprocess.run(["git", "fast-import", "--quiet"], cwd=str(bare_repo), input=stream, check=True)
+
+
+class LocalRemotes(object):
+    """
+    A directory of bare git repositories <slug>.git serving packages, see `create_package_remote`
+
+    Use the instance as context manager to serve the repositories with latency, see `url_template`.
+    """
+
+    def __init__(self, path: Path, latency: float = 0):
+        self._path = Path(path).absolute()
+        self._latency = latency
+        self._saved_ssh_command = None
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def latency(self) -> float:
+        """simulated round trip time in seconds of every git command that talks to a remote"""
+        return self._latency
+
+    @property
+    def url_template(self) -> str:
+        """the `NmPackageManager.git_url_template` that serves packages from these repositories"""
+        if not self._latency:
+            return self._path.as_uri() + "/{slug}.git"
+        return "ssh://" + LATENCY_HOST + "/" + self._path.as_posix().lstrip("/") + "/{slug}.git"
+
+    def create(self, catalog: list) -> dict:
+        """
+        create a repository with the generated `package_files` for every `NmPackageId` of the `catalog`
+        and return a dict {qualifiedId: path of the repository}
+        """
+        from NmPackage import NmPackageManager
+        from NmPackage.generate import package_files
+        self._path.mkdir(parents=True, exist_ok=True)
+        return {p.qualifiedId: create_package_remote(self._path, NmPackageManager.get_git_project_slug(p),
+                                                     package_files(p))
+                for p in catalog}
+
+    def update(self, nm_package_id, files: dict):
+        """commit `files` {relative posix path: text or bytes} on top of the master branch of a package"""
+        from NmPackage import NmPackageManager
+        update_package_remote(self._path, NmPackageManager.get_git_project_slug(nm_package_id), files)
+
+    def ssh_command(self) -> str:
+        """the `GIT_SSH_COMMAND` that serves these repositories with latency"""
+        return '"{}" "{}" {}'.format(sys.executable, os.path.abspath(__file__), self._latency)
+
+    def __enter__(self):
+        self._saved_ssh_command = os.environ.get("GIT_SSH_COMMAND")
+        if self._latency:
+            os.environ["GIT_SSH_COMMAND"] = self.ssh_command()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if self._saved_ssh_command is None:
+            os.environ.pop("GIT_SSH_COMMAND", None)
+        else:
+            os.environ["GIT_SSH_COMMAND"] = self._saved_ssh_command
+
+
+def ssh_main(argv: list) -> int:
+    """
+    act as `ssh [options] <host> <command>` for the repositories of `LocalRemotes`
+
+    argv[0] is the latency in seconds, the remaining arguments are those git passes to ssh.
+    The remote command is e.g. "git-upload-pack '/path/to/repo.git'".
+    """
+    latency = float(argv[0])
+    command = shlex.split(argv[-1])
+    if not command or not command[0].startswith("git-"):
+        # e.g. git probing the ssh variant with `ssh -G <host>`
+        return 1
+
+    time.sleep(latency)
+    # the dashed git commands are not necessarily on the PATH
+    return subprocess.call(["git", command[0][len("git-"):]] + command[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(ssh_main(sys.argv[1:]))
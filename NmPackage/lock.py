@@ -0,0 +1,93 @@
+"""
+Inter-process file locks
+
+The system-wide package cache may be shared by several NmPkg processes (e.g. CI executors on the same machine).
+They coordinate through `FileLock`s in the administration dir of the package cache.
+"""
+from pathlib import Path
+import os
+
+
+class FileLock(object):
+    """
+    An exclusive lock on a file, held by at most one thread of one process of the local machine at a time.
+
+    Usage:
+
+        with FileLock(path):
+            ...
+
+    `acquire` blocks until the lock is obtained, unless `blocking` is False. The lock is not reentrant.
+    The lock file is never removed since removing it would race with other waiters.
+    """
+
+    def __init__(self, path: Path):
+        self._path = Path(path)
+        self._fd = None
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """obtain the lock, return False if it is held by someone else and `blocking` is False"""
+        assert self._fd is None, "FileLock is not reentrant"
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self._path), os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            locked = _lock(fd, blocking)
+        except BaseException:
+            os.close(fd)
+            raise
+        if not locked:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        assert self._fd is not None
+        try:
+            _unlock(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.release()
+
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock(fd: int, blocking: bool) -> bool:
+        # lock the first byte of the file.
+        # LK_LOCK gives up after 10 attempts of 1 second, keep trying.
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+
+    def _unlock(fd: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock(fd: int, blocking: bool) -> bool:
+        # flock locks are bound to the open file description, hence they also exclude other threads
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def _unlock(fd: int):
+        fcntl.flock(fd, fcntl.LOCK_UN)
@@ -1,7 +1,10 @@
 from pathlib import Path, PureWindowsPath
+import os
+import re
 from xml.dom import minidom
 
 from NmPackage import *
+from NmPackage.trace import Trace
 
 
 class VsProjectFiler(object):
@@ -14,16 +17,26 @@ class VsProjectFiler(object):
 
     """
 
-    def serialize(self, vsProject: VsProject):
+    def serialize(self, vsProject: VsProject, engine: str = None) -> list:
+        """
+        Write a `VsProject` to disk and return the list of files that were written
+
+        Files whose contents are already up to date are not touched, see `write_if_changed`.
+        """
+        written = []
+
         # ensure the <projectName>.NmPacakgeDeps.props is imported in the *.vcxproj file
         vcx_project_file = VcxProjectFile(vsProject.project_filepath)
-        vcx_project_file.integrate_nmpkg()
+        if vcx_project_file.integrate_nmpkg(engine):
+            written.append(vcx_project_file.path)
 
         # write the dependecies to disk
         propsfile = vsProject.project_filepath.with_name(
             vsProject.projectName + ".NmPackageDeps.props")
-        with Path(propsfile).open("tw+") as f:
-            f.write(NmPackageDepsFileFormat.serialize(vsProject.dependencies))
+        if write_if_changed(propsfile, text_file_bytes(NmPackageDepsFileFormat.serialize(vsProject.dependencies))):
+            written.append(propsfile)
+
+        return written
 
     def deserialize(self, vcxproject_filepath: Path):
         # create project file
@@ -33,7 +46,8 @@ class VsProjectFiler(object):
             return VsProject(vcxproject_filepath)
 
         # read package dependencies
-        with vcxproject_file.nmPackageDeps_path.open("tr") as f:
+        with Trace.span("parse", path=vcxproject_file.nmPackageDeps_path), \
+                vcxproject_file.nmPackageDeps_path.open("tr") as f:
             nmPackageIds = NmPackageDepsFileFormat.deserialize(f.read())
             vsProject = VsProject(vcxproject_filepath)
             vsProject.get_dependencies().update(nmPackageIds)
@@ -41,15 +55,50 @@ class VsProjectFiler(object):
             return vsProject
 
 
-def Integrate(path: Path):
+def Integrate(path: Path, engine: str = None) -> list:
     """
-    Integrate '<projectName.>NmPackageDeps.props' into an '*.vcxproj' file
+    Integrate '<projectName.>NmPackageDeps.props' into an '*.vcxproj' file and return the list of files written
 
     path can be the path to a *.vcxproj file or a directory containing only one *.vcxproj file
+    `engine` selects how the *.vcxproj file is patched, see `VcxProjectFile.integrate_nmpkg`
     """
     vcxproj_filepath = find_vcxproj(Path(path))
 
-    VsProjectFiler().serialize(VsProject(vcxproj_filepath))
+    with Trace.span("integrate", project=vcxproj_filepath):
+        # keep the dependencies of an existing '<projectName.>NmPackageDeps.props'
+        filer = VsProjectFiler()
+        return filer.serialize(filer.deserialize(vcxproj_filepath), engine)
+
+
+def text_file_bytes(text: str) -> bytes:
+    """
+    the bytes a text mode write of `text` produces, i.e. with platform newlines
+
+    The generated files are xml files that declare to be utf-8 encoded.
+    """
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    return text.encode("utf-8")
+
+
+def write_if_changed(path: Path, content: bytes) -> bool:
+    """
+    Atomically write `content` to `path` unless the file already has exactly that content
+
+    An unchanged file keeps its mtime, such that MSBuild and Visual Studio don't consider the project out of date.
+    Returns True if the file was written
+    """
+    path = Path(path)
+    try:
+        if path.stat().st_size == len(content) and path.read_bytes() == content:
+            DebugLog.print("unchanged, not writing file: " + str(path))
+            return False
+    except FileNotFoundError:
+        pass
+
+    DebugLog.print("writing file: " + str(path))
+    write_atomically(path, content)
+    return True
 
 
 def find_vcxproj(path: Path)->Path:
@@ -85,9 +134,94 @@ def find_vcxproj(path: Path)->Path:
     raise Exception(msg)
 
 
+def find_sln_projects(sln_filepath: Path) -> list:
+    """
+    return the *.vcxproj files of a Visual Studio solution (*.sln) file
+
+    A solution lists its projects as
+        Project("{<type guid>}") = "<name>", "<relative\\path\\to\\project.vcxproj>", "{<project guid>}"
+    Entries that are no *.vcxproj (e.g. solution folders or C# projects) are skipped.
+    """
+    sln_filepath = Path(sln_filepath)
+    if not sln_filepath.is_file() or not sln_filepath.match("*.sln"):
+        raise Exception("not a *.sln file: " + str(sln_filepath))
+
+    DebugLog.print("reading file: " + str(sln_filepath))
+    with sln_filepath.open("tr", encoding="utf-8-sig") as f:
+        sln = f.read()
+
+    vcxproj_filepaths = []
+    for project in _sln_project.findall(sln):
+        if project.lower().endswith(".vcxproj"):
+            # the paths in a solution are relative windows paths
+            vcxproj_filepaths.append(sln_filepath.parent.joinpath(*PureWindowsPath(project).parts))
+    return vcxproj_filepaths
+
+
+_sln_project = re.compile(r'^Project\("[^"]*"\)\s*=\s*"[^"]*"\s*,\s*"([^"]*)"', re.MULTILINE)
+
+
+def find_vcxproj_files(tree: Path) -> list:
+    """
+    recursively find all *.vcxproj files in a directory tree, ignoring vcs folders
+    """
+    ignoreFolders = ['.svn', '.git']
+    vcxproj_filepaths = []
+    for root, dirs, files in os.walk(str(tree)):
+        for f in ignoreFolders:
+            if (f in dirs):
+                dirs.remove(f)
+        dirs.sort()
+
+        vcxproj_filepaths.extend(Path(root) / f for f in sorted(files) if f.endswith(".vcxproj"))
+
+    return vcxproj_filepaths
+
+
+def integrate_project(vcxproj_filepath: Path, engine: str = None) -> list:
+    """
+    `Integrate` a single *.vcxproj file and return the list of files that changed on disk
+
+    This is a module level function such that it can be dispatched to a process pool.
+    """
+    return Integrate(VcxProjectFile(vcxproj_filepath).path, engine)
+
+
+def integrate_all(vcxproj_filepaths: list, jobs: int = None, engine: str = None) -> dict:
+    """
+    `Integrate` many *.vcxproj files using a pool of `jobs` processes
+
+    Returns a dict {vcxproj file: list of files that changed on disk}.
+    A failing project does not abort the others, instead a single exception summarizes all failures.
+    """
+    changes = {}
+    failures = []
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [(p, executor.submit(integrate_project, p, engine)) for p in vcxproj_filepaths]
+        for vcxproj_filepath, future in futures:
+            try:
+                changes[vcxproj_filepath] = future.result()
+            except Exception as e:
+                failures.append((vcxproj_filepath, e))
+
+    raise_failures(failures, len(vcxproj_filepaths), "integrate", "projects")
+    return changes
+
+
 class VcxProjectFile(object):
     """Class representing an actual *.vcxproj file"""
 
+    # the available `integrate_nmpkg` engines
+    ENGINES = ("dom", "stream")
+
+    # the engine used by `integrate_nmpkg` by default
+    default_engine = "dom"
+
+    # read buffer size of the "stream" engine
+    CHUNK_SIZE = 1 << 16
+
     @property
     def path(self) -> Path:
         return self._path
@@ -110,9 +244,32 @@ class VcxProjectFile(object):
         if not self.path.match("*.vcxproj"):
             raise Exception("not a vcxfile: " + str(self.path))
 
-    def integrate_nmpkg(self):
+    def integrate_nmpkg(self, engine: str = None) -> bool:
+        """
+        Integrate '<projectName>.NmPackageDeps.props' into this *.vcxproj file, return True if the file was written
+
+        The `engine` is one of `ENGINES`:
+          * "dom": parse the whole project into a DOM and pretty print it if it changed,
+                   i.e. the complete file is reformatted
+          * "stream": scan the project chunk by chunk and splice the missing elements in before the root end tag,
+                   i.e. all other bytes are left untouched. Memory use does not depend on the size of the project.
+
+        Both engines consider the same elements as already present, so once integrated by either engine
+        a project is left alone by both.
+        """
+        if engine is None:
+            engine = VcxProjectFile.default_engine
+
+        if engine == "dom":
+            return self._integrate_nmpkg_dom()
+        elif engine == "stream":
+            return self._integrate_nmpkg_stream()
+
+        raise Exception("unknown integration engine: " + str(engine))
+
+    def _integrate_nmpkg_dom(self) -> bool:
         """
-        Integrate '<projectName>.NmPackageDeps.props' into this *.vcxproj file
+        The "dom" engine of `integrate_nmpkg`
         """
         assert(self.path.exists())
         assert(self.path.match("*.vcxproj"))
@@ -131,22 +288,102 @@ class VcxProjectFile(object):
         # write the updated project xml config to file
         if not self._domChanged:
             del(self._domChanged)
-            return
+            return False
 
         sanitize_text_nodes(projDom.documentElement)
-        with Path(self.path).open('tw') as f:
-            dom_str = projDom.toprettyxml(
-                indent="  ", encoding="utf-8").decode()
-            for line in dom_str.splitlines():
-                # space before closing node tag
-                #  NOK: <name attr="value"/>
-                #  OK : <name attr="value" />
-                # this appears to be the visual studio way
-                line = line.replace('"/>', '" />')
-
-                f.write(line + "\n")
+        dom_str = projDom.toprettyxml(
+            indent="  ", encoding="utf-8").decode()
+        lines = []
+        for line in dom_str.splitlines():
+            # space before closing node tag
+            #  NOK: <name attr="value"/>
+            #  OK : <name attr="value" />
+            # this appears to be the visual studio way
+            line = line.replace('"/>', '" />')
+
+            lines.append(line + "\n")
 
         del(self._domChanged)
+        return write_if_changed(self.path, text_file_bytes("".join(lines)))
+
+    def _integrate_nmpkg_stream(self) -> bool:
+        """
+        The "stream" engine of `integrate_nmpkg`
+
+        The project is expected to be utf-8 encoded, like Visual Studio writes it.
+        The new elements follow the newline style of the line holding the root end tag.
+        The file is replaced atomically, i.e. a failure never leaves a partially written project behind.
+        """
+        import shutil
+        import tempfile
+        from xml.sax.saxutils import escape
+
+        name = self.nmPackageDeps_path.name
+        chunk_size = VcxProjectFile.CHUNK_SIZE
+
+        DebugLog.print("scanning file: " + str(self.path))
+        with self.path.open("rb") as f:
+            if f.read(2) in (b"\xff\xfe", b"\xfe\xff"):
+                raise Exception("utf-16 encoded projects are not supported: " + str(self.path))
+            f.seek(0)
+
+            imported, included, end_tag_offset = _scan_vcxproj(f, name, chunk_size)
+            if imported and included:
+                # already integrated, nothing to do!
+                return False
+
+            # insert the elements at the start of the line of the root end tag
+            # or right before the end tag if other markup precedes it on its line
+            window_offset = max(0, end_tag_offset - 4096)
+            f.seek(window_offset)
+            window = f.read(end_tag_offset - window_offset)
+            line_start = window.rfind(b"\n") + 1
+            if line_start == 0:
+                newline = os.linesep.encode()
+            elif window[:line_start].endswith(b"\r\n"):
+                newline = b"\r\n"
+            else:
+                newline = b"\n"
+            if line_start > 0 and not window[line_start:].strip():
+                insert_offset = window_offset + line_start
+                lines = []
+            else:
+                insert_offset = end_tag_offset
+                lines = [b""]
+
+            value = escape(name, {'"': "&quot;"}).encode("utf-8")
+            if not imported:
+                lines.append(b'  <Import Project="' + value + b'" />')
+            if not included:
+                lines.append(b"  <ItemGroup>")
+                lines.append(b'    <Text Include="' + value + b'" />')
+                lines.append(b"  </ItemGroup>")
+            insertion = newline.join(lines) + newline
+
+        with Trace.span("write", path=self.path) as span:
+            # splice the elements into a copy of the project next to it
+            # the project is closed before it is replaced
+            fd, tmp_path = tempfile.mkstemp(prefix=self.path.name + ".", suffix=".tmp", dir=str(self.path.parent))
+            try:
+                with os.fdopen(fd, "wb") as out, self.path.open("rb") as f:
+                    remaining = insert_offset
+                    while remaining > 0:
+                        chunk = f.read(min(chunk_size, remaining))
+                        if not chunk:
+                            raise Exception("file changed while integrating: " + str(self.path))
+                        out.write(chunk)
+                        remaining -= len(chunk)
+                    out.write(insertion)
+                    shutil.copyfileobj(f, out, chunk_size)
+                    span.args["size"] = out.tell()
+                shutil.copymode(str(self.path), tmp_path)
+
+                DebugLog.print("writing file: " + str(self.path))
+                os.replace(tmp_path, str(self.path))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        return True
 
     def _import_NmPackageDeps(self, projDom):
         """
@@ -239,6 +476,136 @@ def sanitize_text_nodes(xml_element: minidom.Element):
         sanitize_text_nodes(c)
 
 
+# markup that is skipped as a whole by `_iter_xml_tags`: (start, end)
+_skipped_markup = ((b"<!--", b"-->"), (b"<![CDATA[", b"]]>"), (b"<?", b"?>"))
+
+# the remainder of a tag after its '<', a '>' within a quoted attribute value does not end the tag
+_tag_remainder = re.compile(rb"""(?:[^>"']|"[^"]*"|'[^']*')*>""")
+
+_tag_name = re.compile(rb"</?([^\s/>]+)")
+
+_tag_attribute = re.compile(rb"""([^\s=/>]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+
+
+def _iter_xml_tags(f, chunk_size: int):
+    """
+    Generate a tuple (file offset, tag) for every start, end and empty-element tag of a binary xml stream
+
+    The stream is read in chunks of `chunk_size` bytes, only the tag at hand is kept in memory.
+    Comments, CDATA sections and processing instructions are skipped, character data is never looked at.
+    """
+    buf = b""
+    offset = 0  # file offset of buf[0]
+    pos = 0
+
+    def fill() -> bool:
+        """read the next chunk and drop the consumed bytes, i.e. `pos` becomes 0"""
+        nonlocal buf, offset, pos
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return False
+        buf = buf[pos:] + chunk
+        offset += pos
+        pos = 0
+        return True
+
+    while True:
+        start = buf.find(b"<", pos)
+        if start < 0:
+            pos = len(buf)
+            if not fill():
+                return
+            continue
+        pos = start
+
+        # read ahead such that the markup can be classified
+        while len(buf) - pos < len(b"<![CDATA[") and fill():
+            pass
+
+        skipped = False
+        for opener, closer in _skipped_markup:
+            if buf.startswith(opener, pos):
+                search = pos + len(opener)
+                end = buf.find(closer, search)
+                while end < 0:
+                    # the end may straddle the chunk boundary
+                    search = max(search, len(buf) - len(closer) + 1) - pos
+                    if not fill():
+                        raise Exception("unterminated markup at offset {}".format(offset + pos))
+                    end = buf.find(closer, search)
+                pos = end + len(closer)
+                skipped = True
+                break
+        if skipped:
+            continue
+
+        m = _tag_remainder.match(buf, pos + 1)
+        while m is None:
+            if not fill():
+                raise Exception("unterminated tag at offset {}".format(offset + pos))
+            m = _tag_remainder.match(buf, pos + 1)
+
+        yield offset + pos, buf[pos:m.end()]
+        pos = m.end()
+
+
+def _scan_vcxproj(f, name: str, chunk_size: int) -> tuple:
+    """
+    Scan a binary *.vcxproj stream for the integration of the props file `name`, see `VcxProjectFile.integrate_nmpkg`
+
+    Returns a tuple (imported, included, file offset of the root end tag) where
+      * imported: an <Import Project="`name`"/> element is present
+      * included: a <Text Include="`name`"/> element is present in an <ItemGroup>
+    """
+    from xml.sax.saxutils import unescape
+
+    def attribute(tag: bytes, attribute_name: bytes) -> str:
+        for m in _tag_attribute.finditer(tag):
+            if m.group(1) == attribute_name:
+                value = m.group(2) if m.group(2) is not None else m.group(3)
+                return unescape(value.decode("utf-8"), {"&quot;": '"', "&apos;": "'"})
+        return None
+
+    imported = False
+    included = False
+    open_elements = []
+    for offset, tag in _iter_xml_tags(f, chunk_size):
+        if tag.startswith(b"<!"):
+            # e.g. a document type declaration
+            continue
+
+        m = _tag_name.match(tag)
+        if m is None:
+            raise Exception("malformed tag at offset {}".format(offset))
+        tag_name = m.group(1)
+
+        if tag.startswith(b"</"):
+            if not open_elements or open_elements.pop() != tag_name:
+                raise Exception("mismatched end tag at offset {}".format(offset))
+            if not open_elements:
+                return imported, included, offset
+            continue
+
+        if tag_name == b"Import":
+            imported = imported or attribute(tag, b"Project") == name
+        elif tag_name == b"Text" and open_elements and open_elements[-1] == b"ItemGroup":
+            included = included or attribute(tag, b"Include") == name
+
+        if not tag.endswith(b"/>"):
+            open_elements.append(tag_name)
+        elif not open_elements:
+            raise Exception("empty root element at offset {}".format(offset))
+
+    raise Exception("root end tag not found")
+
+
+def _escape_attribute(value: str) -> str:
+    """escape an xml attribute value in double quotes like minidom does"""
+    if "&" in value or "<" in value or '"' in value or ">" in value:
+        value = value.replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;").replace(">", "&gt;")
+    return value
+
+
 class NmPackageDepsFileFormat(object):
     """
     (De)Serializing a set of `NmPackageId`'s from and to NmPackageDeps.props file format.
@@ -263,12 +630,62 @@ A dependency  on 'packageId' is expressed as follows.
 the condition is needed to allow the project to be loaded if the package is not yet present on the disk
 """
 
+    # the exact start of a serialized NmPackageDeps.props file up to and including the comment node
+    _canonical_header = '<?xml version="1.0" encoding="utf-8"?>\n' \
+        '<Project DefaultTargets="Build" ToolsVersion="4.0" xmlns="http://schemas.microsoft.com/developer/msbuild/2003">\n' \
+        '  <!--' + __comment + '-->\n'
+
+    # a single serialized Import element, the attribute order depends on the python version of the serializer.
+    # Paths that need xml escaping are not canonical.
+    _canonical_import = re.compile(
+        r"""  <Import Condition="Exists\('([^"'<>&]*)'\)" Project="\1"/>\n"""
+        r"""|  <Import Project="([^"'<>&]*)" Condition="Exists\('\2'\)"/>\n""")
+
+    # a serialized Import element of a package path, see `serialize_to`
+    _import_template = """  <Import Condition="Exists('{0}')" Project="{0}"/>\n"""
+
+    # the canonical import path of a package "$(NmPackageDir)\<packageId>\<versionId>\NmPackage.props",
+    # its package and version ids are single path names, see `_package_to_path`
+    _canonical_path = re.compile(r"\$\(NmPackageDir\)\\([^\\/:]+)\\([^\\/:]+)\\NmPackage\.props")
+
+    # the available `deserialize` parser backends, see `deserialize`
+    PARSERS = ("canonical", "iterparse", "minidom")
+
+    # the parser backend used by `deserialize` by default
+    default_parser = "canonical"
+
     @staticmethod
-    def deserialize(xml: str) -> set:
+    def deserialize(xml: str, parser: str = None) -> set:
         """
         parse a '<projectName>.NmPacakageDeps.props' xml stream adn return the set of `NmPackageId`s
         TODO: generalize to use IO streams to make it easy to unit test (read from in-mem string stream instead of a file)
         yet also type safe!
+
+        The `parser` backend is one of `PARSERS`:
+          * "minidom": the strict reference parser building a full DOM
+          * "iterparse": a streaming `xml.etree.ElementTree` parser
+          * "canonical": a recognizer for the exact layout emitted by `serialize`
+
+        The fast backends only handle what they can handle exactly like the strict parser and fall back to
+        the next backend in line (canonical -> iterparse -> minidom) for anything else.
+        Hence all backends return identical results and raise identical errors.
+        """
+        if parser is None:
+            parser = NmPackageDepsFileFormat.default_parser
+
+        if parser == "canonical":
+            return NmPackageDepsFileFormat._deserialize_canonical(xml)
+        elif parser == "iterparse":
+            return NmPackageDepsFileFormat._deserialize_iterparse(xml)
+        elif parser == "minidom":
+            return NmPackageDepsFileFormat._deserialize_minidom(xml)
+
+        raise Exception("unknown parser: " + str(parser))
+
+    @staticmethod
+    def _deserialize_minidom(xml: str) -> set:
+        """
+        The strict reference parser, see `deserialize`
         """
         from xml.dom import minidom, Node
         dom = minidom.parseString(xml)
@@ -283,7 +700,7 @@ the condition is needed to allow the project to be loaded if the package is not
                     # empty text nodes are harmless in the NmPackageDeps.props file format
                     continue
                 else:
-                    raise Exeption(
+                    raise Exception(
                         "Unexpected text node under 'Project' root node.  (corrupted file?)")
 
             # all other child nodes should be "Import" elements
@@ -303,6 +720,77 @@ the condition is needed to allow the project to be loaded if the package is not
 
         return nmPackageIds
 
+
+    @staticmethod
+    def _deserialize_iterparse(xml: str) -> set:
+        """
+        streaming parser, see `deserialize`
+
+        Falls back to `_deserialize_minidom` for anything the strict parser might treat differently.
+        """
+        # constructs that ElementTree hides but that the strict parser rejects:
+        # CDATA sections, doctypes (entities), namespace prefixes (which are part of a minidom tagName)
+        # and processing instructions other than the xml declaration (the "pi" event requires python 3.8)
+        if "<![CDATA[" in xml or "<!DOCTYPE" in xml or "xmlns:" in xml or \
+                xml.find("<?", 1 if xml.startswith("<?xml ") else 0) != -1:
+            return NmPackageDepsFileFormat._deserialize_minidom(xml)
+
+        import xml.etree.ElementTree as ET
+        nmPackageIds = set()
+        try:
+            parser = ET.XMLPullParser(events=("start", "end"))
+            parser.feed(xml)
+            parser.close()
+
+            depth = 0
+            for event, element in parser.read_events():
+                if event == "start":
+                    depth += 1
+                    if depth == 2 and element.tag.rpartition("}")[2] != "Import":
+                        raise Exception("unexpected element")
+                elif event == "end":
+                    # text under the root node is either the root's text or the tail of a child
+                    if (depth == 1 and element.text and element.text.strip() != "") or \
+                       (depth == 2 and element.tail and element.tail.strip() != ""):
+                        raise Exception("unexpected text")
+                    if depth == 2:
+                        nmPackageIds.add(NmPackageDepsFileFormat._path_to_package(
+                            element.get("Project", "")))
+                    depth -= 1
+        except Exception:
+            # let the strict parser decide, it raises the reference error
+            return NmPackageDepsFileFormat._deserialize_minidom(xml)
+
+        return nmPackageIds
+
+    @staticmethod
+    def _deserialize_canonical(xml: str) -> set:
+        """
+        recognizer for the exact layout emitted by `serialize`, see `deserialize`
+
+        Falls back to `_deserialize_iterparse` for anything that is not canonical.
+        """
+        header = NmPackageDepsFileFormat._canonical_header
+        footer = "</Project>\n"
+        if not xml.startswith(header) or not xml.endswith(footer):
+            return NmPackageDepsFileFormat._deserialize_iterparse(xml)
+
+        nmPackageIds = set()
+        match_import = NmPackageDepsFileFormat._canonical_import.match
+        pos = len(header)
+        end = len(xml) - len(footer)
+        try:
+            while pos < end:
+                m = match_import(xml, pos, end)
+                if m is None:
+                    raise Exception("non canonical import")
+                nmPackageIds.add(NmPackageDepsFileFormat._path_to_package(m.group(1) or m.group(2)))
+                pos = m.end()
+        except Exception:
+            return NmPackageDepsFileFormat._deserialize_iterparse(xml)
+
+        return nmPackageIds
+
     @staticmethod
     def _package_to_path(nmPackageId: NmPackageId) -> str:
         """
@@ -310,6 +798,19 @@ the condition is needed to allow the project to be loaded if the package is not
 
         See Also `_path_to_package` which does the reverse
         """
+        packageId = nmPackageId.packageId
+        versionId = nmPackageId.versionId
+        path = "$(NmPackageDir)\\" + packageId + "\\" + versionId + "\\NmPackage.props"
+        if NmPackageDepsFileFormat._canonical_path.fullmatch(path) is None or packageId == "." or versionId == ".":
+            # ids that are not a single path name are normalized like windows paths
+            return NmPackageDepsFileFormat._package_to_path_pathlib(nmPackageId)
+        return path
+
+    @staticmethod
+    def _package_to_path_pathlib(nmPackageId: NmPackageId) -> str:
+        """
+        the reference implementation of `_package_to_path`
+        """
         package_path = PureWindowsPath("$(NmPackageDir)").joinpath(
             PureWindowsPath(nmPackageId.packageId)).joinpath(
             PureWindowsPath(nmPackageId.versionId)).joinpath(
@@ -323,7 +824,17 @@ the condition is needed to allow the project to be loaded if the package is not
 
         See Also `_package_to_path` which does the reverse
         """
-        from pathlib import PureWindowsPath
+        m = NmPackageDepsFileFormat._canonical_path.fullmatch(path)
+        if m is None or m.group(1) == "." or m.group(2) == ".":
+            # let the reference implementation decide, it raises the reference error
+            return NmPackageDepsFileFormat._path_to_package_pathlib(path)
+        return NmPackageId.intern(m.group(1), m.group(2))
+
+    @staticmethod
+    def _path_to_package_pathlib(path: str) -> NmPackageId:
+        """
+        the reference implementation of `_path_to_package`
+        """
         windows_path = PureWindowsPath(path)
 
         # the package path is essentially a windows path so lets break it into its 4 parts to process it
@@ -333,11 +844,11 @@ the condition is needed to allow the project to be loaded if the package is not
         PackageDir = windows_path.parent.parent.parent.name
 
         # create NmPackageId
-        nmPackageId = NmPackageId(packageId, versionId)
+        nmPackageId = NmPackageId.intern(packageId, versionId)
 
         # check that all whole path was parsed
         # by verifying that the parsed paths is identical to the input path
-        parsed_package_path = NmPackageDepsFileFormat._package_to_path(
+        parsed_package_path = NmPackageDepsFileFormat._package_to_path_pathlib(
             nmPackageId)
         if parsed_package_path != path:
             raise Exception("Failed to parse Project/Import@Project: " + path)
@@ -349,32 +860,31 @@ the condition is needed to allow the project to be loaded if the package is not
         """
         Serialize a set of `NmPackageId`s according the NmPackageDeps.props file format
         """
-        # create xml document
-        from xml.dom import minidom
-        dom = minidom.getDOMImplementation().createDocument(None, "Project", None)
-        dom.documentElement.setAttribute("DefaultTargets", "Build")
-        dom.documentElement.setAttribute("ToolsVersion", "4.0")
-        dom.documentElement.setAttribute(
-            "xmlns", "http://schemas.microsoft.com/developer/msbuild/2003")
+        import io
+        stream = io.StringIO()
+        NmPackageDepsFileFormat.serialize_to(stream, packages)
+        return stream.getvalue()
 
-        # add comment node
-        dom.documentElement.appendChild(
-            dom.createComment(NmPackageDepsFileFormat.__comment))
+    @staticmethod
+    def serialize_to(stream, packages: set = set()):
+        """
+        Serialize a set of `NmPackageId`s according the NmPackageDeps.props file format to a text `stream`
+
+        The output is the pretty printed xml of minidom (python 3.6) without building a document:
+        `_canonical_header`, an `_import_template` line per package and the root end tag.
+        """
+        stream.write(NmPackageDepsFileFormat._canonical_header)
 
         # sort packages alphabetically
         # this will make it eaiser for humans to find a package
         # it also ensures that if a non-empty VCS diff is an actual change and not just a reordering
-        sorted_packages = sorted(
-            packages, key=lambda nmPackageId: nmPackageId.qualifiedId)
+        sorted_packages = sorted(packages)
 
-        # add Import nodes to dom
+        # add Import lines
+        import_template = NmPackageDepsFileFormat._import_template
         for p in sorted_packages:
             package_path = NmPackageDepsFileFormat._package_to_path(p)
-            import_node = dom.documentElement.appendChild(
-                dom.createElement("Import"))
-            import_node.setAttribute("Project", package_path)
-            import_node.setAttribute(
-                "Condition", "Exists('{}')".format(package_path))
-
-        # pretty print
-        return dom.toprettyxml(indent="  ", encoding="utf-8").decode()
+            stream.write(import_template.format(_escape_attribute(package_path)))
+
+        stream.write("</Project>\n")
+
@@ -0,0 +1,288 @@
+"""
+Discover the '*.NmPackageDeps.props' files in a directory tree and collect their `NmPackageId`s.
+
+The tree is traversed with `os.scandir` while the discovered files are parsed on a pool of workers,
+i.e. directory traversal and parsing overlap and results are streamed as soon as they are available.
+"""
+from NmPackage import write_json_atomically
+from NmPackage.debug import DebugLog
+from NmPackage.save import NmPackageDepsFileFormat
+from NmPackage.trace import Trace
+from pathlib import Path
+import os
+import queue
+
+# folders that are never traversed, e.g. version control administration
+IGNORED_FOLDERS = frozenset(['.svn', '.git'])
+
+NMPACKAGEDEPS_SUFFIX = ".NmPackageDeps.props"
+
+
+def find_props_files(tree: Path):
+    """
+    Generate the paths (as `str`) of all *.NmPackageDeps.props files in `tree`, ignoring vcs folders.
+
+    Like `os.walk` symbolic links to directories are not followed and unreadable directories are skipped.
+    """
+    stack = [str(tree)]
+    while stack:
+        dir = stack.pop()
+        sub_dirs, props_files = list_dir(dir)
+        for name in props_files:
+            yield os.path.join(dir, name)
+        stack.extend(os.path.join(dir, d) for d in sub_dirs)
+
+
+def list_dir(dir: str) -> tuple:
+    """
+    return a tuple (sub directory names, *.NmPackageDeps.props file names) of a single directory
+
+    vcs folders and symbolic links to directories are omitted, an unreadable directory is considered empty.
+    """
+    sub_dirs = []
+    props_files = []
+    try:
+        with os.scandir(dir) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if entry.name not in IGNORED_FOLDERS and not entry.is_symlink():
+                        sub_dirs.append(entry.name)
+                elif entry.name.endswith(NMPACKAGEDEPS_SUFFIX):
+                    props_files.append(entry.name)
+    except OSError:
+        pass
+    return sub_dirs, props_files
+
+
+def parse_props_files(paths: list) -> list:
+    """
+    parse a batch of *.NmPackageDeps.props files and return a list of tuples (path, set of `NmPackageId`s)
+
+    This is a module level function such that it can be dispatched to a process pool.
+    """
+    results = []
+    for path in paths:
+        with Trace.span("parse", path=path), open(path, "tr") as f:
+            results.append((path, NmPackageDepsFileFormat.deserialize(f.read())))
+    return results
+
+
+def parse_all(paths, jobs: int = None, processes: bool = False):
+    """
+    Generate a tuple (path, set of `NmPackageId`s) for every *.NmPackageDeps.props file in the iterable `paths`.
+
+    The files are parsed by a pool of `jobs` workers while `paths` is still being consumed.
+    Results are generated in order of completion, not in the order of `paths`.
+
+    By default a thread pool is used. A process pool (`processes=True`) parallelizes the xml parsing itself,
+    at the cost of process start-up, which only pays off for large trees on multi-core machines.
+    """
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    if processes:
+        # amortize the inter-process communication over a batch of files
+        executor_class, batch_size = ProcessPoolExecutor, 32
+    else:
+        executor_class, batch_size = ThreadPoolExecutor, 1
+
+    with executor_class(max_workers=jobs) as executor:
+        # finished futures are pushed onto a queue such that they can be streamed while consuming `paths`
+        done = queue.Queue()
+        pending = 0
+        batch = []
+
+        def submit(batch):
+            executor.submit(parse_props_files, batch).add_done_callback(done.put)
+
+        for path in paths:
+            batch.append(path)
+            if len(batch) < batch_size:
+                continue
+
+            submit(batch)
+            batch = []
+            pending += 1
+
+            # stream all the results that are already available without blocking the producer of `paths`
+            while not done.empty():
+                pending -= 1
+                yield from done.get().result()
+
+        if batch:
+            submit(batch)
+            pending += 1
+
+        # all paths are consumed, wait for the remaining results
+        while pending > 0:
+            pending -= 1
+            yield from done.get().result()
+
+
+def scan_tree(tree: Path, jobs: int = None, processes: bool = False):
+    """
+    Generate a tuple (path, set of `NmPackageId`s) for every *.NmPackageDeps.props file in `tree`.
+
+    The files are parsed while the tree is still being traversed, see `parse_all`.
+    """
+    assert Path(tree).is_dir()
+
+    def found_props_files():
+        for path in find_props_files(tree):
+            DebugLog.print("found: " + path)
+            yield path
+
+    yield from parse_all(found_props_files(), jobs, processes)
+
+
+def collect_all_packages(tree: Path, jobs: int = None, processes: bool = False, index_file: Path = None) -> set:
+    """
+    recursively find all *.NmPackageDeps.props and collect all packages
+
+    If an `index_file` is given then the tree is scanned incrementally, see `ScanIndex`.
+    """
+    with Trace.span("scan", tree=tree, index_file=index_file):
+        if index_file is not None:
+            results = ScanIndex(tree, index_file).scan(jobs, processes).values()
+        else:
+            results = (nmPackageIds for path, nmPackageIds in scan_tree(tree, jobs, processes))
+
+        packages = set()
+        for nmPackageIds in results:
+            packages.update(nmPackageIds)
+
+    return packages
+
+
+class ScanIndex(object):
+    """
+    A persistent index of the *.NmPackageDeps.props files in a directory tree, used to rescan it incrementally.
+
+    For every directory the index records its mtime, its sub directories and its props files.
+    For every props file it records its mtime, size and parsed `NmPackageId`s.
+
+    A rescan stats every directory and props file but
+      * only lists the directories whose mtime changed (i.e. entries were added, removed or renamed)
+      * only parses the props files whose mtime or size changed
+
+    File systems have a limited timestamp resolution. Hence entries that were modified just before they were
+    indexed are not trusted on the next scan, like git does for its index.
+
+    The index file is best kept outside the tree, see `NmPackageManager.get_scan_index_file`.
+    """
+    # bump when the index file format changes, older indexes are discarded
+    FORMAT_VERSION = 1
+
+    # modifications within this window before scanning are not trusted (FAT has a 2s resolution)
+    RACY_WINDOW_NS = 2 * 10 ** 9
+
+    def __init__(self, tree: Path, index_file: Path):
+        self._tree = Path(tree)
+        self._index_file = Path(index_file)
+        # the directory of an index file inside the tree (relative to the tree) changes with every save
+        own_dir = os.path.relpath(str(self._index_file.parent.resolve()), str(self._tree.resolve()))
+        self._own_dir = None if own_dir.startswith(os.pardir) else "" if own_dir == os.curdir else own_dir
+        self._dirs = {}
+        self._files = {}
+        self._load()
+
+    @property
+    def index_file(self) -> Path:
+        return self._index_file
+
+    def _load(self):
+        """read the index file, a missing, corrupt or outdated index is silently discarded"""
+        import json
+        try:
+            with self._index_file.open("tr") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if index.get("version") != ScanIndex.FORMAT_VERSION or index.get("tree") != str(self._tree.resolve()):
+            return
+
+        self._dirs = index["dirs"]
+        self._files = index["files"]
+
+    def _save(self):
+        """atomically replace the index file"""
+        write_json_atomically(self._index_file, {"version": ScanIndex.FORMAT_VERSION,
+                                                 "tree": str(self._tree.resolve()),
+                                                 "dirs": self._dirs,
+                                                 "files": self._files})
+
+    def scan(self, jobs: int = None, processes: bool = False) -> dict:
+        """
+        Incrementally rescan the tree, update the index file and return a dict {path: set of `NmPackageId`s}
+
+        Changed props files are parsed by a pool of `jobs` workers, see `parse_all`.
+        """
+        assert self._tree.is_dir()
+
+        import time
+        from NmPackage import NmPackageId
+        trusted_before = int(time.time() * 10 ** 9) - ScanIndex.RACY_WINDOW_NS
+
+        def trusted(mtime_ns):
+            return mtime_ns if mtime_ns < trusted_before else None
+
+        dirs = {}
+        files = {}
+        results = {}
+        changed = []
+
+        def join(rel_path, name):
+            return rel_path + os.sep + name if rel_path else name
+
+        root = str(self._tree) + os.sep
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            abs_dir = root + rel_dir
+            try:
+                mtime_ns = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                continue
+
+            cached = self._dirs.get(rel_dir)
+            if cached is not None and cached[0] == mtime_ns:
+                # the directory entries are unchanged, reuse the cached listing
+                sub_dirs, props_files = cached[1], cached[2]
+            else:
+                DebugLog.print("listing: " + abs_dir)
+                sub_dirs, props_files = (sorted(names) for names in list_dir(abs_dir))
+            # the directory of the index file itself is never trusted, else every save would invalidate it
+            dirs[rel_dir] = [None if rel_dir == self._own_dir else trusted(mtime_ns), sub_dirs, props_files]
+
+            for name in props_files:
+                rel_file = join(rel_dir, name)
+                abs_file = root + rel_file
+                try:
+                    st = os.stat(abs_file)
+                except OSError:
+                    continue
+
+                cached = self._files.get(rel_file)
+                if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                    files[rel_file] = cached
+                    results[abs_file] = set(NmPackageId.intern(p, v) for p, v in cached[2])
+                else:
+                    files[rel_file] = [trusted(st.st_mtime_ns), st.st_size, []]
+                    changed.append((rel_file, abs_file))
+
+            stack.extend(join(rel_dir, d) for d in sub_dirs)
+
+        # parse all new and modified props files
+        abs_to_rel = {abs_file: rel_file for rel_file, abs_file in changed}
+        for abs_file, nmPackageIds in parse_all(abs_to_rel.keys(), jobs, processes):
+            DebugLog.print("parsed: " + abs_file)
+            files[abs_to_rel[abs_file]][2] = sorted([p.packageId, p.versionId] for p in nmPackageIds)
+            results[abs_file] = nmPackageIds
+
+        # also save new mtimes without a change in the listing (e.g. a source file was added),
+        # else the directory would be listed again on every scan
+        if dirs != self._dirs or files != self._files:
+            self._dirs = dirs
+            self._files = files
+            self._save()
+
+        return results
@@ -0,0 +1,141 @@
+"""
+Content-addressed file store
+
+Files with identical contents, e.g. the same headers and binaries in several package versions,
+are stored only once. Package directories refer to the stored files through hard links.
+"""
+from NmPackage.debug import DebugLog
+from pathlib import Path
+import hashlib
+import os
+import stat
+
+
+class ContentStore(object):
+    """
+    A directory of files named after the sha256 of their contents: <store>/<2 hex digits>/<62 hex digits>
+
+    Files are added by replacing them with a hard link to the stored file of the same contents.
+    A stored file that is no longer linked from anywhere else is garbage, see `gc`.
+
+    Linked files may never be modified in place since that would modify all their links.
+    Git never does so: it replaces files when checking out an other commit.
+    """
+
+    # read buffer size for hashing
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, path: Path):
+        self._path = Path(path)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        """the sha256 hex digest of the contents of a file"""
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(ContentStore.CHUNK_SIZE), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def get_store_path(self, digest: str, executable: bool = False) -> Path:
+        """the path of the stored file with the given contents (and executable bit)"""
+        # hard links share their mode, hence executables are stored separately
+        return self._path / digest[:2] / (digest[2:] + (".x" if executable else ""))
+
+    def add_tree(self, tree: Path, ignored_folders=frozenset([".git"])) -> int:
+        """
+        add all regular files of a directory tree to the store, i.e. replace them with links to the store
+
+        Folders named in `ignored_folders` are skipped, e.g. the mutable git administration.
+        Symbolic links are neither followed nor stored.
+
+        Returns the number of bytes that were already stored, i.e. the disk space saved
+        """
+        saved = 0
+        stack = [str(tree)]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in ignored_folders:
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        saved += self.add_file(entry.path)
+        return saved
+
+    def add_file(self, path: str) -> int:
+        """
+        add a single file to the store, i.e. replace it with a link to the store
+
+        Returns the size of the file if its contents were already stored, 0 otherwise
+        """
+        st = os.lstat(path)
+        store_path = self.get_store_path(ContentStore.hash_file(path), bool(st.st_mode & stat.S_IXUSR))
+
+        try:
+            store_st = os.lstat(str(store_path))
+        except FileNotFoundError:
+            store_st = None
+
+        if store_st is not None and os.path.samestat(st, store_st):
+            # already linked
+            return 0
+
+        if store_st is None:
+            store_path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(path, str(store_path))
+                return 0
+            except FileExistsError:
+                # concurrently stored by an other install
+                pass
+            except OSError as e:
+                # e.g. the file system does not support hard links, keep the copy
+                DebugLog.print("not stored: {}: {}".format(path, e))
+                return 0
+
+        # replace the file with a link to the stored one
+        tmp_path = path + ".nmpkg-link"
+        try:
+            os.link(str(store_path), tmp_path)
+        except FileNotFoundError:
+            # concurrently garbage collected, store this copy instead
+            return self.add_file(path)
+        except OSError as e:
+            DebugLog.print("not linked: {}: {}".format(path, e))
+            return 0
+        os.replace(tmp_path, path)
+        return st.st_size
+
+    def gc(self) -> int:
+        """
+        remove the stored files that are no longer linked from outside the store
+
+        Returns the number of bytes freed
+        """
+        freed = 0
+        try:
+            buckets = list(os.scandir(str(self._path)))
+        except FileNotFoundError:
+            return 0
+
+        for bucket in buckets:
+            if not bucket.is_dir(follow_symlinks=False):
+                continue
+            with os.scandir(bucket.path) as entries:
+                for entry in entries:
+                    # note: `entry.stat()` does not report the number of links on Windows
+                    st = os.lstat(entry.path)
+                    if st.st_nlink > 1:
+                        continue
+                    DebugLog.print("collecting: " + entry.path)
+                    if not os.access(entry.path, os.W_OK):
+                        # read-only files can't be removed on Windows
+                        os.chmod(entry.path, stat.S_IWUSR | stat.S_IRUSR)
+                    os.unlink(entry.path)
+                    freed += st.st_size
+        return freed
@@ -38,3 +38,30 @@ def compare_files(file1: Path, file2: Path):
     difflines = list(diff)
     sys.stdout.writelines(difflines)
     assert not difflines, "diff should be empty"
+
+
+def create_package_archive(archives_dir: Path, slug: str, files: dict = None) -> Path:
+    """
+    publish a package archive and its checksum file on an artifact mirror, see `ArchiveTransport`
+
+    `files` maps relative file names to their text content, an existing archive is replaced.
+    Returns the path of the archive.
+    """
+    import hashlib
+    import io
+    import tarfile
+    if files is None:
+        files = {"NmPackage.props": "<Project />\n"}
+
+    archive = Path(archives_dir) / (slug + ".tar.gz")
+    archive.parent.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(str(archive), "w:gz") as tar:
+        for name, content in sorted(files.items()):
+            data = content.encode()
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    digest = hashlib.sha256(archive.read_bytes()).hexdigest()
+    (archive.parent / (archive.name + ".sha256")).write_text("{}  {}\n".format(digest, archive.name))
+    return archive
@@ -131,6 +131,285 @@ class Test_Integrate:
         compare_dirs(verifiedDir, Path(tmpdir))
 
 
+class Test_Integrate_many:
+
+    testFilesPre = Test_Integrate.testFilesPre
+
+    def setUp(self, tmpdir, count: int):
+        """
+        Copy the project of `testFilesPre` to `count` sub dirs of `tmpdir`/src
+        and create the solution `tmpdir`/all.sln with all of them
+        """
+        from distutils.dir_util import copy_tree
+        os.chdir(str(tmpdir))
+        sln = "Microsoft Visual Studio Solution File, Format Version 12.00\n"
+        # a solution folder
+        sln += 'Project("{2150E333-8FDC-42A3-9474-1A3956D46DE8}") = "src", "src", "{00000000-0000-0000-0000-000000000000}"\n'
+        sln += "EndProject\n"
+        for i in range(count):
+            copy_tree(str(self.testFilesPre / "Vs2017Project"), str(Path("src") / "project{}".format(i)))
+            sln += 'Project("{{8BC9CEB8-8B4A-11D0-8D11-00A0C91BC942}}") = "Vs2017Project", ' \
+                   '"src\\project{}\\Vs2017Project.vcxproj", "{{00000000-0000-0000-0000-00000000000{}}}"\n'.format(i, i)
+            sln += "EndProject\n"
+        Path("all.sln").write_text(sln, encoding="utf-8-sig")
+
+    def test_find_sln_projects(self, tmpdir):
+        # GIVEN a solution with 3 projects
+        self.setUp(tmpdir, 3)
+
+        # WHEN reading the projects of the solution
+        projects = find_sln_projects(Path("all.sln"))
+
+        # THEN all *.vcxproj files are found
+        assert [Path("src/project{}/Vs2017Project.vcxproj".format(i)) for i in range(3)] == projects
+
+    def test_find_vcxproj_files(self, tmpdir):
+        # GIVEN a tree with 3 projects
+        self.setUp(tmpdir, 3)
+
+        # WHEN searching the tree for projects
+        projects = find_vcxproj_files(Path("."))
+
+        # THEN all *.vcxproj files are found
+        assert [Path("src/project{}/Vs2017Project.vcxproj".format(i)) for i in range(3)] == projects
+
+    def test_integrate_all(self, tmpdir):
+        # GIVEN the projects of a solution
+        self.setUp(tmpdir, 3)
+        projects = find_sln_projects(Path("all.sln"))
+
+        # WHEN integrating them all
+        changes = integrate_all(projects, jobs=2)
+
+        # THEN every project and its props file changed
+        for p in projects:
+            assert [p, p.with_name("Vs2017Project.NmPackageDeps.props")] == changes[p]
+
+        # WHEN integrating them again
+        changes = integrate_all(projects, jobs=2)
+
+        # THEN nothing changed
+        assert all(not changed_files for changed_files in changes.values())
+
+    def test_integrate_all_reports_failures(self, tmpdir):
+        # GIVEN the projects of a solution, one of them corrupted
+        self.setUp(tmpdir, 3)
+        projects = find_sln_projects(Path("all.sln"))
+        projects[1].write_text("corrupted")
+
+        # WHEN integrating them all
+        with pytest.raises(Exception) as e:
+            integrate_all(projects, jobs=2)
+
+        # THEN a single exception reports the failing project
+        assert str(e.value).startswith("failed to integrate 1 of 3 projects:\n  * {}: ".format(projects[1]))
+
+        # THEN the other projects are integrated nevertheless
+        assert projects[0].with_name("Vs2017Project.NmPackageDeps.props").exists()
+        assert projects[2].with_name("Vs2017Project.NmPackageDeps.props").exists()
+
+    def test_cli_call_with_dirtree(self, tmpdir, capsys):
+        # GIVEN a tree with 2 projects
+        self.setUp(tmpdir, 2)
+
+        # WHEN calling the cli main function with the dirtree
+        import NmPackage.cli.integrate
+        sys.argv = ['arg0', '--dirtree', '.']
+        NmPackage.cli.integrate.main()
+
+        # THEN all projects are integrated
+        assert Path("src/project0/Vs2017Project.NmPackageDeps.props").is_file()
+        assert Path("src/project1/Vs2017Project.NmPackageDeps.props").is_file()
+        assert "2 projects integrated, 4 files changed" in capsys.readouterr().out
+
+        # WHEN integrating again
+        NmPackage.cli.integrate.main()
+
+        # THEN no file is written
+        assert "2 projects integrated, 0 files changed, 4 files unchanged" in capsys.readouterr().out
+
+    def test_cli_call_with_sln(self, tmpdir, capsys):
+        # GIVEN a solution with 2 projects
+        self.setUp(tmpdir, 2)
+
+        # WHEN calling the cli main function with the solution
+        import NmPackage.cli.integrate
+        sys.argv = ['arg0', 'all.sln']
+        NmPackage.cli.integrate.main()
+
+        # THEN all projects are integrated
+        assert "2 projects integrated, 4 files changed" in capsys.readouterr().out
+
+
+class Test_Integrate_stream:
+
+    testFilesPre = Test_Integrate.testFilesPre
+
+    def setUp(self, tmpdir) -> Path:
+        """Copy the project of `testFilesPre` to `tmpdir` and return the path of its *.vcxproj file"""
+        from distutils.dir_util import copy_tree
+        copy_tree(str(self.testFilesPre), str(tmpdir))
+        os.chdir(str(Path(tmpdir) / "Vs2017Project"))
+        return Path("Vs2017Project.vcxproj")
+
+    def test_only_inserts_elements(self, tmpdir):
+        # GIVEN a clean project
+        vcxproj = self.setUp(tmpdir)
+        before = vcxproj.read_bytes()
+
+        # WHEN integrating with the stream engine
+        VcxProjectFile(vcxproj).integrate_nmpkg("stream")
+
+        # THEN the elements are inserted before the project end tag and all other bytes are untouched
+        newline = b"\r\n" if b"\r\n" in before else b"\n"
+        insertion = newline.join([b'  <Import Project="Vs2017Project.NmPackageDeps.props" />',
+                                  b'  <ItemGroup>',
+                                  b'    <Text Include="Vs2017Project.NmPackageDeps.props" />',
+                                  b'  </ItemGroup>', b''])
+        end = before.rindex(b"</Project>")
+        assert before[:end] + insertion + before[end:] == vcxproj.read_bytes()
+
+    def test_is_idempotent(self, tmpdir):
+        # GIVEN a project integrated by the stream engine
+        vcxproj = self.setUp(tmpdir)
+        VcxProjectFile(vcxproj).integrate_nmpkg("stream")
+        integrated = vcxproj.read_bytes()
+
+        # WHEN integrating it again
+        VcxProjectFile(vcxproj).integrate_nmpkg("stream")
+
+        # THEN nothing changes
+        assert integrated == vcxproj.read_bytes()
+
+    def test_recognizes_dom_integration(self, tmpdir):
+        # GIVEN a project integrated by the dom engine
+        vcxproj = self.setUp(tmpdir)
+        VcxProjectFile(vcxproj).integrate_nmpkg("dom")
+        integrated = vcxproj.read_bytes()
+
+        # WHEN integrating it with the stream engine
+        VcxProjectFile(vcxproj).integrate_nmpkg("stream")
+
+        # THEN nothing changes
+        assert integrated == vcxproj.read_bytes()
+
+    def test_ignores_commented_out_elements(self, tmpdir):
+        # GIVEN a project with a commented out import and include
+        vcxproj = Path(str(tmpdir)) / "project.vcxproj"
+        vcxproj.write_bytes(b'<?xml version="1.0" encoding="utf-8"?>\n'
+                            b'<Project attr="a > b">\n'
+                            b'  <!-- <Import Project="project.NmPackageDeps.props" /> -->\n'
+                            b'  <ItemGroup><![CDATA[ <Text Include="project.NmPackageDeps.props" /> ]]></ItemGroup>\n'
+                            b'</Project>\n')
+
+        # WHEN integrating with the stream engine
+        VcxProjectFile(vcxproj).integrate_nmpkg("stream")
+
+        # THEN both elements are added as seen by an xml parser
+        root = ET.parse(str(vcxproj)).getroot()
+        assert ["project.NmPackageDeps.props"] == [e.get("Project") for e in root.findall("Import")]
+        assert ["project.NmPackageDeps.props"] == [e.get("Include") for e in root.findall("ItemGroup/Text")]
+
+    def test_small_chunks(self, tmpdir, monkeypatch):
+        # GIVEN a clean project and one integrated with the default chunk size
+        vcxproj = self.setUp(tmpdir)
+        reference = Path("reference") / vcxproj.name
+        reference.parent.mkdir()
+        shutil.copy(str(vcxproj), str(reference))
+        VcxProjectFile(reference).integrate_nmpkg("stream")
+
+        # WHEN integrating with tiny chunks such that every token straddles chunk boundaries
+        monkeypatch.setattr(VcxProjectFile, "CHUNK_SIZE", 3)
+        VcxProjectFile(vcxproj).integrate_nmpkg("stream")
+
+        # THEN the result is the same
+        assert reference.read_bytes() == vcxproj.read_bytes()
+
+    def test_unknown_engine(self, tmpdir):
+        vcxproj = self.setUp(tmpdir)
+
+        with pytest.raises(Exception) as e:
+            VcxProjectFile(vcxproj).integrate_nmpkg("sax")
+
+        assert "unknown integration engine: sax" in str(e.value)
+
+
+class Test_Integrate_with_dependencies:
+
+    testFilesWithDependencies = (Path(__file__).parent /
+                                 Path("TestFiles/AddPackage/verified1")).absolute()
+
+    def setUp(self, tmpdir) -> Path:
+        """Copy a project that depends on packageA/1 to `tmpdir`/project and return its *.vcxproj file"""
+        from distutils.dir_util import copy_tree
+        project_dir = Path(str(tmpdir)) / "project"
+        copy_tree(str(self.testFilesWithDependencies), str(project_dir))
+        return project_dir / "Vs2017Project.vcxproj"
+
+    @pytest.mark.parametrize("engine", VcxProjectFile.ENGINES)
+    def test_keeps_dependencies(self, tmpdir, engine):
+        # GIVEN a project with dependencies
+        vcxproj = self.setUp(tmpdir)
+
+        # WHEN integrating it
+        Integrate(vcxproj, engine)
+
+        # THEN its dependencies are kept
+        assert {NmPackageId("packageA", "1")} == VsProjectFiler().deserialize(vcxproj).dependencies
+
+    @pytest.mark.parametrize("engine", VcxProjectFile.ENGINES)
+    def test_rerun_writes_nothing(self, tmpdir, engine):
+        # GIVEN an integrated project with dependencies
+        vcxproj = self.setUp(tmpdir)
+        Integrate(vcxproj, engine)
+        files = [vcxproj, vcxproj.with_name("Vs2017Project.NmPackageDeps.props")]
+        for f in files:
+            os.utime(str(f), (0, 0))
+
+        # WHEN integrating it again
+        written = Integrate(vcxproj, engine)
+
+        # THEN no file is written
+        assert [] == written
+        assert [0, 0] == [f.stat().st_mtime for f in files]
+        assert {NmPackageId("packageA", "1")} == VsProjectFiler().deserialize(vcxproj).dependencies
+
+    def test_cli_call_with_dirtree_keeps_dependencies(self, tmpdir, monkeypatch):
+        # GIVEN a tree with a project with dependencies
+        vcxproj = self.setUp(tmpdir)
+
+        # WHEN integrating the tree through the cli
+        monkeypatch.setattr(sys, "argv", ["NmPkg-integrate", "--dirtree", str(tmpdir), "--engine", "stream"])
+        import NmPackage.cli.integrate
+        NmPackage.cli.integrate.main()
+
+        # THEN its dependencies are kept
+        assert {NmPackageId("packageA", "1")} == VsProjectFiler().deserialize(vcxproj).dependencies
+
+
+class Test_write_if_changed:
+
+    def test_write_if_changed(self, tmpdir):
+        path = Path(str(tmpdir)) / "file.props"
+
+        # a missing file is written
+        assert write_if_changed(path, b"<Project />\r\n")
+        assert b"<Project />\r\n" == path.read_bytes()
+
+        # identical content is not written
+        os.utime(str(path), (0, 0))
+        assert not write_if_changed(path, b"<Project />\r\n")
+        assert 0 == path.stat().st_mtime
+
+        # different content of the same size is written, without leaving temporary files behind
+        assert write_if_changed(path, b"<Project />\n\n")
+        assert b"<Project />\n\n" == path.read_bytes()
+        assert [path] == list(path.parent.iterdir())
+
+    def test_text_file_bytes(self):
+        assert ("<a/>" + os.linesep + "<b/>" + os.linesep).encode() == text_file_bytes("<a/>\n<b/>\n")
+
+
 class Test_Integrate_error_flows():
 
     def test_fail_on_nonexisting_file(self):
@@ -183,3 +183,195 @@ def test_serialize_deserialize_2():
 
     # THEN the same set is again obtained
     assert expected_NmPackageIds == nmPackageIds
+
+
+xml_non_canonical = r"""<?xml version="1.0" encoding="utf-8"?>
+<Project xmlns="http://schemas.microsoft.com/developer/msbuild/2003">
+  <!-- hand edited -->
+  <Import Project="$(NmPackageDir)\packageA\1\NmPackage.props" />
+
+  <!-- another comment -->
+  <Import
+     Project="$(NmPackageDir)\packageA\2\NmPackage.props"
+     Condition="Exists('$(NmPackageDir)\packageA\2\NmPackage.props')"></Import>
+</Project>
+"""
+
+
+@pytest.mark.parametrize("parser", NmPackageDepsFileFormat.PARSERS)
+@pytest.mark.parametrize("xml_in, expected", [
+    (xml_0_deps, set()),
+    (xml_1_deps, {package_A_2}),
+    (xml_2_deps, {package_A_1, package_A_2}),
+    (xml_2_deps.replace("\n", "\r\n"), {package_A_1, package_A_2}),
+    (xml_non_canonical, {package_A_1, package_A_2}),
+])
+def test_deserialization_parsers(parser, xml_in, expected):
+    # GIVEN a props file
+
+    # WHEN deserializing it using a specific parser backend
+    nmPackages = NmPackageDepsFileFormat.deserialize(xml_in, parser)
+
+    # THEN every parser returns the same set of packages
+    assert expected == nmPackages
+
+
+def test_canonical_parser_does_not_fall_back(monkeypatch):
+    # GIVEN a canonical props file
+    xml_in = NmPackageDepsFileFormat.serialize([package_A_1, package_A_2])
+
+    # GIVEN that the fallback parsers are unavailable
+    def fail(xml):
+        raise AssertionError("unexpected fallback")
+    monkeypatch.setattr(NmPackageDepsFileFormat, "_deserialize_iterparse", staticmethod(fail))
+    monkeypatch.setattr(NmPackageDepsFileFormat, "_deserialize_minidom", staticmethod(fail))
+
+    # WHEN deserializing it with the canonical parser
+    nmPackages = NmPackageDepsFileFormat.deserialize(xml_in, "canonical")
+
+    # THEN it is handled by the canonical recognizer itself
+    assert {package_A_1, package_A_2} == nmPackages
+
+
+def test_iterparse_parser_does_not_fall_back(monkeypatch):
+    # GIVEN a hand edited props file with an xml declaration
+
+    # GIVEN that the strict parser is unavailable
+    def fail(xml):
+        raise AssertionError("unexpected fallback")
+    monkeypatch.setattr(NmPackageDepsFileFormat, "_deserialize_minidom", staticmethod(fail))
+
+    # WHEN deserializing it with the streaming parser
+    nmPackages = NmPackageDepsFileFormat.deserialize(xml_non_canonical, "iterparse")
+
+    # THEN it is handled by the streaming parser itself
+    assert {package_A_1, package_A_2} == nmPackages
+
+    # THEN a processing instruction is still left to the strict parser
+    with pytest.raises(AssertionError):
+        NmPackageDepsFileFormat.deserialize(xml_non_canonical.replace("</Project>", "<?pi?></Project>"), "iterparse")
+
+
+@pytest.mark.parametrize("parser", NmPackageDepsFileFormat.PARSERS)
+@pytest.mark.parametrize("xml_in, error", [
+    # invalid package path
+    (xml_1_deps.replace(r"packageA\2\NmPackage.props')", r"packageA\2\Other.props')")
+               .replace(r'packageA\2\NmPackage.props"', r'packageA\2\Other.props"'),
+     r"Failed to parse Project/Import@Project: $(NmPackageDir)\packageA\2\Other.props"),
+    # unknown element
+    (xml_1_deps.replace("<Import ", "<Other "),
+     "Node with unknown tag (expected 'Import' tag, corrupted file?): Other"),
+    # text under the root node
+    (xml_0_deps.replace("</Project>", "text</Project>"),
+     "Unexpected text node under 'Project' root node.  (corrupted file?)"),
+    # CDATA section under the root node
+    (xml_0_deps.replace("</Project>", "<![CDATA[ ]]></Project>"),
+     "unknown node: <DOM CDATASection node \"' '\">"),
+    # malformed xml
+    (xml_2_deps.replace("</Project>", ""),
+     "no element found: line 22, column 0"),
+])
+def test_deserialization_parsers_error_semantics(parser, xml_in, error):
+    # GIVEN an invalid props file
+
+    # WHEN deserializing it using a specific parser backend
+    with pytest.raises(Exception) as e:
+        NmPackageDepsFileFormat.deserialize(xml_in, parser)
+
+    # THEN every parser raises the error of the strict parser
+    assert error == str(e.value)
+
+
+def test_unknown_parser():
+    with pytest.raises(Exception) as e:
+        NmPackageDepsFileFormat.deserialize(xml_0_deps, "unknown")
+
+    assert "unknown parser" in str(e.value)
+
+
+def reference_path_to_package(path: str):
+    """the NmPackageId of the reference implementation or the message of the exception it raises"""
+    try:
+        return NmPackageDepsFileFormat._path_to_package_pathlib(path)
+    except Exception as e:
+        return str(e)
+
+
+def path_to_package(path: str):
+    try:
+        return NmPackageDepsFileFormat._path_to_package(path)
+    except Exception as e:
+        return str(e)
+
+
+@pytest.mark.parametrize("nmPackageId", [
+    package_A_1,
+    NmPackageId("package with spaces", "1.0.0-rc.1"),
+    NmPackageId("..", "."),
+    NmPackageId("a/b", "c\\d"),
+    NmPackageId("C:", "1"),
+    NmPackageId("", "1"),
+    NmPackageId("\\abs", "1"),
+])
+def test_import_path_codec(nmPackageId):
+    # GIVEN a package id
+
+    # WHEN converting it to an import path and back
+    path = NmPackageDepsFileFormat._package_to_path(nmPackageId)
+
+    # THEN the codec agrees with the reference implementation
+    assert NmPackageDepsFileFormat._package_to_path_pathlib(nmPackageId) == path
+    assert reference_path_to_package(path) == path_to_package(path)
+
+
+def test_import_path_codec_fuzz():
+    # GIVEN random package ids and import paths of path names, separators and drive-like fragments
+    import random
+    rnd = random.Random(0)
+    fragments = ["a", "Pkg", "1.0", ".", "..", "", " ", ":", "C:", "\\", "/", "\\\\", "$(NmPackageDir)",
+                 "NmPackage.props", "nmpackage.props", "é"]
+
+    def fragment_string():
+        return "".join(rnd.choice(fragments) for _ in range(rnd.randint(0, 3)))
+
+    for _ in range(5000):
+        nmPackageId = NmPackageId(fragment_string(), fragment_string())
+        parts = [fragment_string() for _ in range(rnd.randint(0, 5))]
+        if rnd.random() < 0.5:
+            parts[:0] = ["$(NmPackageDir)"]
+            parts.append("NmPackage.props")
+        path = rnd.choice(["\\", "/"]).join(parts)
+
+        # WHEN converting them with the codec
+        # THEN it agrees with the reference implementation
+        assert NmPackageDepsFileFormat._package_to_path_pathlib(nmPackageId) == \
+            NmPackageDepsFileFormat._package_to_path(nmPackageId), nmPackageId
+        assert reference_path_to_package(path) == path_to_package(path), path
+
+
+def test_serialize_to_stream():
+    # GIVEN a text stream
+    import io
+    stream = io.StringIO()
+
+    # WHEN serializing packages to it
+    NmPackageDepsFileFormat.serialize_to(stream, [package_A_2, package_A_1])
+
+    # THEN the props file is written
+    assert xml_2_deps == stream.getvalue()
+
+
+@pytest.mark.parametrize("parser", NmPackageDepsFileFormat.PARSERS)
+def test_serialize_escapes_attributes(parser):
+    # GIVEN a package with xml special characters
+    nmPackageId = NmPackageId("a&b<c>", 'd"e\'f')
+
+    # WHEN serializing it
+    xml_out = NmPackageDepsFileFormat.serialize([nmPackageId])
+
+    # THEN the attribute values are escaped like minidom does
+    path = r"$(NmPackageDir)\a&amp;b&lt;c&gt;\d&quot;e'f\NmPackage.props"
+    assert """  <Import Condition="Exists('{0}')" Project="{0}"/>\n""".format(path) in xml_out
+
+    # THEN every parser reads it back
+    assert {nmPackageId} == NmPackageDepsFileFormat.deserialize(xml_out, parser)
@@ -1,4 +1,9 @@
 from NmPackage import NmPackageId
+import copy
+import gc
+import pickle
+import pytest
+import weakref
 
 
 def test_getters():
@@ -22,3 +27,85 @@ def test_equality():
 
 def test_hash():
     assert hash(NmPackageId), "verify that NmPackageId has a hash implementation"
+    assert hash(NmPackageId("A", "1")) == hash(NmPackageId("A", "1"))
+    assert {NmPackageId("A", "1")} == {NmPackageId("A", "1"), NmPackageId.from_qualifiedId("A/1")}
+
+
+def test_inequality_with_other_types():
+    assert NmPackageId("A", "1") != "A/1"
+    assert NmPackageId("A", "1") != ("A", "1")
+
+
+def test_immutable():
+    # GIVEN a NmPackageId
+    p = NmPackageId("A", "1")
+
+    # WHEN modifying it THEN it should fail
+    for name in ("packageId", "_packageId", "_hash", "other"):
+        with pytest.raises(AttributeError):
+            setattr(p, name, "B")
+    with pytest.raises(AttributeError):
+        del p._versionId
+
+    assert NmPackageId("A", "1") == p
+
+
+def test_ordering():
+    # GIVEN unsorted NmPackageIds
+    packages = [NmPackageId("b", "1"), NmPackageId("a-b", "1"), NmPackageId("a", "2"), NmPackageId("a", "10")]
+
+    # WHEN sorting them
+    # THEN they are ordered by qualified id
+    assert [p.qualifiedId for p in sorted(packages)] == sorted(p.qualifiedId for p in packages)
+    assert NmPackageId("a", "1") < NmPackageId("a", "2") <= NmPackageId("a", "2")
+    assert NmPackageId("b", "1") > NmPackageId("a", "2") >= NmPackageId("a", "2")
+    with pytest.raises(TypeError):
+        NmPackageId("a", "1") < "a/1"
+
+
+def test_intern():
+    # GIVEN an interned NmPackageId
+    p = NmPackageId.intern("A", "1")
+
+    # THEN equal ids are the same object as long as it is referenced
+    assert p is NmPackageId.intern("A", "1")
+    assert p is NmPackageId.from_qualifiedId("A/1")
+    assert p is not NmPackageId.intern("A", "2")
+    assert p is not NmPackageId("A", "1")
+
+    # THEN it is not kept alive by the interning
+    ref = weakref.ref(p)
+    del p
+    gc.collect()
+    assert ref() is None
+
+
+def test_pickle():
+    # GIVEN a NmPackageId
+    p = NmPackageId.intern("A", "1")
+
+    # WHEN pickling and unpickling it
+    # THEN the interned equal id is returned
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+        assert p is pickle.loads(pickle.dumps(p, protocol))
+    assert p == copy.deepcopy(NmPackageId("A", "1"))
+
+
+def test_derived_values_are_cached_per_id():
+    from NmPackage import NmPackageManager
+    # GIVEN an interned NmPackageId
+    p = NmPackageId.intern("derived", "1")
+
+    # WHEN deriving its slug and package dir twice
+    # THEN they are computed once
+    assert NmPackageManager.get_git_project_slug(p) is NmPackageManager.get_git_project_slug(p)
+    assert NmPackageManager.get_package_dir(p) is NmPackageManager.get_package_dir(p)
+
+    # THEN an equal id shares them
+    assert NmPackageManager.get_package_dir(p) is NmPackageManager.get_package_dir(NmPackageId("derived", "1"))
+
+    # THEN the id is still not kept alive
+    ref = weakref.ref(p)
+    del p
+    gc.collect()
+    assert ref() is None
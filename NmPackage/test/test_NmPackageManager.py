@@ -1,7 +1,11 @@
 from NmPackage import NmPackageManager
 from NmPackage import NmPackageId
+from NmPackage import delete_tree
+from NmPackage import parse_size
+from NmPackage import tree_size
 from pathlib import Path
 import os
+import sys
 
 
 
@@ -42,10 +46,24 @@ def test_get_git_repo_url():
     p = NmPackageId("p", "1.0.0")
 
     # THEN check the git repo url for that package
-    url = NmPackageManager.get_git_repo_url(p)
+    url = NmPackageManager(Path(".")).get_git_repo_url(p)
     assert "git@PC-CI-2.mtrs.intl:nmpackages/p_1.0.0.git" == url
 
 
+def test_git_url_template():
+    import pytest
+    # GIVEN a package manager with a custom git url template
+    mgr = NmPackageManager(Path("."), git_url_template="file:///srv/{packageId}/{versionId}/{slug}.git")
+
+    # THEN the template is filled in for a package
+    assert "file:///srv/p/1.0.0/p_1.0.0.git" == mgr.get_git_repo_url(NmPackageId("p", "1.0.0"))
+
+    # THEN an unknown placeholder is refused
+    with pytest.raises(Exception) as e:
+        mgr.git_url_template = "file:///srv/{name}.git"
+    assert "invalid git url template" in str(e.value)
+
+
 def test_get_package_dir():
     # GIVEN a package
     p = NmPackageId("myPackage", "1.0.0")
@@ -56,6 +74,17 @@ def test_get_package_dir():
     assert Path("myPackage") / (Path("1.0.0")) == path
 
 
+def test_parse_size():
+    assert 1024 == parse_size("1024")
+    assert 1024 == parse_size("1K")
+    assert 500 * 1024 ** 2 == parse_size("500 MiB")
+    assert int(1.5 * 1024 ** 3) == parse_size("1.5GB")
+
+    import pytest
+    with pytest.raises(Exception):
+        parse_size("a lot")
+
+
 class Test_NmPackageManager:
 
     package_cache_dir_fixture = \
@@ -134,8 +163,8 @@ class Test_NmPackageManager:
         assert not mgr.is_installed(self.package1_100)
         assert not mgr.is_installed(self.package1_101)
 
-        # THEN the package cache dir is empty
-        assert 0 == len(list(mgr.package_cache_dir.iterdir()))
+        # THEN the package cache dir is empty, apart from NmPkg's administration
+        assert 0 == len([p for p in mgr.package_cache_dir.iterdir() if p.name != NmPackageManager.ADMIN_DIR])
 
     def test_uninstall_non_existing_package(self, tmpdir):
         # GIVEN a package cache with some pre-installed packages
@@ -154,6 +183,93 @@ class Test_NmPackageManager:
         # and all the originall installed packages are unaffected
         assert 3 == len(list(mgr.get_installed_packages()))
 
+    def test_cli_uninstall_non_existing_package(self, tmpdir, monkeypatch):
+        # GIVEN a system-wide package cache with some pre-installed packages
+        self.setUp(tmpdir)
+        monkeypatch.setenv("NmPackageDir", str(tmpdir))
+
+        # GIVEN that no trash reclaimer may be spawned
+        def fail(self):
+            raise AssertionError("unexpected trash reclaimer")
+        monkeypatch.setattr(NmPackageManager, "spawn_trash_reclaimer", fail)
+
+        # WHEN uninstalling a non-installed package through the cli
+        import NmPackage.cli.uninstall
+        monkeypatch.setattr(sys, "argv", ["NmPkg-uninstall", "non-installed_package/1.0.0"])
+        NmPackage.cli.uninstall.main()
+
+        # THEN nothing was trashed, hence no reclaimer is spawned
+        assert not NmPackageManager(Path(str(tmpdir))).has_trash()
+
+    def test_uninstall_moves_to_trash(self, tmpdir):
+        # GIVEN a package cache with some pre-installed packages
+        self.setUp(tmpdir)
+        mgr = NmPackageManager(Path(str(tmpdir)))
+        assert not mgr.has_trash()
+
+        # WHEN uninstalling a package
+        mgr.uninstall(self.package2_100)
+
+        # THEN the package is moved to the trash
+        assert not mgr.is_installed(self.package2_100)
+        assert not (mgr.package_cache_dir / self.package2_100.packageId).exists()
+        assert mgr.has_trash()
+        assert [self.package2_100.versionId] == [p.name.rsplit(".", 1)[0] for p in mgr.trash_dir.iterdir()]
+
+        # WHEN an other process is reclaiming the trash
+        from NmPackage.lock import FileLock
+        with FileLock(mgr.admin_dir / "locks" / ".trash.lock"):
+            # THEN a non-blocking reclaim gives up
+            assert not mgr.reclaim_trash(blocking=False)
+        assert mgr.has_trash()
+
+        # WHEN reclaiming the trash
+        assert mgr.reclaim_trash()
+
+        # THEN it is empty
+        assert not mgr.has_trash()
+        assert 2 == len(mgr.get_installed_packages())
+
+    def test_reindex(self, tmpdir):
+        # GIVEN a package cache without manifest, e.g. of an older NmPkg version
+        self.setUp(tmpdir)
+        mgr = NmPackageManager(Path(str(tmpdir)))
+        assert mgr.get_manifest() is None
+
+        # WHEN reindexing the package cache
+        manifest = mgr.reindex()
+
+        # THEN the manifest lists all installed packages
+        assert manifest == mgr.get_manifest()
+        assert {self.package1_100.qualifiedId, self.package1_101.qualifiedId, self.package2_100.qualifiedId} \
+            == set(manifest.keys())
+        assert 3 == len(mgr.get_installed_packages())
+        assert mgr.is_installed(self.package1_100)
+        assert 0 == manifest[self.package1_100.qualifiedId]["size"]
+        assert manifest[self.package1_100.qualifiedId]["commit"] is None
+
+        # WHEN a package is removed by hand
+        delete_tree(mgr.package_cache_dir / mgr.get_package_dir(self.package2_100))
+
+        # THEN the manifest is outdated until reindexed
+        assert mgr.is_installed(self.package2_100)
+        mgr.reindex()
+        assert not mgr.is_installed(self.package2_100)
+        assert 2 == len(mgr.get_installed_packages())
+
+    def test_seed_package(self, tmpdir):
+        # GIVEN an empty package cache
+        mgr = NmPackageManager(Path(str(tmpdir)))
+
+        # WHEN seeding a package from its files
+        mgr.seed_package(self.package1_100, {"NmPackage.props": b"<Project />", "include/a.h": b"#pragma once"}, "0" * 64)
+
+        # THEN it is installed from an archive once reindexed
+        assert b"#pragma once" == (mgr.package_cache_dir / "package1" / "v1.0.0" / "include" / "a.h").read_bytes()
+        mgr.reindex()
+        assert mgr.is_installed(self.package1_100)
+        assert "0" * 64 == mgr.get_local_head(self.package1_100)
+
 
 def test_create_NmPackageManger_from_env():
     # GIVEN a properly configured env.
@@ -181,3 +297,479 @@ def test_upgrade_package(tmpdir):
 
 
 
+class Test_NmPackageManager_install_all:
+
+    def setUp(self, tmpdir, packages):
+        """serve all `packages` from local bare repositories instead of the package server"""
+        from NmPackage.localremote import create_package_remote
+        remotes_dir = Path(str(tmpdir)) / "remotes"
+        self.remotes_dir = remotes_dir
+        for p in packages:
+            create_package_remote(remotes_dir, NmPackageManager.get_git_project_slug(p))
+
+        cache_dir = Path(str(tmpdir)) / "cache"
+        cache_dir.mkdir()
+        return NmPackageManager(cache_dir, git_url_template=remotes_dir.as_uri() + "/{slug}.git")
+
+    def test_install_all_concurrently(self, tmpdir):
+        # GIVEN a some packages served by a remote
+        packages = [NmPackageId("package{}".format(i), "1.0.0") for i in range(4)]
+        mgr = self.setUp(tmpdir, packages)
+        cwd = Path.cwd()
+
+        # WHEN installing them all concurrently
+        reported = []
+        results = mgr.install_all(packages, jobs=4, on_result=reported.append)
+
+        # THEN every package is installed and reported exactly once
+        assert 4 == len(results)
+        assert set(packages) == set(r.nm_package_id for r in reported)
+        assert all(r.succeeded and r.action == "install" for r in results)
+        assert set(packages) == mgr.get_installed_packages()
+        for p in packages:
+            assert (mgr.package_cache_dir / mgr.get_package_dir(p) / "NmPackage.props").is_file()
+
+        # THEN the current working directory is left untouched
+        assert cwd == Path.cwd()
+
+        # WHEN installing them again
+        results = mgr.install_all(packages, jobs=2)
+
+        # THEN they are found to be up-to-date
+        assert all(r.succeeded and r.action == "up-to-date" for r in results)
+
+    def test_install_all_reports_failures(self, tmpdir):
+        # GIVEN a package served by a remote and a package without a remote
+        existing = NmPackageId("existing", "1.0.0")
+        missing = NmPackageId("missing", "1.0.0")
+        mgr = self.setUp(tmpdir, [existing])
+
+        # WHEN installing both
+        results = mgr.install_all([missing, existing], jobs=2)
+
+        # THEN the failing install does not prevent the other from being installed
+        results = {r.nm_package_id: r for r in results}
+        assert results[existing].succeeded
+        assert not results[missing].succeeded
+        assert results[missing].error is not None
+        assert "FAILED" in str(results[missing])
+        assert mgr.is_installed(existing)
+
+    def test_shallow_clone_strategy(self, tmpdir):
+        # GIVEN a package with some history
+        from NmPackage.localremote import update_package_remote
+        import subprocess
+        p = NmPackageId("package", "1.0.0")
+        mgr = self.setUp(tmpdir, [p])
+        slug = NmPackageManager.get_git_project_slug(p)
+        update_package_remote(self.remotes_dir, slug, {"NmPackage.props": "<Project>2</Project>"})
+
+        # WHEN installing it shallowly
+        mgr.clone_strategy = "shallow"
+        mgr.remote_head_max_age = 0
+        result = mgr.install(p)
+
+        # THEN only the latest commit is cloned
+        package_dir = mgr.package_cache_dir / mgr.get_package_dir(p)
+
+        def commit_count():
+            return int(subprocess.check_output(["git", "rev-list", "--count", "HEAD"], cwd=str(package_dir)))
+        assert 1 == commit_count()
+        assert result.bytes_received > 0
+
+        # WHEN upgrading it after the remote changed
+        update_package_remote(self.remotes_dir, slug, {"NmPackage.props": "<Project>3</Project>"})
+        result = mgr.install(p)
+
+        # THEN the clone stays shallow but is up to date
+        assert "upgrade" == result.action
+        assert 1 == commit_count()
+        assert "<Project>3</Project>" == (package_dir / "NmPackage.props").read_text()
+
+    def test_clone_strategy_overrides(self, tmpdir):
+        # GIVEN a full clone strategy with a blobless override for a single package
+        import subprocess
+        full = NmPackageId("full", "1.0.0")
+        blobless = NmPackageId("blobless", "1.0.0")
+        mgr = self.setUp(tmpdir, [full, blobless])
+        mgr.clone_strategy_overrides["blobless"] = "blobless"
+        assert "full" == mgr.get_clone_strategy(full)
+        assert "blobless" == mgr.get_clone_strategy(blobless)
+
+        # WHEN installing both packages
+        mgr.install_all([full, blobless])
+
+        # THEN only the override is a partial clone
+        def partial_clone_filter(p):
+            return subprocess.run(["git", "config", "remote.origin.partialclonefilter"],
+                                  cwd=str(mgr.package_cache_dir / mgr.get_package_dir(p)),
+                                  stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+        assert "" == partial_clone_filter(full)
+        assert "blob:none" == partial_clone_filter(blobless)
+
+    def test_unknown_clone_strategy(self, tmpdir):
+        import pytest
+        with pytest.raises(Exception) as e:
+            NmPackageManager(Path(str(tmpdir)), clone_strategy="unknown")
+
+        assert "unknown clone strategy" in str(e.value)
+
+    def test_share_objects(self, tmpdir):
+        # GIVEN two versions of a package with a large common history
+        from NmPackage.localremote import create_package_remote
+        import subprocess
+        v1 = NmPackageId("package", "1.0.0")
+        v2 = NmPackageId("package", "2.0.0")
+        mgr = self.setUp(tmpdir, [])
+        large_file = {"binary.dat": os.urandom(256 * 1024).hex()}
+        create_package_remote(self.remotes_dir, mgr.get_git_project_slug(v1), large_file)
+        create_package_remote(self.remotes_dir, mgr.get_git_project_slug(v2), {"NmPackage.props": "<Project />"},
+                              fork_of=mgr.get_git_project_slug(v1))
+
+        # WHEN installing both versions while sharing objects
+        mgr.share_objects = True
+        result_v1 = mgr.install(v1)
+        result_v2 = mgr.install(v2)
+
+        # THEN the second version only receives its new objects
+        assert result_v2.bytes_received * 10 < result_v1.bytes_received
+
+        # THEN the mirror is not considered to be a package
+        assert {v1, v2} == mgr.get_installed_packages()
+        assert mgr.get_mirror_dir(v1).is_dir()
+
+        # WHEN uninstalling the first version
+        mgr.uninstall(v1)
+
+        # THEN the second version is still intact
+        v2_dir = mgr.package_cache_dir / mgr.get_package_dir(v2)
+        subprocess.check_call(["git", "fsck", "--no-progress"], cwd=str(v2_dir))
+        assert large_file["binary.dat"] == (v2_dir / "binary.dat").read_text()
+
+        # WHEN uninstalling the last version
+        mgr.uninstall(v2)
+
+        # THEN the mirror is removed as well
+        assert not mgr.get_mirror_dir(v2).exists()
+        assert not mgr.get_installed_packages()
+
+    def test_is_outdated(self, tmpdir):
+        # GIVEN an installed package
+        from NmPackage.localremote import update_package_remote
+        p = NmPackageId("package", "1.0.0")
+        mgr = self.setUp(tmpdir, [p])
+        assert mgr.is_outdated(p), "a package that is not installed is outdated"
+        mgr.install(p)
+        assert not mgr.is_outdated(p)
+
+        # WHEN the remote changes
+        update_package_remote(self.remotes_dir, mgr.get_git_project_slug(p), {"NmPackage.props": "<Project>2</Project>"})
+
+        # THEN the package is not found outdated as long as the cached remote head is not too old
+        assert not mgr.is_outdated(p)
+        assert "up-to-date" == mgr.install(p).action
+
+        # THEN the package is found outdated once the remote is queried again
+        mgr.remote_head_max_age = 0
+        assert mgr.is_outdated(p)
+
+        # WHEN installing it
+        result = mgr.install(p)
+
+        # THEN it is upgraded, after which it is no longer outdated
+        assert "upgrade" == result.action
+        assert not mgr.is_outdated(p)
+
+    def test_remote_heads_cache_is_shared(self, tmpdir):
+        # GIVEN an installed package
+        p = NmPackageId("package", "1.0.0")
+        mgr = self.setUp(tmpdir, [p])
+        mgr.install(p)
+
+        # GIVEN that its remote disappears
+        import shutil
+        shutil.rmtree(str(self.remotes_dir))
+
+        # THEN an other manager for the same cache still knows the package is up-to-date
+        other_mgr = NmPackageManager(mgr.package_cache_dir, git_url_template=mgr.git_url_template)
+        assert not other_mgr.is_outdated(p)
+        assert "up-to-date" == other_mgr.install(p).action
+
+    def test_install_is_atomic(self, tmpdir):
+        # GIVEN a package without remote
+        p = NmPackageId("missing", "1.0.0")
+        mgr = self.setUp(tmpdir, [])
+
+        # WHEN installing it fails
+        import pytest
+        with pytest.raises(Exception):
+            mgr.install(p)
+
+        # THEN no trace of the package is left behind
+        assert not mgr.is_installed(p)
+        assert not (mgr.package_cache_dir / p.packageId).exists()
+        assert not list((mgr.admin_dir / "staging").iterdir())
+
+    def test_install_writes_marker(self, tmpdir):
+        # GIVEN a package
+        import json
+        import subprocess
+        p = NmPackageId("package", "1.0.0")
+        mgr = self.setUp(tmpdir, [p])
+
+        # WHEN installing it
+        mgr.install(p)
+
+        # THEN it is marked as completely installed
+        package_dir = mgr.package_cache_dir / mgr.get_package_dir(p)
+        marker = json.loads((package_dir / NmPackageManager.INSTALLED_MARKER).read_text())
+        assert p.qualifiedId == marker["qualifiedId"]
+        assert mgr.get_local_head(p) == marker["commit"]
+
+        # THEN the marker does not make the package dirty
+        assert "" == subprocess.check_output(["git", "status", "--porcelain"], cwd=str(package_dir),
+                                             universal_newlines=True)
+
+    def test_concurrent_installs_of_the_same_package(self, tmpdir):
+        # GIVEN a package
+        import threading
+        p = NmPackageId("package", "1.0.0")
+        mgr = self.setUp(tmpdir, [p])
+
+        # WHEN several independent managers install it concurrently
+        results = []
+
+        def install():
+            results.append(NmPackageManager(mgr.package_cache_dir, git_url_template=mgr.git_url_template).install(p))
+
+        threads = [threading.Thread(target=install) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # THEN the package is fetched only once, the others wait for it
+        assert ["install", "up-to-date", "up-to-date", "up-to-date"] == sorted(r.action for r in results)
+        assert {p} == mgr.get_installed_packages()
+
+    def test_install_updates_manifest(self, tmpdir):
+        # GIVEN some packages
+        p1 = NmPackageId("package1", "1.0.0")
+        p2 = NmPackageId("package2", "1.0.0")
+        mgr = self.setUp(tmpdir, [p1, p2])
+
+        # WHEN installing them
+        mgr.install_all([p1, p2], jobs=2)
+
+        # THEN they are recorded in the manifest
+        manifest = mgr.get_manifest()
+        assert {p1.qualifiedId, p2.qualifiedId} == set(manifest.keys())
+        assert mgr.get_local_head(p1) == manifest[p1.qualifiedId]["commit"]
+        assert tree_size(mgr.package_cache_dir / mgr.get_package_dir(p1)) == manifest[p1.qualifiedId]["size"]
+
+        # WHEN a new commit is pushed and the package is upgraded
+        from NmPackage.localremote import update_package_remote
+        update_package_remote(self.remotes_dir, NmPackageManager.get_git_project_slug(p1), {"new.txt": "new"})
+        mgr.remote_head_max_age = 0
+        assert "upgrade" == mgr.install(p1).action
+
+        # THEN the manifest records the new commit
+        assert mgr.get_local_head(p1) == mgr.get_manifest()[p1.qualifiedId]["commit"]
+
+        # WHEN uninstalling a package
+        mgr.uninstall(p2)
+
+        # THEN it is removed from the manifest
+        assert {p1.qualifiedId} == set(mgr.get_manifest().keys())
+        assert {p1} == mgr.get_installed_packages()
+        assert not mgr.is_installed(p2)
+
+    def test_content_addressed(self, tmpdir):
+        # GIVEN two packages that ship an identical file
+        from NmPackage.localremote import create_package_remote
+        p1 = NmPackageId("package1", "1.0.0")
+        p2 = NmPackageId("package2", "1.0.0")
+        mgr = self.setUp(tmpdir, [])
+        for p in (p1, p2):
+            create_package_remote(self.remotes_dir, NmPackageManager.get_git_project_slug(p),
+                                  {"include/shared.h": "#pragma once\n", p.packageId + ".h": p.packageId})
+
+        # WHEN installing them with a content store
+        mgr.content_addressed = True
+        mgr.install_all([p1, p2])
+
+        # THEN the identical file is stored once
+        dir1 = mgr.package_cache_dir / mgr.get_package_dir(p1)
+        dir2 = mgr.package_cache_dir / mgr.get_package_dir(p2)
+        assert os.path.samefile(str(dir1 / "include" / "shared.h"), str(dir2 / "include" / "shared.h"))
+
+        # THEN the packages are clean
+        import subprocess
+        assert "" == subprocess.check_output(["git", "status", "--porcelain"], cwd=str(dir1), universal_newlines=True)
+
+        # WHEN uninstalling them
+        mgr.uninstall(p1)
+        mgr.reclaim_trash()
+        assert os.path.samefile(str(mgr.content_store.get_store_path(
+            mgr.content_store.hash_file(str(dir2 / "include" / "shared.h")))), str(dir2 / "include" / "shared.h"))
+        mgr.uninstall(p2)
+        mgr.reclaim_trash()
+
+        # THEN the content store is empty
+        assert [] == list(mgr.content_store.path.glob("*/*"))
+
+    def setUpArchives(self, tmpdir, mgr, packages):
+        """serve all `packages` as archives from a local artifact mirror"""
+        from NmPackage.test import create_package_archive
+        self.archives_dir = Path(str(tmpdir)) / "archives"
+        for p in packages:
+            create_package_archive(self.archives_dir, NmPackageManager.get_git_project_slug(p),
+                                   {"NmPackage.props": "<Project />\n", "include/" + p.packageId + ".h": "1"})
+        mgr.archive_mirror_url = self.archives_dir.as_uri()
+
+    def test_archive_transport(self, tmpdir):
+        # GIVEN a package on an artifact mirror
+        p = NmPackageId("package", "1.0.0")
+        mgr = self.setUp(tmpdir, [])
+        self.setUpArchives(tmpdir, mgr, [p])
+
+        # WHEN installing it from the mirror
+        mgr.transport = "archive"
+        result = mgr.install(p)
+
+        # THEN the archive is extracted into the package cache
+        assert "install" == result.action
+        assert result.bytes_received == (self.archives_dir / "package_1.0.0.tar.gz").stat().st_size
+        package_dir = mgr.package_cache_dir / mgr.get_package_dir(p)
+        assert "1" == (package_dir / "include" / "package.h").read_text()
+        assert mgr.is_installed(p)
+        assert not mgr.is_outdated(p)
+        assert "up-to-date" == mgr.install(p).action
+
+        # WHEN a new archive is published
+        from NmPackage.test import create_package_archive
+        create_package_archive(self.archives_dir, "package_1.0.0", {"include/package.h": "2"})
+        mgr.remote_head_max_age = 0
+
+        # THEN the package is outdated and replaced by an upgrade
+        assert mgr.is_outdated(p)
+        assert "upgrade" == mgr.install(p).action
+        assert "2" == (package_dir / "include" / "package.h").read_text()
+        assert not (package_dir / "NmPackage.props").exists()
+        assert not mgr.is_outdated(p)
+        assert [] == list((mgr.admin_dir / "staging").iterdir())
+
+    def test_archive_checksum_mismatch(self, tmpdir):
+        # GIVEN a package archive whose checksum does not match
+        p = NmPackageId("package", "1.0.0")
+        mgr = self.setUp(tmpdir, [])
+        self.setUpArchives(tmpdir, mgr, [p])
+        (self.archives_dir / "package_1.0.0.tar.gz.sha256").write_text("0" * 64 + "  package_1.0.0.tar.gz\n")
+
+        # WHEN installing it
+        mgr.transport = "archive"
+        result = mgr.install_all([p])[0]
+
+        # THEN the install fails and leaves no trace
+        assert not result.succeeded
+        assert "checksum mismatch" in str(result.error)
+        assert not mgr.is_installed(p)
+        assert [] == list((mgr.admin_dir / "staging").iterdir())
+
+    def test_archive_with_illegal_paths(self, tmpdir):
+        # GIVEN a package archive with a file outside the package directory
+        p = NmPackageId("package", "1.0.0")
+        mgr = self.setUp(tmpdir, [])
+        self.setUpArchives(tmpdir, mgr, [])
+        from NmPackage.test import create_package_archive
+        create_package_archive(self.archives_dir, "package_1.0.0", {"../evil.txt": "evil"})
+
+        # WHEN installing it
+        mgr.transport = "archive"
+        result = mgr.install_all([p])[0]
+
+        # THEN the install is refused
+        assert not result.succeeded
+        assert "illegal path" in str(result.error)
+        assert not (mgr.admin_dir / "evil.txt").exists()
+        assert not mgr.is_installed(p)
+
+    def test_transport_overrides(self, tmpdir):
+        # GIVEN a package served by git and an other one served as archive
+        git_package = NmPackageId("gitPackage", "1.0.0")
+        archive_package = NmPackageId("archivePackage", "1.0.0")
+        mgr = self.setUp(tmpdir, [git_package])
+        self.setUpArchives(tmpdir, mgr, [archive_package])
+
+        # WHEN installing both with a per package transport
+        mgr.transport_overrides[archive_package.packageId] = "archive"
+        results = mgr.install_all([git_package, archive_package])
+
+        # THEN each package is fetched with its own transport
+        assert all(r.succeeded for r in results)
+        assert (mgr.package_cache_dir / mgr.get_package_dir(git_package) / ".git").is_dir()
+        assert not (mgr.package_cache_dir / mgr.get_package_dir(archive_package) / ".git").exists()
+        assert {git_package.qualifiedId, archive_package.qualifiedId} == set(mgr.get_manifest().keys())
+
+        # WHEN the transport of a package changes
+        mgr.transport_overrides[archive_package.packageId] = "git"
+
+        # THEN the package is outdated, i.e. it has to be fetched again
+        assert mgr.is_outdated(archive_package)
+
+    def test_unknown_transport(self, tmpdir):
+        # GIVEN a package manager
+        mgr = NmPackageManager(Path(str(tmpdir)))
+
+        # THEN unknown transports are refused
+        import pytest
+        with pytest.raises(Exception):
+            mgr.transport = "ftp"
+        mgr.transport_overrides["package"] = "ftp"
+        with pytest.raises(Exception):
+            mgr.get_transport(NmPackageId("package", "1.0.0"))
+
+    def test_evict_least_recently_used(self, tmpdir):
+        # GIVEN some packages installed one after the other
+        packages = [NmPackageId("package{}".format(i), "1.0.0") for i in range(3)]
+        mgr = self.setUp(tmpdir, packages)
+        for p in packages:
+            mgr.install(p)
+
+        # GIVEN the first installed package is used again
+        mgr.touch_packages([packages[0]])
+        assert mgr.get_manifest()[packages[0].qualifiedId]["last_used"] > \
+            mgr.get_manifest()[packages[2].qualifiedId]["last_used"]
+
+        # WHEN evicting packages to fit a budget just below the current cache size
+        size = sum(mgr.get_package_size(p) for p in packages)
+        evicted = mgr.evict(size - 1)
+
+        # THEN only the least recently used package is evicted
+        assert [packages[1]] == evicted
+        assert {packages[0], packages[2]} == mgr.get_installed_packages()
+
+        # WHEN the usage is rebuilt from disk
+        # THEN the usage is kept
+        last_used = mgr.get_manifest()[packages[0].qualifiedId]["last_used"]
+        assert last_used == mgr.reindex()[packages[0].qualifiedId]["last_used"]
+
+    def test_cache_budget(self, tmpdir):
+        # GIVEN some installed packages
+        packages = [NmPackageId("package{}".format(i), "1.0.0") for i in range(4)]
+        mgr = self.setUp(tmpdir, packages)
+        mgr.install_all(packages[:2])
+
+        # WHEN installing packages with a cache budget that is too small for all of them
+        mgr.cache_budget = 1
+        results = mgr.install_all(packages[2:])
+
+        # THEN the packages of the current operation are kept, all others are evicted
+        assert all(r.succeeded for r in results)
+        assert set(packages[2:]) == mgr.get_installed_packages()
+
+        # WHEN a single package is installed
+        mgr.install(packages[0])
+
+        # THEN only that package is kept
+        assert {packages[0]} == mgr.get_installed_packages()
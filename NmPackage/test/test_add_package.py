@@ -159,6 +159,135 @@ class Test_AddPackage:
         # THEN the result should match the baseline
         compare_dirs(self.testFilesVerified1, Path(tmpdir))
 
+    def test_cli_call_with_path(self, tmpdir):
+        """
+        check the legacy command line: a qualified id followed by the path of the project
+        """
+        # given a clean project in a sub directory
+        from distutils.dir_util import copy_tree
+        copy_tree(str(self.testFilesPre), str(Path(str(tmpdir)) / "project"))
+        os.chdir(str(tmpdir))
+
+        # WHEN calling the cli main function with a package and a path
+        import NmPackage.cli.AddPackage
+        sys.argv = ['arg0', 'packageA/1', 'project']
+        NmPackage.cli.AddPackage.main()
+
+        # THEN the result should match the baseline
+        compare_dirs(self.testFilesVerified1, Path(str(tmpdir)) / "project")
+
+    def test_cli_call_with_mistyped_path(self, tmpdir):
+        """
+        check the legacy command line with a path that does not exist
+        """
+        # given a clean project in the working directory
+        self.setUp(tmpdir)
+        os.chdir(str(tmpdir))
+        before = (Path(str(tmpdir)) / "Vs2017Project.vcxproj").read_bytes()
+
+        # WHEN calling the cli main function with a package and a mistyped path
+        import NmPackage.cli.AddPackage
+        sys.argv = ['arg0', 'packageA/1', './nonexistent']
+        with pytest.raises(Exception) as e:
+            NmPackage.cli.AddPackage.main()
+
+        # THEN it fails without adding the path as a package to the project in the working directory
+        assert "project path does not exist: ./nonexistent" in str(e.value)
+        assert before == (Path(str(tmpdir)) / "Vs2017Project.vcxproj").read_bytes()
+        assert not (Path(str(tmpdir)) / "Vs2017Project.NmPackageDeps.props").exists()
+
+
+class Test_AddPackages:
+
+    testFilesPre = Test_AddPackage.testFilesPre
+    testFilesVerified2 = Test_AddPackage.testFilesVerified2
+
+    def setUp(self, tmpdir, count: int):
+        """Copy `testFilesPre` to `count` project dirs in `tmpdir`"""
+        from distutils.dir_util import copy_tree
+        for i in range(count):
+            copy_tree(str(self.testFilesPre), str(Path(str(tmpdir)) / "projects" / "project{}".format(i)))
+        os.chdir(str(tmpdir))
+
+    def test_add_packages(self, tmpdir):
+        # GIVEN some clean projects
+        self.setUp(tmpdir, 3)
+
+        # WHEN adding two packages to all of them at once
+        projects = find_projects(["projects/*"])
+        add_packages(projects, [package_A_1, package_A_2], jobs=2)
+
+        # THEN every project matches the baseline of adding both packages one by one
+        assert 3 == len(projects)
+        for i in range(3):
+            compare_dirs(self.testFilesVerified2, Path("projects") / "project{}".format(i))
+
+    def test_unchanged_files_are_not_written(self, tmpdir):
+        # GIVEN a project that already depends on a package
+        self.setUp(tmpdir, 1)
+        projects = find_projects(["projects/*"])
+        add_packages(projects, [package_A_1])
+        files = [projects[0], projects[0].with_name("Vs2017Project.NmPackageDeps.props")]
+        for f in files:
+            os.utime(str(f), (0, 0))
+
+        # WHEN adding that package again
+        changes = add_packages(projects, [package_A_1])
+
+        # THEN no file is written, i.e. the mtimes are untouched
+        assert {projects[0]: []} == changes
+        assert all(0 == f.stat().st_mtime for f in files)
+
+        # WHEN adding an other package
+        changes = add_packages(projects, [package_A_2])
+
+        # THEN only the props file is written
+        assert {projects[0]: [files[1]]} == changes
+        assert 0 == files[0].stat().st_mtime
+        assert 0 != files[1].stat().st_mtime
+
+    def test_find_projects(self, tmpdir):
+        # GIVEN some clean projects
+        self.setUp(tmpdir, 3)
+
+        # WHEN finding projects by overlapping paths and patterns
+        projects = find_projects(["projects/**/*.vcxproj", "projects/project0", "projects/project1/Vs2017Project.vcxproj"])
+
+        # THEN every project is found once
+        assert 3 == len(projects)
+        assert all(p.name == "Vs2017Project.vcxproj" for p in projects)
+
+        # THEN a pattern without matches is an error
+        with pytest.raises(Exception) as e:
+            find_projects(["nowhere/*"])
+        assert "no projects match" in str(e.value)
+
+    def test_cli_call(self, tmpdir):
+        # GIVEN some clean projects
+        self.setUp(tmpdir, 2)
+
+        # WHEN calling the cli main function with multiple packages and projects
+        import NmPackage.cli.AddPackage
+        sys.argv = ['arg0', 'packageA/1', 'packageA/2', '-p', 'projects/project0', '-p', 'projects/project1']
+        NmPackage.cli.AddPackage.main()
+
+        # THEN the result should match the baseline
+        for i in range(2):
+            compare_dirs(self.testFilesVerified2, Path("projects") / "project{}".format(i))
+
+    def test_failures_are_aggregated(self, tmpdir):
+        # GIVEN a clean project and a broken one
+        self.setUp(tmpdir, 2)
+        Path("projects/project1/Vs2017Project.vcxproj").write_text("<not xml")
+
+        # WHEN adding a package to both
+        with pytest.raises(Exception) as e:
+            add_packages(find_projects(["projects/*"]), [package_A_1])
+
+        # THEN the broken project is reported and the other one is updated
+        assert "failed to add packages to 1 of 2 projects" in str(e.value)
+        assert Path("projects/project0/Vs2017Project.NmPackageDeps.props").is_file()
+
 
 class Test_Integrate_error_flows():
 
@@ -0,0 +1,43 @@
+import pytest
+
+from NmPackage.benchmark.suite import *
+
+
+class Test_BenchmarkSuite:
+
+    def test_run_and_compare(self):
+        # GIVEN tiny workloads
+        params = parse_params("small", ["packages=2", "vcxproj_files=10"])
+        assert 2 == params["packages"]
+
+        # WHEN running some cases
+        results = run_suite(params, ["deps.*", "integrate.*"], repeat=1)
+
+        # THEN every matching case is timed
+        assert {"deps.serialize", "integrate.dom", "integrate.stream"} < set(results["cases"])
+        assert all(result["best"] > 0 for result in results["cases"].values())
+
+        # WHEN comparing with a baseline that was twice as fast
+        baseline = json.loads(json.dumps(results))
+        for result in baseline["cases"].values():
+            result["best"] /= 2
+        comparison = compare_results(results, baseline)
+
+        # THEN every case is twice as slow
+        assert sorted(results["cases"]) == sorted(name for name, before, after, ratio in comparison)
+        assert all(ratio == pytest.approx(2) for name, before, after, ratio in comparison)
+
+    def test_compare_with_other_params(self):
+        # GIVEN results of different workloads
+        results = {"version": RESULTS_VERSION, "params": parse_params("small", []), "cases": {}}
+        baseline = {"version": RESULTS_VERSION, "params": parse_params("medium", []), "cases": {}}
+
+        # WHEN comparing them THEN this should fail with a proper error message
+        with pytest.raises(Exception) as e:
+            compare_results(results, baseline)
+        assert "different parameters" in str(e.value)
+
+    def test_invalid_param(self):
+        with pytest.raises(Exception) as e:
+            parse_params("small", ["nonsense=1"])
+        assert "invalid parameter: nonsense=1" in str(e.value)
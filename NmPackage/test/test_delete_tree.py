@@ -1,5 +1,7 @@
 from pathlib import Path
 from NmPackage import delete_tree
+from NmPackage import delete_tree_parallel
+from NmPackage.store import ContentStore
 import os
 
 def test_delete_tree(tmpdir):
@@ -50,6 +52,78 @@ def test_delete_tree_with_readonly_file(tmpdir):
     files2 = list(Path(".").iterdir())
     assert 0 == len(files2), "there should be no directory entries"
 
+def test_delete_tree_collects_content_store(tmpdir):
+    os.chdir(tmpdir)
+
+    # GIVEN two directories whose files are linked from a content store
+    store = ContentStore(Path("store"))
+    for d in ("dir1", "dir2"):
+        Path(d).mkdir()
+        Path(d, "shared.txt").write_text("shared")
+        Path(d, "own.txt").write_text("owned by " + d)
+        store.add_tree(Path(d))
+    assert 3 == len(list(store.path.glob("*/*")))
+
+    # WHEN deleting one of them
+    delete_tree(Path("dir1"), store)
+
+    # THEN its files are removed from the store unless still referenced
+    assert not Path("dir1").exists()
+    assert 2 == len(list(store.path.glob("*/*")))
+    assert "shared" == Path("dir2", "shared.txt").read_text()
+
+def test_delete_tree_parallel(tmpdir):
+    os.chdir(tmpdir)
+
+    # GIVEN a deep directory tree with read-only files and directories
+    for i in range(10):
+        d = Path("rootDir", "dir{}".format(i), "sub", "subsub")
+        d.mkdir(parents=True)
+        for j in range(10):
+            Path(d, "file{}.txt".format(j)).touch(0o0400)
+            Path(d.parent, "file{}.txt".format(j)).touch(0o0000)
+        d.chmod(0o0500)
+    Path("rootDir", "link").symlink_to(Path("rootDir", "dir0").absolute())
+
+    # GIVEN a file outside the tree
+    Path("outside.txt").touch()
+
+    # WHEN deleting the rootDir
+    delete_tree_parallel(Path("rootDir"), jobs=4)
+
+    # THEN nothing remains of it, symbolic links are not followed
+    assert [Path("outside.txt")] == list(Path(".").iterdir())
+
+
+def test_delete_tree_parallel_non_existing(tmpdir):
+    # GIVEN a non existing path
+    # WHEN deleting it
+    # THEN this is a noop
+    delete_tree_parallel(Path(str(tmpdir)) / "non-existing")
+
+
+def test_delete_tree_parallel_concurrently_removed(tmpdir, monkeypatch):
+    os.chdir(tmpdir)
+
+    # GIVEN a directory tree with a read-only sub directory
+    Path("rootDir/subDir").mkdir(parents=True)
+    Path("rootDir/subDir").chmod(0o0500)
+
+    # GIVEN another reclaimer that removes the sub directory right before it is emptied
+    access = os.access
+    def removed_concurrently(path, mode):
+        if Path(path).name == "subDir":
+            Path(path).rmdir()
+            return False
+        return access(path, mode)
+    monkeypatch.setattr(os, "access", removed_concurrently)
+
+    # WHEN deleting the rootDir
+    delete_tree_parallel(Path("rootDir"))
+
+    # THEN the vanished sub directory is ignored and nothing remains
+    assert [] == list(Path(".").iterdir())
+
 if __name__ == "__main__":
     import pytest
     pytest.main([__file__])
\ No newline at end of file
@@ -0,0 +1,104 @@
+from NmPackage import *
+from NmPackage.save import NmPackageDepsFileFormat
+from NmPackage.cli.gc import collect_garbage
+from pathlib import Path
+import os
+import sys
+
+
+class Test_gc:
+
+    package_cache_dir_fixture = \
+        (Path(__file__).parent /
+         Path("TestFiles/NmPackageManager/PackageCacheWithSomePackages")).absolute()
+
+    package1_100 = NmPackageId("package1", "v1.0.0")
+    package1_101 = NmPackageId("package1", "v1.0.1")
+    package2_100 = NmPackageId("package2", "v1.0.0")
+
+    def setUp(self, tmpdir) -> NmPackageManager:
+        """
+        Copy the package cache fixture to `tmpdir`/cache
+        and create two source trees `tmpdir`/tree1 & `tmpdir`/tree2 that each reference a single package
+        """
+        from distutils.dir_util import copy_tree
+        cache_dir = Path(str(tmpdir)) / "cache"
+        copy_tree(str(self.package_cache_dir_fixture), str(cache_dir))
+
+        for tree, p in (("tree1", self.package1_100), ("tree2", self.package2_100)):
+            project_dir = Path(str(tmpdir)) / tree / "project"
+            project_dir.mkdir(parents=True)
+            (project_dir / "project.NmPackageDeps.props").write_text(NmPackageDepsFileFormat.serialize([p]))
+
+        return NmPackageManager(cache_dir)
+
+    def test_dry_run(self, tmpdir):
+        # GIVEN a package cache and the source trees that use it
+        mgr = self.setUp(tmpdir)
+        trees = [Path(str(tmpdir)) / "tree1", Path(str(tmpdir)) / "tree2"]
+
+        # WHEN collecting the garbage in dry-run
+        unreferenced = collect_garbage(mgr, trees, dry_run=True)
+
+        # THEN the unreferenced package is reported but not removed
+        assert {self.package1_101} == unreferenced
+        assert 3 == len(mgr.get_installed_packages())
+
+    def test_collect_garbage(self, tmpdir):
+        # GIVEN a package cache and a source tree that uses only one of its packages
+        mgr = self.setUp(tmpdir)
+
+        # WHEN collecting the garbage
+        unreferenced = collect_garbage(mgr, [Path(str(tmpdir)) / "tree1"], jobs=2)
+
+        # THEN only the referenced package is still installed
+        assert {self.package1_101, self.package2_100} == unreferenced
+        assert {self.package1_100} == mgr.get_installed_packages()
+
+    def test_non_existing_dirtree(self, tmpdir):
+        # GIVEN a package cache
+        mgr = self.setUp(tmpdir)
+
+        # WHEN collecting the garbage of a non-existing tree
+        import pytest
+        with pytest.raises(Exception):
+            collect_garbage(mgr, [Path(str(tmpdir)) / "non-existing"])
+
+        # THEN no package is removed
+        assert 3 == len(mgr.get_installed_packages())
+
+    def test_cli_call(self, tmpdir):
+        # GIVEN a system-wide package cache and a source tree
+        mgr = self.setUp(tmpdir)
+        os.environ["NmPackageDir"] = str(mgr.package_cache_dir)
+
+        # WHEN calling the cli main function
+        import NmPackage.cli.gc
+        sys.argv = ['arg0', '--wait', str(Path(str(tmpdir)) / "tree1"), str(Path(str(tmpdir)) / "tree2")]
+        NmPackage.cli.gc.main()
+
+        # THEN the unreferenced package is removed from disk
+        assert {self.package1_100, self.package2_100} == mgr.get_installed_packages()
+        assert not (mgr.package_cache_dir / mgr.get_package_dir(self.package1_101)).exists()
+        assert not mgr.has_trash()
+
+    def test_cli_call_without_garbage(self, tmpdir, monkeypatch):
+        # GIVEN a system-wide package cache without unreferenced packages
+        mgr = self.setUp(tmpdir)
+        mgr.uninstall(self.package1_101)
+        mgr.reclaim_trash()
+        monkeypatch.setenv("NmPackageDir", str(mgr.package_cache_dir))
+
+        # GIVEN that no trash reclaimer may be spawned
+        def fail(self):
+            raise AssertionError("unexpected trash reclaimer")
+        monkeypatch.setattr(NmPackageManager, "spawn_trash_reclaimer", fail)
+
+        # WHEN calling the cli main function without --wait
+        import NmPackage.cli.gc
+        monkeypatch.setattr(sys, "argv", ['arg0', str(Path(str(tmpdir)) / "tree1"), str(Path(str(tmpdir)) / "tree2")])
+        NmPackage.cli.gc.main()
+
+        # THEN nothing was trashed, hence no reclaimer is spawned
+        assert {self.package1_100, self.package2_100} == mgr.get_installed_packages()
+        assert not mgr.has_trash()
@@ -0,0 +1,52 @@
+import pytest
+from pathlib import Path
+
+from NmPackage import *
+from NmPackage.generate import *
+from NmPackage.save import *
+from NmPackage.scan import collect_all_packages
+
+
+class Test_generate:
+
+    def test_generate_monorepo(self, tmpdir):
+        # GIVEN a catalog of 4 packages with 2 versions each
+        catalog = make_packages(4, 2)
+        assert 8 == len(set(catalog))
+
+        # WHEN generating a monorepo of 12 projects with 3 imports each
+        root = Path(str(tmpdir)) / "src"
+        projects = generate_monorepo(root, 12, catalog, 3, breadth=2, depth=2, source_files=5)
+
+        # THEN all projects are listed in the solution and spread over the tree
+        assert projects == find_sln_projects(root / "all.sln")
+        assert sorted(projects) == find_vcxproj_files(root)
+        assert 4 == len(set(p.parent.parent for p in projects))
+
+        # THEN every project depends on 3 different packages of the catalog
+        for p in projects:
+            vsProject = VsProjectFiler().deserialize(p)
+            assert 3 == len(set(d.packageId for d in vsProject.dependencies))
+        assert collect_all_packages(root) <= set(catalog)
+
+        # THEN the generation is deterministic
+        generate_monorepo(Path(str(tmpdir)) / "again", 12, catalog, 3, breadth=2, depth=2, source_files=5)
+        for p in projects:
+            again = Path(str(tmpdir)) / "again" / p.relative_to(root)
+            assert (p.parent / (p.stem + ".NmPackageDeps.props")).read_bytes() == \
+                (again.parent / (again.stem + ".NmPackageDeps.props")).read_bytes()
+
+        # THEN the projects can be integrated
+        changes = integrate_all(projects[:2], jobs=1, engine="stream")
+        assert all(p in changed_files for p, changed_files in changes.items())
+
+    def test_generate_package_cache(self, tmpdir):
+        # GIVEN a catalog of 3 packages with 2 versions each
+        catalog = make_packages(3, 2)
+
+        # WHEN generating a package cache
+        mgr = generate_package_cache(Path(str(tmpdir)), catalog)
+
+        # THEN all packages are installed and indexed
+        assert set(catalog) == mgr.get_installed_packages()
+        assert set(p.qualifiedId for p in catalog) == set(mgr.get_manifest())
@@ -0,0 +1,80 @@
+import pytest
+from pathlib import Path
+import os
+import subprocess
+import time
+
+from NmPackage import *
+from NmPackage.generate import make_packages, package_files
+from NmPackage.localremote import LocalRemotes
+
+
+class Test_LocalRemotes:
+
+    def setUp(self, tmpdir, latency: float, packages: int) -> tuple:
+        """serve `packages` packages from local remotes with `latency`, return (remotes, catalog, manager)"""
+        catalog = make_packages(packages, 1)
+        remotes = LocalRemotes(Path(str(tmpdir)) / "remotes", latency)
+        remotes.create(catalog)
+        cache_dir = Path(str(tmpdir)) / "cache"
+        cache_dir.mkdir()
+        mgr = NmPackageManager(cache_dir, remote_head_max_age=0, git_url_template=remotes.url_template)
+        return remotes, catalog, mgr
+
+    def test_create(self, tmpdir):
+        # GIVEN a catalog of 2 packages
+        catalog = make_packages(2, 1)
+
+        # WHEN creating their remotes
+        repos = LocalRemotes(Path(str(tmpdir))).create(catalog)
+
+        # THEN every remote has a master branch with the package files and allows partial clones
+        for p in catalog:
+            repo = repos[p.qualifiedId]
+            assert repo.name == NmPackageManager.get_git_project_slug(p) + ".git"
+            files = subprocess.check_output(["git", "ls-tree", "-r", "--name-only", "master"], cwd=str(repo),
+                                            universal_newlines=True).split()
+            assert sorted(package_files(p)) == files
+            assert "true" == subprocess.check_output(["git", "config", "uploadpack.allowFilter"], cwd=str(repo),
+                                                     universal_newlines=True).strip()
+
+    @pytest.mark.parametrize("latency", [0, 0.01])
+    def test_install_and_upgrade(self, tmpdir, latency):
+        # GIVEN packages served by local remotes
+        remotes, catalog, mgr = self.setUp(tmpdir, latency, 2)
+        ssh_command = os.environ.get("GIT_SSH_COMMAND")
+
+        with remotes:
+            # WHEN installing them concurrently
+            results = mgr.install_all(catalog, jobs=2)
+
+            # THEN they are installed
+            assert all(r.succeeded and r.action == "install" for r in results)
+            assert set(catalog) == mgr.get_installed_packages()
+
+            # WHEN a package is updated on its remote and all packages are installed again
+            remotes.update(catalog[0], {"NmPackage.props": b"<Project>2</Project>\r\n"})
+            results = {r.nm_package_id: r for r in mgr.install_all(catalog, jobs=1)}
+
+            # THEN only that package is upgraded
+            assert "upgrade" == results[catalog[0]].action
+            assert "up-to-date" == results[catalog[1]].action
+            assert b"<Project>2</Project>\r\n" == \
+                (mgr.package_cache_dir / mgr.get_package_dir(catalog[0]) / "NmPackage.props").read_bytes()
+
+        # THEN the environment is restored
+        assert ssh_command == os.environ.get("GIT_SSH_COMMAND")
+
+    def test_latency(self, tmpdir):
+        # GIVEN a package served with a latency of 0.2s
+        remotes, catalog, mgr = self.setUp(tmpdir, 0.2, 1)
+
+        # WHEN querying its remote head
+        with remotes:
+            start = time.perf_counter()
+            mgr.get_remote_head(catalog[0])
+            elapsed = time.perf_counter() - start
+
+        # THEN the latency is paid
+        assert elapsed >= 0.2
+        assert remotes.url_template.startswith("ssh://")
@@ -0,0 +1,54 @@
+from NmPackage.lock import FileLock
+from pathlib import Path
+import threading
+import time
+
+
+def test_lock_excludes_others(tmpdir):
+    # GIVEN a lock file
+    lock_file = Path(str(tmpdir)) / "locks" / "some.lock"
+
+    # WHEN several threads increment a counter non-atomically while holding the lock
+    counter = [0]
+
+    def increment():
+        for _ in range(20):
+            with FileLock(lock_file):
+                value = counter[0]
+                time.sleep(0.0001)
+                counter[0] = value + 1
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # THEN no increment is lost
+    assert 80 == counter[0]
+
+
+def test_lock_can_be_reacquired(tmpdir):
+    # GIVEN a released lock
+    lock = FileLock(Path(str(tmpdir)) / "some.lock")
+    with lock:
+        pass
+
+    # THEN it can be acquired again
+    with lock:
+        assert lock.path.is_file()
+
+
+def test_non_blocking_acquire(tmpdir):
+    # GIVEN a lock held by someone else
+    lock_file = Path(str(tmpdir)) / "some.lock"
+    with FileLock(lock_file):
+        # WHEN trying to acquire it without blocking
+        # THEN it fails immediately
+        assert not FileLock(lock_file).acquire(blocking=False)
+
+    # WHEN it is released
+    # THEN it can be acquired without blocking
+    lock = FileLock(lock_file)
+    assert lock.acquire(blocking=False)
+    lock.release()
@@ -0,0 +1,207 @@
+from NmPackage import NmPackageId
+from NmPackage.save import NmPackageDepsFileFormat
+from NmPackage.scan import *
+from pathlib import Path
+import pytest
+
+
+package_A_1 = NmPackageId("packageA", "1")
+package_A_2 = NmPackageId("packageA", "2")
+package_B_1 = NmPackageId("packageB", "1")
+
+
+def write_props(path: Path, packages: list):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(NmPackageDepsFileFormat.serialize(packages))
+
+
+def make_tree(root: Path):
+    """a small source tree with props files at various depths and in ignored vcs folders"""
+    write_props(root / "proj1" / "proj1.NmPackageDeps.props", [package_A_1])
+    write_props(root / "sub" / "proj2" / "proj2.NmPackageDeps.props", [package_A_2, package_A_1])
+    write_props(root / "sub" / "deeper" / "proj3" / "proj3.NmPackageDeps.props", [])
+    write_props(root / ".git" / "proj4.NmPackageDeps.props", [package_B_1])
+    write_props(root / "sub" / ".svn" / "proj5.NmPackageDeps.props", [package_B_1])
+    (root / "sub" / "proj2" / "proj2.vcxproj").touch()
+
+
+def test_find_props_files(tmpdir):
+    # GIVEN a source tree
+    root = Path(str(tmpdir))
+    make_tree(root)
+
+    # WHEN searching for props files
+    files = set(Path(f).relative_to(root) for f in find_props_files(root))
+
+    # THEN all props files are found, except those in vcs folders
+    assert {Path("proj1/proj1.NmPackageDeps.props"),
+            Path("sub/proj2/proj2.NmPackageDeps.props"),
+            Path("sub/deeper/proj3/proj3.NmPackageDeps.props")} == files
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_scan_tree(tmpdir, processes):
+    # GIVEN a source tree
+    root = Path(str(tmpdir))
+    make_tree(root)
+
+    # WHEN scanning the tree
+    results = {Path(path).name: packages for path, packages in scan_tree(root, 2, processes)}
+
+    # THEN every props file is reported with its own packages
+    assert {"proj1.NmPackageDeps.props": {package_A_1},
+            "proj2.NmPackageDeps.props": {package_A_1, package_A_2},
+            "proj3.NmPackageDeps.props": set()} == results
+
+
+def test_collect_all_packages(tmpdir):
+    # GIVEN a source tree
+    root = Path(str(tmpdir))
+    make_tree(root)
+
+    # WHEN collecting all packages
+    packages = collect_all_packages(root)
+
+    # THEN the union of all packages is obtained
+    assert {package_A_1, package_A_2} == packages
+
+
+class Test_ScanIndex:
+
+    def setUp(self, tmpdir, monkeypatch):
+        """a source tree and a spy on the parsed props files"""
+        # trust the just created files, the tests bump the mtimes explicitly
+        monkeypatch.setattr(ScanIndex, "RACY_WINDOW_NS", 0)
+
+        self.parsed = []
+        self.listed = []
+        import NmPackage.scan
+        parse_props_files = NmPackage.scan.parse_props_files
+        list_dir = NmPackage.scan.list_dir
+
+        def spy(paths):
+            self.parsed.extend(Path(p).name for p in paths)
+            return parse_props_files(paths)
+        monkeypatch.setattr(NmPackage.scan, "parse_props_files", spy)
+
+        def list_dir_spy(dir):
+            self.listed.append(Path(dir).name)
+            return list_dir(dir)
+        monkeypatch.setattr(NmPackage.scan, "list_dir", list_dir_spy)
+
+        self.index_file = Path(str(tmpdir)) / "index.json"
+        root = Path(str(tmpdir)) / "tree"
+        make_tree(root)
+        return root
+
+    def test_cold_and_warm_scan(self, tmpdir, monkeypatch):
+        # GIVEN a source tree
+        root = self.setUp(tmpdir, monkeypatch)
+
+        # WHEN scanning it for the first time
+        packages = collect_all_packages(root, index_file=self.index_file)
+
+        # THEN all props files are parsed and the index is created
+        assert {package_A_1, package_A_2} == packages
+        assert 3 == len(self.parsed)
+        assert self.index_file.is_file()
+
+        # WHEN rescanning the unchanged tree
+        self.parsed.clear()
+        packages = collect_all_packages(root, index_file=self.index_file)
+
+        # THEN nothing is parsed again
+        assert {package_A_1, package_A_2} == packages
+        assert not self.parsed
+
+    def test_incremental_scan(self, tmpdir, monkeypatch):
+        # GIVEN an indexed source tree
+        root = self.setUp(tmpdir, monkeypatch)
+        ScanIndex(root, self.index_file).scan()
+
+        # GIVEN a modified, a new and a deleted props file
+        import os
+        modified = root / "proj1" / "proj1.NmPackageDeps.props"
+        write_props(modified, [package_B_1])
+        os.utime(str(modified), ns=(0, 10 ** 9))
+        write_props(root / "new" / "proj6" / "proj6.NmPackageDeps.props", [package_A_1])
+        (root / "sub" / "proj2" / "proj2.NmPackageDeps.props").unlink()
+
+        # WHEN rescanning
+        self.parsed.clear()
+        results = ScanIndex(root, self.index_file).scan()
+
+        # THEN only the modified and new files are parsed
+        assert {"proj1.NmPackageDeps.props", "proj6.NmPackageDeps.props"} == set(self.parsed)
+
+        # THEN the result reflects the current state of the tree
+        assert {"proj1.NmPackageDeps.props": {package_B_1},
+                "proj3.NmPackageDeps.props": set(),
+                "proj6.NmPackageDeps.props": {package_A_1}} == \
+            {Path(path).name: packages for path, packages in results.items()}
+
+    def test_corrupt_index_is_discarded(self, tmpdir, monkeypatch):
+        # GIVEN a source tree with a corrupt index
+        root = self.setUp(tmpdir, monkeypatch)
+        self.index_file.write_text("{ not json")
+
+        # WHEN scanning
+        packages = collect_all_packages(root, index_file=self.index_file)
+
+        # THEN the tree is scanned from scratch
+        assert {package_A_1, package_A_2} == packages
+        assert 3 == len(self.parsed)
+
+    def test_new_directory_mtime_is_saved(self, tmpdir, monkeypatch):
+        # GIVEN an indexed source tree
+        root = self.setUp(tmpdir, monkeypatch)
+        ScanIndex(root, self.index_file).scan()
+
+        # GIVEN a directory whose mtime changed without a change of its props files
+        import os
+        (root / "proj1" / "proj1.cpp").touch()
+        os.utime(str(root / "proj1"), ns=(0, 10 ** 9))
+
+        # WHEN rescanning it
+        self.listed.clear()
+        ScanIndex(root, self.index_file).scan()
+
+        # THEN only that directory is listed again
+        assert ["proj1"] == self.listed
+
+        # WHEN rescanning it again
+        self.listed.clear()
+        ScanIndex(root, self.index_file).scan()
+
+        # THEN its new mtime was saved, nothing is listed
+        assert not self.listed
+
+    def test_index_file_inside_the_tree(self, tmpdir, monkeypatch):
+        # GIVEN a source tree indexed twice by an index file in its root
+        root = self.setUp(tmpdir, monkeypatch)
+        index_file = root / "index.json"
+        ScanIndex(root, index_file).scan()
+        ScanIndex(root, index_file).scan()
+        mtime_ns = index_file.stat().st_mtime_ns
+
+        # WHEN rescanning the unchanged tree
+        self.listed.clear()
+        ScanIndex(root, index_file).scan()
+
+        # THEN only the root is listed again, the index is not rewritten
+        assert ["tree"] == self.listed
+        assert mtime_ns == index_file.stat().st_mtime_ns
+
+
+def test_get_scan_index_file(tmpdir):
+    from NmPackage import NmPackageManager
+    # GIVEN a package cache and two source trees
+    mgr = NmPackageManager(Path(str(tmpdir)) / "cache")
+    tree1 = Path(str(tmpdir)) / "tree1"
+    tree2 = Path(str(tmpdir)) / "tree2"
+
+    # WHEN getting their scan index files
+    # THEN every tree has its own index in the administration dir of the cache
+    assert mgr.get_scan_index_file(tree1).parent.parent == mgr.admin_dir
+    assert mgr.get_scan_index_file(tree1) != mgr.get_scan_index_file(tree2)
+    assert mgr.get_scan_index_file(tree1) == mgr.get_scan_index_file(tree1 / "sub" / "..")
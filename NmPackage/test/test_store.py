@@ -0,0 +1,74 @@
+from NmPackage.store import ContentStore
+from pathlib import Path
+import os
+
+
+def make_tree(root: Path, files: dict) -> Path:
+    for name, content in files.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(content)
+    return root
+
+
+def test_add_tree_links_identical_files(tmpdir):
+    # GIVEN a content store
+    store = ContentStore(Path(str(tmpdir)) / "store")
+
+    # GIVEN two trees that share some file contents
+    a = make_tree(Path(str(tmpdir)) / "a", {"inc/a.h": "shared", "lib/a.lib": "only in a"})
+    b = make_tree(Path(str(tmpdir)) / "b", {"inc/b.h": "shared", "lib/b.lib": "only in b"})
+
+    # WHEN adding both trees to the store
+    assert 0 == store.add_tree(a)
+    saved = store.add_tree(b)
+
+    # THEN the shared contents are stored once and linked from both trees
+    assert len("shared") == saved
+    assert os.path.samefile(str(a / "inc/a.h"), str(b / "inc/b.h"))
+    assert not os.path.samefile(str(a / "lib/a.lib"), str(b / "lib/b.lib"))
+    assert 3 == len(list(store.path.glob("*/*")))
+
+    # THEN the file contents are unaffected
+    assert "shared" == (b / "inc/b.h").read_text()
+    assert "only in b" == (b / "lib/b.lib").read_text()
+
+    # WHEN adding a tree again
+    # THEN nothing changes
+    assert 0 == store.add_tree(b)
+    assert 3 == len(list(store.path.glob("*/*")))
+
+
+def test_add_tree_skips_ignored_folders(tmpdir):
+    # GIVEN a tree with a git administration
+    store = ContentStore(Path(str(tmpdir)) / "store")
+    a = make_tree(Path(str(tmpdir)) / "a", {"file.txt": "content", ".git/index": "content"})
+
+    # WHEN adding it to the store
+    store.add_tree(a)
+
+    # THEN the git administration is not linked
+    assert os.path.samefile(str(a / "file.txt"), str(store.get_store_path(ContentStore.hash_file(str(a / "file.txt")))))
+    assert 1 == os.stat(str(a / ".git/index")).st_nlink
+
+
+def test_gc(tmpdir):
+    # GIVEN a content store with the files of two trees
+    store = ContentStore(Path(str(tmpdir)) / "store")
+    a = make_tree(Path(str(tmpdir)) / "a", {"shared.h": "shared", "a.lib": "only in a"})
+    b = make_tree(Path(str(tmpdir)) / "b", {"shared.h": "shared", "b.lib": "only in b"})
+    store.add_tree(a)
+    store.add_tree(b)
+
+    # WHEN nothing was removed
+    # THEN there is no garbage
+    assert 0 == store.gc()
+    assert 3 == len(list(store.path.glob("*/*")))
+
+    # WHEN a tree is removed
+    import shutil
+    shutil.rmtree(str(a))
+
+    # THEN only the contents that were exclusive to that tree are collected
+    assert len("only in a") == store.gc()
+    assert 2 == len(list(store.path.glob("*/*")))
+    assert "shared" == (b / "shared.h").read_text()
@@ -0,0 +1,128 @@
+from NmPackage import *
+from NmPackage.save import Integrate, NmPackageDepsFileFormat, VcxProjectFile
+from NmPackage.trace import Trace
+from pathlib import Path
+import json
+import os
+import pytest
+import shutil
+import subprocess
+import sys
+
+
+def test_span(monkeypatch):
+    # GIVEN tracing is enabled
+    monkeypatch.setattr(Trace, "enabled", True)
+    monkeypatch.setattr(Trace, "events", [])
+
+    # WHEN recording a span with arguments
+    with Trace.span("install", package="A/1") as span:
+        span.args["action"] = "install"
+
+    # THEN it is recorded as a complete event of the calling thread
+    assert 1 == len(Trace.events)
+    event = Trace.events[0]
+    assert "install" == event["name"]
+    assert "X" == event["ph"]
+    assert {"package": "A/1", "action": "install"} == event["args"]
+    assert os.getpid() == event["pid"]
+    assert event["dur"] >= 0
+
+
+def test_span_disabled(monkeypatch):
+    # GIVEN tracing is disabled
+    monkeypatch.setattr(Trace, "enabled", False)
+    monkeypatch.setattr(Trace, "events", [])
+
+    # WHEN recording a span
+    with Trace.span("install"):
+        pass
+
+    # THEN nothing is recorded
+    assert [] == Trace.events
+
+
+def test_span_enabled_while_open(monkeypatch):
+    # GIVEN tracing is disabled
+    monkeypatch.setattr(Trace, "enabled", False)
+    monkeypatch.setattr(Trace, "events", [])
+
+    # WHEN tracing is enabled during a span, like parsing the arguments that enable it
+    with Trace.span("parse arguments"):
+        Trace.enabled = True
+
+    # THEN the span is recorded
+    assert ["parse arguments"] == [e["name"] for e in Trace.events]
+
+
+@pytest.mark.parametrize("engine", VcxProjectFile.ENGINES)
+def test_integrate_traces_writes(tmpdir, monkeypatch, engine):
+    # GIVEN a project that is not integrated yet
+    project = Path(str(tmpdir)) / "Vs2017Project"
+    shutil.copytree(str(Path(__file__).parent / "TestFiles" / "VsProjectIntegration.pre" / "Vs2017Project"),
+                    str(project))
+    vcxproj = project / "Vs2017Project.vcxproj"
+
+    # GIVEN tracing is enabled
+    monkeypatch.setattr(Trace, "enabled", True)
+    monkeypatch.setattr(Trace, "events", [])
+
+    # WHEN integrating it with any engine
+    Integrate(vcxproj, engine)
+
+    # THEN the write of the project is traced
+    writes = [e["args"] for e in Trace.events if e["name"] == "write"]
+    assert str(vcxproj) in [args["path"] for args in writes]
+    assert all(int(args["size"]) > 0 for args in writes)
+
+
+def test_cli_trace_and_profile(tmpdir):
+    # GIVEN a source tree that depends on a package
+    tree = Path(str(tmpdir)) / "tree"
+    tree.mkdir()
+    (tree / "project.NmPackageDeps.props").write_text(NmPackageDepsFileFormat.serialize([NmPackageId("A", "1")]))
+    trace_file = Path(str(tmpdir)) / "trace.json"
+    profile_file = Path(str(tmpdir)) / "profile.prof"
+
+    # WHEN running NmPkg-install with --trace and --profile
+    env = dict(os.environ, NmPackageDir=str(tmpdir))
+    subprocess.check_call([sys.executable, "-c", "from NmPackage.cli.install import main; main()",
+                           "--dirtree", str(tree), "--dry-run",
+                           "--trace", str(trace_file), "--profile", str(profile_file)],
+                          cwd=str(Path(__file__).parents[2]), env=env, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL)
+
+    # THEN the phases are traced in the Chrome trace event format
+    with trace_file.open("tr") as f:
+        trace = json.load(f)
+    spans = {e["name"]: e for e in trace["traceEvents"] if e["ph"] == "X"}
+    assert {"parse arguments", "scan", "parse"} <= set(spans)
+    assert str(tree / "project.NmPackageDeps.props") == spans["parse"]["args"]["path"]
+
+    # THEN the profile is saved
+    import pstats
+    assert pstats.Stats(str(profile_file)).total_calls > 0
+
+
+def test_cli_profile_covers_install_threads(tmpdir):
+    from NmPackage.localremote import create_package_remote
+    # GIVEN a package served by a local remote
+    remotes_dir = Path(str(tmpdir)) / "remotes"
+    create_package_remote(remotes_dir, NmPackageManager.get_git_project_slug(NmPackageId("A", "1")))
+    cache_dir = Path(str(tmpdir)) / "cache"
+    cache_dir.mkdir()
+    profile_file = Path(str(tmpdir)) / "profile.prof"
+
+    # WHEN installing it with NmPkg-install --profile
+    env = dict(os.environ, NmPackageDir=str(cache_dir),
+               NmPackageGitUrlTemplate=remotes_dir.as_uri() + "/{slug}.git")
+    subprocess.check_call([sys.executable, "-c", "from NmPackage.cli.install import main; main()",
+                           "A/1", "--profile", str(profile_file)],
+                          cwd=str(Path(__file__).parents[2]), env=env, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL)
+
+    # THEN the install on the worker threads is profiled too
+    import pstats
+    functions = set(name for filename, line, name in pstats.Stats(str(profile_file)).stats)
+    assert "_install_package" in functions
+
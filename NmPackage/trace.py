@@ -0,0 +1,156 @@
+"""
+Profile and trace the NmPkg command line tools, see `add_trace_arguments`
+
+    NmPkg-install --dirtree src --profile
+    NmPkg-install --dirtree src --trace install.json
+
+`--profile [FILE]` runs the tool under cProfile, prints the functions with the most cumulative time
+and saves the stats to FILE (if given), e.g. for `python -m pstats FILE`.
+
+`--trace FILE` records the wall-clock spans of the phases of the tool, e.g. parsing the arguments,
+scanning a tree, parsing a props file, installing a package or writing a file, see `Trace.span`.
+The trace is saved in the Chrome trace event format, open it in chrome://tracing or https://ui.perfetto.dev.
+
+Both are written when the tool exits, also when it fails.
+The threads started while profiling (e.g. the workers of `install_all`) get a profiler of their own,
+their profiles are merged into the one of the main thread.
+Spans and profiles of worker processes (e.g. `integrate_all`) are not collected.
+
+This module only depends on the standard library, such that every module can trace.
+"""
+from pathlib import Path
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+# the number of functions printed by --profile
+PROFILE_TOP = 30
+
+
+class TraceSpan(object):
+    """A context manager recording a span of the `Trace`, see `Trace.span`"""
+
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        # also a span that started before tracing was enabled, e.g. parsing the arguments that enable it
+        if Trace.enabled:
+            Trace.add_span(self.name, self.start, time.perf_counter(), self.args)
+
+
+class Trace:
+    """The wall-clock trace of the spans of this process, in the Chrome trace event format"""
+
+    enabled = False
+    events = []
+    # the names of the threads that recorded spans {thread id: name}
+    threads = {}
+
+    # the time origin of the trace
+    origin = time.perf_counter()
+
+    @staticmethod
+    def span(name: str, **args) -> TraceSpan:
+        """
+        a context manager that records the span of its with-block if tracing is enabled
+
+        The keyword `args` are shown with the span, they can be added to until the span ends:
+
+            with Trace.span("install", package=p.qualifiedId) as span:
+                span.args["action"] = ...
+        """
+        return TraceSpan(name, args)
+
+    @staticmethod
+    def add_span(name: str, start: float, end: float, args: dict = None):
+        """record a span of the calling thread between two `time.perf_counter()`s"""
+        thread = threading.current_thread()
+        event = {"name": name, "ph": "X", "pid": os.getpid(), "tid": thread.ident,
+                 "ts": (start - Trace.origin) * 1e6, "dur": (end - start) * 1e6}
+        if args:
+            event["args"] = {k: str(v) for k, v in args.items()}
+        # list.append is atomic, spans are recorded from any thread
+        Trace.events.append(event)
+        Trace.threads[thread.ident] = thread.name
+
+    @staticmethod
+    def to_json() -> dict:
+        """the recorded spans as a Chrome trace"""
+        pid = os.getpid()
+        metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": Path(sys.argv[0]).name}}]
+        for tid, name in list(Trace.threads.items()):
+            metadata.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        return {"traceEvents": metadata + list(Trace.events), "displayTimeUnit": "ms",
+                "otherData": {"argv": sys.argv}}
+
+    @staticmethod
+    def save(path: Path):
+        """write the recorded spans as a Chrome trace to `path`"""
+        with Path(path).open("tw") as f:
+            json.dump(Trace.to_json(), f)
+
+
+def add_trace_arguments(parser):
+    """add the --profile and --trace options to the argparse `parser` of a cli, see `start_tracing`"""
+    parser.add_argument("--profile",
+                        help="profile with cProfile, print the top {} functions by cumulative time "
+                             "and save the stats to FILE (if given)".format(PROFILE_TOP),
+                        metavar="FILE",
+                        nargs="?",
+                        const="")
+
+    parser.add_argument("--trace",
+                        help="save the wall-clock spans of all phases to FILE in the Chrome trace event format",
+                        metavar="FILE")
+
+
+def start_tracing(args):
+    """start profiling and tracing as requested by the parsed cli `args`, the results are saved at exit"""
+    if args.trace:
+        Trace.enabled = True
+        atexit.register(Trace.save, Path(args.trace).absolute())
+
+    if args.profile is not None:
+        import cProfile
+        # the profilers of the main thread and of every thread started since
+        profilers = [cProfile.Profile()]
+
+        def profile_thread(frame, event, arg):
+            # the first event of a new thread hands the thread over to a profiler of its own
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # python 3.12+ allows a single profiler, which already sees all threads
+                sys.setprofile(None)
+                return
+            profilers.append(profiler)
+
+        threading.setprofile(profile_thread)
+        atexit.register(_stop_profile, profilers, Path(args.profile).absolute() if args.profile else None)
+        profilers[0].enable()
+
+
+def _stop_profile(profilers: list, path: Path):
+    import pstats
+    threading.setprofile(None)
+    for profiler in profilers:
+        profiler.disable()
+
+    # stderr keeps the output of the tool itself intact
+    stats = pstats.Stats(*profilers, stream=sys.stderr)
+    if path is not None:
+        stats.dump_stats(str(path))
+    stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
@@ -0,0 +1,221 @@
+"""
+Transports fetch the contents of a package from its remote into the package cache.
+
+ * `GitTransport`: clone/pull the git repository of the package
+ * `ArchiveTransport`: download and extract a prebuilt archive of the package from an artifact mirror
+
+A transport only populates a directory, the `NmPackageManager` takes care of staging, locking and bookkeeping.
+Every transport identifies the installed contents of a package by a 'head':
+the commit SHA for git and the sha256 of the archive for archives.
+"""
+from NmPackage.debug import DebugLog
+from pathlib import Path, PurePosixPath
+import hashlib
+import os
+import subprocess
+
+
+class GitTransport(object):
+    """fetch packages by cloning their git repository, see `NmPackageManager.get_git_repo_url`"""
+
+    name = "git"
+
+    def __init__(self, mgr):
+        self._mgr = mgr
+
+    def get_url(self, nm_package_id) -> str:
+        return self._mgr.get_git_repo_url(nm_package_id)
+
+    def get_remote_head(self, nm_package_id) -> str:
+        """the commit SHA of the master branch of the remote (git ls-remote)"""
+        url = self.get_url(nm_package_id)
+        DebugLog.print("querying remote head: " + url)
+        output = subprocess.check_output(["git", "ls-remote", url, "refs/heads/master"], universal_newlines=True)
+        if not output.strip():
+            raise Exception("remote has no master branch: " + url)
+        return output.split()[0]
+
+    @staticmethod
+    def get_local_head(path: Path) -> str:
+        """the commit SHA of the HEAD of a package, None if it is not a git repository"""
+        if not (path / ".git").is_dir():
+            return None
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=str(path), universal_newlines=True).strip()
+
+    def fetch(self, nm_package_id, path: Path) -> tuple:
+        """
+        clone a package into the empty directory `path` according to the packages clone strategy
+
+        If the package manager shares objects then the caller must hold the package lock.
+
+        Returns a tuple (number of bytes of git objects received, head)
+        """
+        from NmPackage import tree_size
+        mgr = self._mgr
+
+        # TODO add verbose logging
+        # note: never os.chdir() here, the cwd is process-global and installs may run concurrently
+        clone_command = ["git", "clone"] + {
+            "full": [],
+            "shallow": ["--depth", "1", "--single-branch"],
+            "blobless": ["--filter=blob:none"],
+        }[mgr.get_clone_strategy(nm_package_id)]
+
+        if mgr.share_objects:
+            # objects that are already in the mirror are not fetched but borrowed from it
+            clone_command += ["--reference-if-able", str(mgr._create_mirror(nm_package_id))]
+
+        subprocess.check_call(clone_command + [self.get_url(nm_package_id), "."], cwd=str(path))
+        return tree_size(path / ".git" / "objects"), self.get_local_head(path)
+
+    def upgrade(self, nm_package_id, path: Path) -> int:
+        """
+        upgrade an installed package in place, i.e. perform git pull
+
+        A shallow clone is kept shallow, i.e. only the latest commit is fetched.
+
+        The caller must hold the version lock.
+
+        Returns the number of bytes of git objects received, None if `path` is no git repository
+        """
+        from NmPackage import tree_size
+        mgr = self._mgr
+
+        # TODO what is repo is not clean?
+        if not (path / ".git").is_dir():
+            return None
+
+        objects_dir = path / ".git" / "objects"
+        size_before = tree_size(objects_dir)
+
+        # TODO add verbose logging
+        if (path / ".git" / "shallow").is_file():
+            # merging a shallow fetch would fail on unrelated histories, instead move to the fetched commit
+            subprocess.check_call(["git", "fetch", "--depth", "1", "origin", "master"], cwd=str(path))
+            subprocess.check_call(["git", "reset", "--hard", "FETCH_HEAD"], cwd=str(path))
+        else:
+            subprocess.check_call(["git", "pull", "origin", "master"], cwd=str(path))
+        bytes_received = max(0, tree_size(objects_dir) - size_before)
+
+        if (objects_dir / "info" / "alternates").is_file() and not mgr._is_partial_clone(path):
+            with mgr._package_lock(nm_package_id):
+                if mgr.get_mirror_dir(nm_package_id).is_dir():
+                    mgr._update_mirror(nm_package_id)
+
+        return bytes_received
+
+
+class ArchiveTransport(object):
+    """
+    fetch packages as prebuilt archives from an artifact mirror, see `NmPackageManager.archive_mirror_url`
+
+    The mirror serves for every package
+      * <mirror url>/<slug>.tar.gz: a (gzipped) tar of the package contents, see `NmPackageManager.get_git_project_slug`
+      * <mirror url>/<slug>.tar.gz.sha256: the sha256 of the archive (in `sha256sum` format)
+
+    Any url scheme supported by urllib can be used, e.g. file:// or http://
+    Archives are extracted while they are downloaded, they are never stored.
+    """
+
+    name = "archive"
+
+    # read buffer size for downloads
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, mgr):
+        self._mgr = mgr
+
+    def get_url(self, nm_package_id) -> str:
+        mirror_url = self._mgr.archive_mirror_url
+        if not mirror_url:
+            raise Exception("no archive mirror configured")
+        return mirror_url.rstrip("/") + "/" + self._mgr.get_git_project_slug(nm_package_id) + ".tar.gz"
+
+    def get_remote_head(self, nm_package_id) -> str:
+        """the sha256 of the archive of a package, as published by the mirror"""
+        from urllib.request import urlopen
+        url = self.get_url(nm_package_id) + ".sha256"
+        DebugLog.print("querying remote head: " + url)
+        with urlopen(url) as response:
+            fields = response.read().decode("ascii", "replace").split()
+
+        import re
+        if not fields or not re.fullmatch(r"[0-9a-fA-F]{64}", fields[0]):
+            raise Exception("invalid checksum file: " + url)
+        return fields[0].lower()
+
+    @staticmethod
+    def get_local_head(path: Path) -> str:
+        """the sha256 of the archive a package was extracted from, see `NmPackageManager.INSTALLED_MARKER`"""
+        from NmPackage import NmPackageManager
+        return NmPackageManager._read_installed_marker(path).get("commit")
+
+    def fetch(self, nm_package_id, path: Path) -> tuple:
+        """
+        stream the archive of a package into the empty directory `path` and verify its checksum
+
+        The archive is not trusted until its checksum is verified,
+        i.e. the contents of `path` must be discarded if this raises.
+
+        Returns a tuple (number of bytes received, head)
+        """
+        from urllib.request import urlopen
+        import tarfile
+        expected = self.get_remote_head(nm_package_id)
+        url = self.get_url(nm_package_id)
+        DebugLog.print("downloading: " + url)
+
+        with urlopen(url) as response:
+            reader = _HashingReader(response)
+            with tarfile.open(fileobj=reader, mode="r|*") as archive:
+                for member in archive:
+                    ArchiveTransport._check_member(member)
+                    archive.extract(member, str(path))
+
+            # consume the end of archive padding such that the checksum covers the complete archive
+            while reader.read(ArchiveTransport.CHUNK_SIZE):
+                pass
+
+        actual = reader.hexdigest()
+        if actual != expected:
+            raise Exception("checksum mismatch for {}: expected {}, got {}".format(url, expected, actual))
+        return reader.size, actual
+
+    def upgrade(self, nm_package_id, path: Path) -> int:
+        """archives are not upgraded in place, the package is installed again instead"""
+        return None
+
+    @staticmethod
+    def _check_member(member):
+        """refuse archive members that would be extracted outside the package directory"""
+        def escapes(name: str) -> bool:
+            return name.startswith(("/", "\\")) or ":" in name or ".." in PurePosixPath(name.replace("\\", "/")).parts
+
+        if escapes(member.name):
+            raise Exception("illegal path in archive: " + member.name)
+        if member.issym():
+            if escapes(os.path.normpath(os.path.join(os.path.dirname(member.name), member.linkname))):
+                raise Exception("illegal symbolic link in archive: {} -> {}".format(member.name, member.linkname))
+        elif member.islnk():
+            if escapes(member.linkname):
+                raise Exception("illegal hard link in archive: {} -> {}".format(member.name, member.linkname))
+        elif not (member.isfile() or member.isdir()):
+            raise Exception("unsupported file type in archive: " + member.name)
+
+
+class _HashingReader(object):
+    """a file-like wrapper that hashes and counts all bytes read through it"""
+
+    def __init__(self, f):
+        self._f = f
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self._hash.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
@@ -7,12 +7,17 @@ setup(name='NmPackage',
       author='Jeroen_de_vlieger',
       author_email='jeroen.devlieger@nikon.com',
       license='',
-      packages=['NmPackage', 'NmPackage.cli'],
+      packages=['NmPackage', 'NmPackage.cli', 'NmPackage.benchmark'],
       entry_points = {
         'console_scripts': [
             'NmPkg-add=NmPackage.cli.AddPackage:main',
+            'NmPkg-gc=NmPackage.cli.gc:main',
+            'NmPkg-generate=NmPackage.cli.generate:main',
             'NmPkg-install=NmPackage.cli.install:main',
+            'NmPkg-integrate=NmPackage.cli.integrate:main',
             'NmPkg-list=NmPackage.cli.list:main',
+            'NmPkg-reclaim=NmPackage.cli.reclaim:main',
+            'NmPkg-reindex=NmPackage.cli.reindex:main',
             'NmPkg-uninstall=NmPackage.cli.uninstall:main'],
         },
       include_package_data=True,